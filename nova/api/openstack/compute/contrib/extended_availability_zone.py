@@ -32,14 +32,27 @@ authorize = extensions.soft_extension_authorizer('compute',
                                                  'extended_availability_zone')
 
 
+@wsgi.prefetcher('host_availability_zones')
+def _prefetch_host_azs(req):
+    context = req.environ['nova.context']
+    if not authorize(context):
+        return None
+    hosts = set(instance.get('host')
+                for instance in req.get_db_instances().values())
+    return availability_zones.get_host_availability_zones(
+            context.elevated(), hosts)
+
+
 class ExtendedAZController(wsgi.Controller):
     def __init__(self):
         self.mc = memorycache.get_client()
 
-    def _get_host_az(self, context, instance):
+    def _get_host_az(self, context, instance, host_azs=None):
         host = instance.get('host')
         if not host:
             return None
+        if host_azs is not None and host in host_azs:
+            return host_azs[host]
         cache_key = "azcache-%s" % host
         az = self.mc.get(cache_key)
         if not az:
@@ -48,9 +61,9 @@ class ExtendedAZController(wsgi.Controller):
             self.mc.set(cache_key, az, AZ_CACHE_SECONDS)
         return az
 
-    def _extend_server(self, context, server, instance):
+    def _extend_server(self, context, server, instance, host_azs=None):
         key = "%s:availability_zone" % Extended_availability_zone.alias
-        server[key] = self._get_host_az(context, instance)
+        server[key] = self._get_host_az(context, instance, host_azs)
 
     @wsgi.extends
     def show(self, req, resp_obj, id):
@@ -61,15 +74,16 @@ class ExtendedAZController(wsgi.Controller):
             db_instance = req.get_db_instance(server['id'])
             self._extend_server(context, server, db_instance)
 
-    @wsgi.extends
+    @wsgi.extends(prefetch=['host_availability_zones'])
     def detail(self, req, resp_obj):
         context = req.environ['nova.context']
         if authorize(context):
             resp_obj.attach(xml=ExtendedAZsTemplate())
+            host_azs = req.get_prefetched('host_availability_zones')
             servers = list(resp_obj.obj['servers'])
             for server in servers:
                 db_instance = req.get_db_instance(server['id'])
-                self._extend_server(context, server, db_instance)
+                self._extend_server(context, server, db_instance, host_azs)
 
 
 class Extended_availability_zone(extensions.ExtensionDescriptor):
@@ -459,6 +459,15 @@ class SecurityGroupActionController(wsgi.Controller):
                             context, id, group_name)
 
 
+@wsgi.prefetcher('instance_security_groups')
+def _prefetch_security_groups(req):
+    if not softauth(req.environ['nova.context']):
+        return None
+    security_group_api = openstack_driver.get_openstack_security_group_driver()
+    return security_group_api.get_instances_security_groups(
+            req, req.get_db_instances().keys())
+
+
 class SecurityGroupsOutputController(wsgi.Controller):
     def __init__(self, *args, **kwargs):
         super(SecurityGroupsOutputController, self).__init__(*args, **kwargs)
@@ -468,7 +477,13 @@ class SecurityGroupsOutputController(wsgi.Controller):
 
     def _extend_servers(self, req, servers):
         key = "security_groups"
-        if not openstack_driver.is_quantum_security_groups():
+        prefetched = req.get_prefetched('instance_security_groups')
+        if prefetched is not None:
+            for server in servers:
+                groups = prefetched.get(server['id'])
+                if groups:
+                    server[key] = groups
+        elif not openstack_driver.is_quantum_security_groups():
             for server in servers:
                 instance = req.get_db_instance(server['id'])
                 groups = instance.get(key)
@@ -524,7 +539,7 @@ class SecurityGroupsOutputController(wsgi.Controller):
     def create(self, req, resp_obj, body):
         return self._show(req, resp_obj)
 
-    @wsgi.extends
+    @wsgi.extends(prefetch=['instance_security_groups'])
     def detail(self, req, resp_obj):
         if not softauth(req.environ['nova.context']):
             return
@@ -166,6 +166,7 @@ class Controller(wsgi.Controller):
             raise webob.exc.HTTPForbidden(explanation=explanation)
         return webob.exc.HTTPNoContent()
 
+    @wsgi.streamed
     @wsgi.serializers(xml=MinimalImagesTemplate)
     def index(self, req):
         """Return an index listing of images available to the request.
@@ -187,6 +188,7 @@ class Controller(wsgi.Controller):
             raise webob.exc.HTTPBadRequest(explanation=str(e))
         return self._view_builder.index(req, images)
 
+    @wsgi.streamed
     @wsgi.serializers(xml=ImagesTemplate)
     def detail(self, req):
         """Return a detailed index listing of images available to the request.
@@ -19,6 +19,7 @@ Module dedicated functions/classes dealing with rate limiting requests.
 
 import collections
 import copy
+import hashlib
 import httplib
 import math
 import re
@@ -32,6 +33,7 @@ from nova.api.openstack import wsgi
 from nova.api.openstack import xmlutil
 from nova.openstack.common import importutils
 from nova.openstack.common import jsonutils
+from nova.openstack.common import memorycache
 from nova import quota
 from nova import wsgi as base_wsgi
 
@@ -172,6 +174,14 @@ class Limit(object):
         if self.verb != verb or not re.match(self.regex, url):
             return
 
+        return self.record_request()
+
+    def record_request(self):
+        """
+        Represents a call to this limit from a request it applies to.
+
+        @return: Delay (in seconds) before the request can be made, or None
+        """
         now = self._get_time()
 
         if self.last_request is None:
@@ -219,6 +229,67 @@ class Limit(object):
             "resetTime": int(self.next_request or self._get_time()),
         }
 
+
+class LimitMatcher(object):
+    """
+    Finds the limits applying to a request with a single precompiled
+    pattern per HTTP verb.
+    """
+
+    def __init__(self, limits):
+        """
+        Initialize a new `LimitMatcher`.
+
+        @param limits: List of `Limit` objects
+        """
+        regexes = collections.defaultdict(list)
+        for index, limit in enumerate(limits):
+            regexes[limit.verb].append((index, limit.regex))
+
+        self.patterns = {}
+        for verb, verb_regexes in regexes.items():
+            self.patterns[verb] = self._compile(verb_regexes)
+
+    @staticmethod
+    def _compile(regexes):
+        """
+        Combine the regexes into one pattern.  Each regex is matched by a
+        lookahead at the start of the URL, followed by an empty group named
+        after the index of its limit which only participates in the match
+        if the regex matches.
+
+        Regexes with groups, which they may refer to by number, or with
+        flags, which would apply to the whole pattern, are matched
+        separately.
+        """
+        compiled = [(index, re.compile(regex)) for index, regex in regexes]
+        if any(regex.groups or regex.flags for _index, regex in compiled):
+            return compiled
+
+        combined = ''.join('(?:(?=%s)(?P<limit%d>)|)' % (regex, index)
+                           for index, regex in regexes)
+        try:
+            return re.compile(combined)
+        except AssertionError:
+            # Too many groups
+            return compiled
+
+    def __call__(self, verb, url):
+        """
+        Return the indexes of the limits applying to the given verb and
+        url, in order.
+        """
+        pattern = self.patterns.get(verb)
+        if pattern is None:
+            return []
+        if isinstance(pattern, list):
+            return [index for index, regex in pattern if regex.match(url)]
+
+        groups = pattern.match(url).groupdict()
+        return sorted(int(name[5:]) for name, value in groups.items()
+                      if value is not None)
+
+
 # "Limit" format is a dictionary with the HTTP verb, human-readable URI,
 # a regular-expression to match, value and unit of measure (PER_DAY, etc.)
 
@@ -235,7 +306,8 @@ DEFAULT_LIMITS = [
 class RateLimitingMiddleware(base_wsgi.Middleware):
     """
     Rate-limits requests passing through this middleware. All limit information
-    is stored in memory for this implementation.
+    is stored in memory for this implementation, unless the `SharedLimiter`
+    is selected.
     """
 
     def __init__(self, application, limits=None, limiter=None, **kwargs):
@@ -307,6 +379,7 @@ class Limiter(object):
         """
         self.limits = copy.deepcopy(limits)
         self.levels = collections.defaultdict(lambda: copy.deepcopy(limits))
+        self._matchers = {}
 
         # Pick up any per-user limit information
         for key, value in kwargs.items():
@@ -314,6 +387,17 @@ class Limiter(object):
                 username = key[5:]
                 self.levels[username] = self.parse_limits(value)
 
+    def _match(self, limits, verb, url):
+        """
+        Return the limits applying to the given verb and url.  Users with
+        the same limits share the patterns matching them.
+        """
+        key = tuple((limit.verb, limit.regex) for limit in limits)
+        matcher = self._matchers.get(key)
+        if matcher is None:
+            matcher = self._matchers[key] = LimitMatcher(limits)
+        return [limits[index] for index in matcher(verb, url)]
+
     def get_limits(self, username=None):
         """
         Return the limits for a given user.
@@ -328,8 +412,8 @@ class Limiter(object):
         """
         delays = []
 
-        for limit in self.levels[username]:
-            delay = limit(verb, url)
+        for limit in self._match(self.levels[username], verb, url):
+            delay = limit.record_request()
             if delay:
                 delays.append((delay, limit.error_message))
 
@@ -400,6 +484,123 @@ class Limiter(object):
         return result
 
 
+class SharedLimiter(Limiter):
+    """
+    Rate-limit checking class which keeps the state of the limits in
+    memcached, so all the API workers and nodes enforce the limits together.
+
+    To use it, set the limiter of the ratelimit filter in api-paste.ini to
+    nova.api.openstack.compute.limits.SharedLimiter and memcached_servers in
+    nova.conf.  Without memcached_servers, the state is kept in process.
+
+    Each limit counts the requests of a user in fixed windows of its unit,
+    e.g. from one minute to the next, with the atomic add and incr calls,
+    so concurrent requests can't exceed it.  Unlike the leaky buckets of
+    `Limiter`, a user may make up to twice the limit around the end of a
+    window.  Requests no limit applies to don't reach memcached.
+    """
+
+    def __init__(self, limits, **kwargs):
+        """
+        Initialize the new `SharedLimiter`.
+
+        @param limits: List of `Limit` objects
+        """
+        super(SharedLimiter, self).__init__(limits, **kwargs)
+        self._cache = memorycache.get_client()
+
+    def _get_time(self):
+        """Retrieve the current time. Broken out for testability."""
+        return time.time()
+
+    @staticmethod
+    def _key(limit, username, window):
+        """Return the cache key of the request count of a limit of a user
+        in a window.
+        """
+        key = '%s:%s:%s:%s:%s' % (username, limit.verb, limit.regex,
+                                  limit.value, limit.unit)
+        return 'ratelimit-%s-%d' % (hashlib.md5(key).hexdigest(), window)
+
+    @staticmethod
+    def _window(limit, now):
+        """Return the window of a limit at now, and the time it ends."""
+        window = int(now // limit.unit)
+        return window, (window + 1) * limit.unit
+
+    def _count(self, key, expiry):
+        """Count a request in the window of key and return its count."""
+        count = self._cache.incr(key)
+        if count is None:
+            # First request of the window, unless another process just
+            # counted one too.
+            if self._cache.add(key, '1', time=expiry):
+                return 1
+            count = self._cache.incr(key)
+        return int(count)
+
+    def _get_counts(self, keys):
+        if hasattr(self._cache, 'get_multi'):
+            return self._cache.get_multi(keys)
+        counts = {}
+        for key in keys:
+            count = self._cache.get(key)
+            if count is not None:
+                counts[key] = count
+        return counts
+
+    @staticmethod
+    def _update(limit, now, count, reset):
+        """Update the state of limit reported by get_limits()."""
+        limit.last_request = now
+        limit.remaining = max(0, limit.value - count)
+        if limit.remaining:
+            limit.next_request = now
+        else:
+            limit.next_request = reset
+
+    def get_limits(self, username=None):
+        """
+        Return the limits for a given user, with their state read from
+        memcached.
+        """
+        limits = self.levels[username]
+        now = self._get_time()
+        windows = [self._window(limit, now) for limit in limits]
+        keys = [self._key(limit, username, window)
+                for limit, (window, reset) in zip(limits, windows)]
+        counts = self._get_counts(keys)
+        for limit, key, (window, reset) in zip(limits, keys, windows):
+            self._update(limit, now, int(counts.get(key, 0)), reset)
+        return super(SharedLimiter, self).get_limits(username)
+
+    def check_for_delay(self, verb, url, username=None):
+        """
+        Check the given verb/user/user triplet for limit.
+
+        @return: Tuple of delay (in seconds) and error message (or None, None)
+        """
+        applying = self._match(self.levels[username], verb, url)
+        if not applying:
+            return None, None
+
+        now = self._get_time()
+        delays = []
+        for limit in applying:
+            window, reset = self._window(limit, now)
+            count = self._count(self._key(limit, username, window),
+                                int(math.ceil(reset - now)) + 1)
+            self._update(limit, now, count, reset)
+            if count > limit.value:
+                delays.append((reset - now, limit.error_message))
+
+        if delays:
+            delays.sort()
+            return delays[0]
+
+        return None, None
+
+
 class WsgiLimiter(object):
     """
     Rate-limit checking from a WSGI application. Uses an in-memory `Limiter`.
@@ -51,6 +51,9 @@ CONF.import_opt('reclaim_instance_interval', 'nova.compute.manager')
 
 LOG = logging.getLogger(__name__)
 
+# Instance columns used by the index view:
+INDEX_COLUMNS = ['uuid', 'display_name']
+
 
 def make_fault(elem):
     fault = xmlutil.SubTemplateElement(elem, 'fault', selector='fault')
@@ -463,6 +466,7 @@ class Controller(wsgi.Controller):
         self.ext_mgr = ext_mgr
         self.quantum_attempted = False
 
+    @wsgi.streamed
     @wsgi.serializers(xml=MinimalServersTemplate)
     def index(self, req):
         """Returns a list of server names and ids for a given user."""
@@ -472,6 +476,7 @@ class Controller(wsgi.Controller):
             raise exc.HTTPBadRequest(explanation=str(err))
         return servers
 
+    @wsgi.streamed
     @wsgi.serializers(xml=ServersTemplate)
     def detail(self, req):
         """Returns a list of server details for a given user."""
@@ -545,11 +550,14 @@ class Controller(wsgi.Controller):
                 search_opts['user_id'] = context.user_id
 
         limit, marker = common.get_limit_and_marker(req)
+        # The index view only needs a few columns of the instances:
+        columns = None if is_detail else INDEX_COLUMNS
         try:
             instance_list = self.compute_api.get_all(context,
                                                      search_opts=search_opts,
                                                      limit=limit,
-                                                     marker=marker)
+                                                     marker=marker,
+                                                     columns=columns)
         except exception.MarkerNotFound as e:
             msg = _('marker [%s] not found') % marker
             raise exc.HTTPBadRequest(explanation=msg)
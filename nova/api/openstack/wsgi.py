@@ -66,7 +66,7 @@ class Request(webob.Request):
 
     def __init__(self, *args, **kwargs):
         super(Request, self).__init__(*args, **kwargs)
-        self._extension_data = {'db_items': {}}
+        self._extension_data = {'db_items': {}, 'prefetched': {}}
 
     def cache_db_items(self, key, items, item_key='id'):
         """
@@ -123,6 +123,22 @@ class Request(webob.Request):
     def get_db_flavor(self, flavorid):
         return self.get_db_item('flavors', flavorid)
 
+    def prefetch(self, name):
+        """Fetch the data registered as name with @prefetcher, once per
+        request.
+        """
+        prefetched = self._extension_data['prefetched']
+        if name not in prefetched:
+            prefetched[name] = _prefetchers[name](self)
+        return prefetched[name]
+
+    def get_prefetched(self, name):
+        """
+        Allow an API extension to get the data fetched in bulk for the
+        extensions of this request, or None if it wasn't fetched.
+        """
+        return self._extension_data['prefetched'].get(name)
+
     def best_match_content_type(self):
         """Determine the requested response content-type."""
         if 'nova.best_content_type' not in self.environ:
@@ -311,6 +327,10 @@ class DictSerializer(ActionDispatcher):
     def serialize(self, data, action='default'):
         return self.dispatch(data, action=action)
 
+    def serialize_iter(self, data, action='default'):
+        """Serialize data into an iterator over chunks of the body."""
+        return iter([self.serialize(data, action=action)])
+
     def default(self, data):
         return ""
 
@@ -321,6 +341,36 @@ class JSONDictSerializer(DictSerializer):
     def default(self, data):
         return jsonutils.dumps(data)
 
+    def serialize_iter(self, data, action='default'):
+        """Serialize data into an iterator over chunks of JSON.
+
+        The lists at the top level of data are encoded
+        xmlutil.STREAM_BATCH_SIZE items at a time.  The chunks join into
+        the same document as serialize() returns.
+        """
+        if (action != 'default' or not isinstance(data, dict) or
+                not all(isinstance(key, basestring) for key in data)):
+            return super(JSONDictSerializer, self).serialize_iter(data,
+                                                                  action)
+        return self._iter_dict(data)
+
+    def _iter_dict(self, data):
+        yield '{'
+        for idx, (key, value) in enumerate(data.iteritems()):
+            prefix = '%s%s: ' % (', ' if idx else '', jsonutils.dumps(key))
+            if not isinstance(value, list):
+                yield prefix + jsonutils.dumps(value)
+                continue
+
+            yield prefix + '['
+            batch_size = xmlutil.STREAM_BATCH_SIZE
+            for start in xrange(0, len(value), batch_size):
+                items = value[start:start + batch_size]
+                yield ((', ' if start else '') +
+                       ', '.join(jsonutils.dumps(item) for item in items))
+            yield ']'
+        yield '}'
+
 
 class XMLDictSerializer(DictSerializer):
 
@@ -460,6 +510,21 @@ def deserializers(**deserializers):
     return decorator
 
 
+def streamed(func):
+    """Attaches streamed serialization to a method.
+
+    The response of the method is serialized piecewise as it is sent,
+    which keeps the time to the first byte of large listings low.  The
+    method still builds its whole response, e.g. the view builders of
+    the listings build every item, so the peak memory only drops by the
+    size of the serialized body.  The status of the response can't change
+    once it is streaming, so errors must be raised by the method itself.
+    """
+
+    func.wsgi_stream = True
+    return func
+
+
 def response(code):
     """Attaches response code to a method.
 
@@ -498,6 +563,7 @@ class ResponseObject(object):
         self._headers = headers or {}
         self.serializer = None
         self.media_type = None
+        self.stream = False
 
     def __getitem__(self, key):
         """Retrieves a header with the given name."""
@@ -591,7 +657,10 @@ class ResponseObject(object):
             response.headers[hdr] = str(value)
         response.headers['Content-Type'] = content_type
         if self.obj is not None:
-            response.body = serializer.serialize(self.obj)
+            if self.stream and hasattr(serializer, 'serialize_iter'):
+                response.app_iter = serializer.serialize_iter(self.obj)
+            else:
+                response.body = serializer.serialize(self.obj)
 
         return response
 
@@ -840,8 +909,26 @@ class Resource(wsgi.Application):
         # Run post-processing in the reverse order
         return None, reversed(post)
 
+    def prefetch_extensions(self, extensions, request):
+        """Fetch in bulk the data the post-processing extensions declared
+        with @extends(prefetch=[...]), so they don't look it up item by
+        item.
+        """
+        names = set()
+        for ext in extensions:
+            names.update(getattr(ext, 'wsgi_prefetch', []))
+        for name in names:
+            try:
+                request.prefetch(name)
+            except Exception:
+                # The extensions fall back to their own lookups
+                LOG.exception(_("Failed to prefetch %s for the API "
+                                "extensions"), name)
+
     def post_process_extensions(self, extensions, resp_obj, request,
                                 action_args):
+        extensions = list(extensions)
+        self.prefetch_extensions(extensions, request)
         for ext in extensions:
             response = None
             if inspect.isgenerator(ext):
@@ -962,6 +1049,8 @@ class Resource(wsgi.Application):
                 resp_obj._bind_method_serializers(serializers)
                 if hasattr(meth, 'wsgi_code'):
                     resp_obj._default_code = meth.wsgi_code
+                if getattr(meth, 'wsgi_stream', False):
+                    resp_obj.stream = True
                 resp_obj.preserialize(accept, self.default_serializers)
 
                 # Process post-processing extensions
@@ -1051,11 +1140,19 @@ def extends(*args, **kwargs):
         @extends(action='resize')
         def _action_resize(...):
             pass
+
+    Post-processing extensions may also list the data registered with
+    @prefetcher they need, which is then fetched once for all of them::
+
+        @extends(prefetch=['host_availability_zones'])
+        def detail(...):
+            pass
     """
 
     def decorator(func):
         # Store enough information to find what we're extending
         func.wsgi_extends = (func.__name__, kwargs.get('action'))
+        func.wsgi_prefetch = kwargs.get('prefetch', [])
         return func
 
     # If we have positional arguments, call the decorator
@@ -1066,6 +1163,29 @@ def extends(*args, **kwargs):
     return decorator
 
 
+# { name : function fetching data for the extensions of a request }
+_prefetchers = {}
+
+
+def prefetcher(name):
+    """Register a function fetching data in bulk for the extensions of a
+    request.
+
+    The function is called with the request before the post-processing
+    extensions declaring name with @extends(prefetch=[...]) run, at most
+    once per request.  It should fetch what these extensions need for all
+    the items of the request (see Request.get_db_instances()) with as few
+    queries as possible.  The extensions get the result with
+    Request.get_prefetched(name).
+    """
+
+    def decorator(func):
+        _prefetchers[name] = func
+        return func
+
+    return decorator
+
+
 class ControllerMetaclass(type):
     """Controller metaclass.
 
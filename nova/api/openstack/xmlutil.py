@@ -16,6 +16,7 @@
 #    under the License.
 
 import os.path
+import uuid
 
 from lxml import etree
 from xml.dom import minidom
@@ -32,6 +33,18 @@ XMLNS_V11 = 'http://docs.openstack.org/compute/api/v1.1'
 XMLNS_COMMON_V10 = 'http://docs.openstack.org/common/api/v1.0'
 XMLNS_ATOM = 'http://www.w3.org/2005/Atom'
 
+# Number of list items serialized at a time by streamed responses
+STREAM_BATCH_SIZE = 100
+
+# Incremented whenever a template element is modified, to invalidate the
+# render plans compiled from it
+_generation = 0
+
+
+def _template_modified():
+    global _generation
+    _generation += 1
+
 
 def validate_schema(xml, schema_name):
     if isinstance(xml, str):
@@ -136,6 +149,52 @@ class ConstantSelector(object):
         return self.value
 
 
+def _compile_selector(selector):
+    """Return a function equivalent to a selector.
+
+    Selector instances are turned into closures over their chain, which
+    avoid testing each index of the chain for callability on every call.
+    Other selectors are returned unchanged.
+
+    :param selector: The selector to compile; may be None.
+    """
+
+    if type(selector) is not Selector:
+        return selector
+
+    chain = selector.chain
+    if not chain:
+        def select(obj, do_raise=False):
+            return obj
+    elif len(chain) == 1 and not callable(chain[0]):
+        key = chain[0]
+
+        def select(obj, do_raise=False):
+            try:
+                return obj[key]
+            except (KeyError, IndexError):
+                if do_raise:
+                    raise KeyError(key)
+                return None
+    else:
+        steps = tuple((elem, callable(elem)) for elem in chain)
+
+        def select(obj, do_raise=False):
+            for elem, call in steps:
+                if call:
+                    obj = elem(obj)
+                    continue
+                try:
+                    obj = obj[elem]
+                except (KeyError, IndexError):
+                    if do_raise:
+                        raise KeyError(elem)
+                    return None
+            return obj
+
+    return select
+
+
 class TemplateElement(object):
     """Represent an element in the template."""
 
@@ -178,6 +237,9 @@ class TemplateElement(object):
         self._children = []
         self._childmap = {}
 
+        # Render plans compiled by the templates rooted at the element
+        self._plans = {}
+
         # Run the incoming attributes through set() so that they
         # become selectorized
         if not attrib:
@@ -224,6 +286,7 @@ class TemplateElement(object):
 
         self._children.append(elem)
         self._childmap[elem.tag] = elem
+        _template_modified()
 
     def extend(self, elems):
         """Append children to the element."""
@@ -245,6 +308,7 @@ class TemplateElement(object):
         # Update the children
         self._children.extend(elemlist)
         self._childmap.update(elemmap)
+        _template_modified()
 
     def insert(self, idx, elem):
         """Insert a child element at the given index."""
@@ -258,6 +322,7 @@ class TemplateElement(object):
 
         self._children.insert(idx, elem)
         self._childmap[elem.tag] = elem
+        _template_modified()
 
     def remove(self, elem):
         """Remove a child element."""
@@ -271,6 +336,7 @@ class TemplateElement(object):
 
         self._children.remove(elem)
         del self._childmap[elem.tag]
+        _template_modified()
 
     def get(self, key):
         """Get an attribute.
@@ -301,6 +367,7 @@ class TemplateElement(object):
             value = Selector(value)
 
         self.attrib[key] = value
+        _template_modified()
 
     def keys(self):
         """Return the attribute names."""
@@ -458,9 +525,11 @@ class TemplateElement(object):
             value = Selector(value)
 
         self._text = value
+        _template_modified()
 
     def _text_del(self):
         self._text = None
+        _template_modified()
 
     text = property(_text_get, _text_set, _text_del)
 
@@ -517,6 +586,128 @@ def SubTemplateElement(parent, tag, attrib=None, selector=None,
     return elem
 
 
+class CompiledElement(object):
+    """Render plan of template elements.
+
+    Flattens the template elements which render one tag, the first of
+    them along with the ones patching it, and their children into a plan
+    that renders objects without walking the template tree again.
+    """
+
+    def __init__(self, template, siblings):
+        """Compile template elements.
+
+        :param template: The template being compiled.
+        :param siblings: The TemplateElement instances rendering the tag;
+                         the first one selects the data to render.
+        """
+
+        first = siblings[0]
+        self.tag = first.tag
+        self.select = _compile_selector(first.selector)
+        self.subselect = _compile_selector(first.subselector)
+
+        # The default hook is inlined by render()
+        self.will_render = first.will_render
+        if (self.will_render.im_func is
+                TemplateElement.will_render.im_func):
+            self.will_render = None
+
+        # Key of the list of data selected by the element, if any
+        self.key = None
+        chain = getattr(first.selector, 'chain', None)
+        if (self.will_render is None and chain and len(chain) == 1 and
+                not callable(chain[0])):
+            self.key = chain[0]
+
+        # Text and attributes, applied in the same order as apply()
+        # applies them for each of the elements
+        self.text = None
+        self.attrib = []
+        for sibling in siblings:
+            if sibling.text is not None:
+                self.text = _compile_selector(sibling.text)
+            self.attrib.extend((key, _compile_selector(value))
+                               for key, value in sibling.items())
+
+        self.children = [CompiledElement(template, nieces)
+                         for nieces in template._children(siblings)]
+
+    def render_elements(self, parent, obj, nsmap=None):
+        """Render an object without the children of the element.
+
+        Returns a list of two-item tuples of the etree.Element instances
+        rendered and their datum, like TemplateElement.render().
+
+        :param parent: The parent for the etree.Element instances.
+        :param obj: The object to render the element against.
+        :param nsmap: An optional namespace dictionary to attach to
+                      the etree.Element instances.
+        """
+
+        data = None if obj is None else self.select(obj)
+        if self.will_render is None:
+            if data is None:
+                return []
+        elif not self.will_render(data):
+            return []
+
+        subselect = self.subselect
+        if data is None:
+            data = [None]
+            subselect = None
+        elif not isinstance(data, list):
+            data = [data]
+        elif parent is None:
+            raise ValueError(_('root element selecting a list'))
+
+        tag = self.tag
+        text = self.text
+        attrib = self.attrib
+        elems = []
+        for datum in data:
+            if subselect is not None:
+                datum = subselect(datum)
+            tagname = tag(datum) if callable(tag) else tag
+            if parent is None:
+                elem = etree.Element(tagname, nsmap=nsmap)
+            else:
+                elem = etree.SubElement(parent, tagname, nsmap=nsmap)
+            elems.append((elem, datum))
+
+            if datum is None:
+                continue
+            if text is not None:
+                elem.text = unicode(text(datum))
+            for key, value in attrib:
+                try:
+                    elem.set(key, unicode(value(datum, True)))
+                except KeyError:
+                    # Attribute has no value, so don't include it
+                    pass
+
+        return elems
+
+    def render(self, parent, obj, nsmap=None):
+        """Render an object and the children of the element.
+
+        Returns the first etree.Element instance rendered, or None.
+
+        :param parent: The parent for the etree.Element instances.
+        :param obj: The object to render the element against.
+        :param nsmap: An optional namespace dictionary to attach to
+                      the etree.Element instances.
+        """
+
+        elems = self.render_elements(parent, obj, nsmap)
+        for elem, datum in elems:
+            for child in self.children:
+                child.render(elem, datum)
+
+        if elems:
+            return elems[0][0]
+
+
 class Template(object):
     """Represent a template."""
 
@@ -554,6 +745,21 @@ class Template(object):
         elems = siblings[0].render(parent, obj, siblings[1:], nsmap)
 
         # Now, recurse to all child elements
+        for nieces in self._children(siblings):
+            # Now we recurse for every data element
+            for elem, datum in elems:
+                self._serialize(elem, datum, nieces)
+
+        # Return the first element; at the top level, this will be the
+        # root element
+        if elems:
+            return elems[0][0]
+
+    def _children(self, siblings):
+        """Yield, for every child tag of the siblings, the list of
+        TemplateElement instances against which to render the child.
+        """
+
         seen = set()
         for idx, sibling in enumerate(siblings):
             for child in sibling:
@@ -567,15 +773,7 @@ class Template(object):
                 for sib in siblings[idx + 1:]:
                     if child.tag in sib:
                         nieces.append(sib[child.tag])
-
-                # Now we recurse for every data element
-                for elem, datum in elems:
-                    self._serialize(elem, datum, nieces)
-
-        # Return the first element; at the top level, this will be the
-        # root element
-        if elems:
-            return elems[0][0]
+                yield nieces
 
     def serialize(self, obj, *args, **kwargs):
         """Serialize an object.
@@ -597,6 +795,77 @@ class Template(object):
         # Serialize it into XML
         return etree.tostring(elem, *args, **kwargs)
 
+    def serialize_iter(self, obj, batch_size=None):
+        """Serialize an object piecewise.
+
+        Like serialize(), but returns an iterator over chunks of the
+        serialized XML.  The children of the root element selecting a
+        list are rendered batch_size data elements at a time, so the tree
+        of the whole document is never built.
+
+        :param obj: The object to serialize.
+        :param batch_size: The number of data elements rendered at a
+                           time, STREAM_BATCH_SIZE by default.
+        """
+
+        if batch_size is None:
+            batch_size = STREAM_BATCH_SIZE
+
+        if self.root is None:
+            yield ''
+            return
+
+        plan = self.compile()
+        elems = plan.render_elements(None, obj, self._nsmap())
+        if not elems:
+            yield ''
+            return
+        root, datum = elems[0]
+        if root.text is not None:
+            yield self.serialize(obj)
+            return
+
+        # Split the document around the content of the root element
+        marker = '<!--%s-->' % uuid.uuid4()
+        root.append(etree.Comment(marker[4:-3]))
+        head, tail = etree.tostring(root, **self.serialize_options).split(
+            marker)
+        del root[:]
+
+        started = False
+        for child in plan.children:
+            for batch in self._batches(child, datum, batch_size):
+                child.render(root, batch)
+                if not len(root):
+                    continue
+                body = etree.tostring(root, **self.serialize_options)
+                del root[:]
+                if not started:
+                    started = True
+                    yield head
+                yield body[len(head):-len(tail)]
+
+        if started:
+            yield tail
+        else:
+            # An empty root element is serialized as a single tag
+            yield etree.tostring(root, **self.serialize_options)
+
+    def _batches(self, child, datum, batch_size):
+        """Split datum into copies holding batch_size elements of the list
+        the compiled child element selects, if it selects one by key.
+        """
+
+        if child.key is not None and isinstance(datum, dict):
+            data = datum.get(child.key)
+            if isinstance(data, list) and len(data) > batch_size:
+                for start in xrange(0, len(data), batch_size):
+                    batch = dict(datum)
+                    batch[child.key] = data[start:start + batch_size]
+                    yield batch
+                return
+        yield datum
+
     def make_tree(self, obj):
         """Create a tree.
 
@@ -610,12 +879,26 @@ class Template(object):
         if self.root is None:
             return None
 
-        # Get the siblings and nsmap of the root element
-        siblings = self._siblings()
-        nsmap = self._nsmap()
-
         # Form the element tree
-        return self._serialize(None, obj, siblings, nsmap)
+        return self.compile().render(None, obj, self._nsmap())
+
+    def compile(self):
+        """Compile the template.
+
+        Returns the CompiledElement render plan of the root element and
+        its siblings.  Plans are cached on the root element for each set
+        of siblings, so copies of a master template with the same slave
+        templates attached share their plan, and are compiled again when
+        a template element changes.
+        """
+
+        siblings = self._siblings()
+        key = tuple(siblings[1:])
+        generation, plan = self.root._plans.get(key, (None, None))
+        if generation != _generation:
+            plan = CompiledElement(self, siblings)
+            self.root._plans[key] = (_generation, plan)
+        return plan
 
     def _siblings(self):
         """Hook method for computing root siblings.
@@ -66,6 +66,21 @@ def get_host_availability_zone(context, host, conductor_api=None):
         return CONF.default_availability_zone
 
 
+def get_host_availability_zones(context, hosts):
+    """Return a dict of the availability zones of hosts, keyed by host,
+    with a single query.
+    """
+    metadata = db.aggregate_host_get_by_metadata_key(context,
+            key='availability_zone')
+    host_azs = {}
+    for host in hosts:
+        if metadata.get(host):
+            host_azs[host] = list(metadata[host])[0]
+        else:
+            host_azs[host] = CONF.default_availability_zone
+    return host_azs
+
+
 def get_availability_zones(context):
     """Return available and unavailable zones."""
     enabled_services = db.service_get_all(context, False)
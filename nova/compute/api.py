@@ -1341,7 +1341,7 @@ class API(base.Base):
         return inst
 
     def get_all(self, context, search_opts=None, sort_key='created_at',
-                sort_dir='desc', limit=None, marker=None):
+                sort_dir='desc', limit=None, marker=None, columns=None):
         """Get all instances filtered by one of the given parameters.
 
         If there is no filter and the context is an admin, it will retrieve
@@ -1353,6 +1353,9 @@ class API(base.Base):
         The results will be returned sorted in the order specified by the
         'sort_dir' parameter using the key specified in the 'sort_key'
         parameter.
+
+        If columns is given, only these columns of the instances are
+        returned.
         """
 
         #TODO(bcwaldon): determine the best argument for target here
@@ -1420,7 +1423,11 @@ class API(base.Base):
         inst_models = self._get_instances_by_filters(context, filters,
                                                      sort_key, sort_dir,
                                                      limit=limit,
-                                                     marker=marker)
+                                                     marker=marker,
+                                                     columns=columns)
+        if columns is not None:
+            # Already dictionaries of the columns
+            return inst_models
 
         # Convert the models to dictionaries
         instances = []
@@ -1435,7 +1442,8 @@ class API(base.Base):
     def _get_instances_by_filters(self, context, filters,
                                   sort_key, sort_dir,
                                   limit=None,
-                                  marker=None):
+                                  marker=None,
+                                  columns=None):
         if 'ip6' in filters or 'ip' in filters:
             res = self.network_api.get_instance_uuids_by_ip_filter(context,
                                                                    filters)
@@ -1446,7 +1454,8 @@ class API(base.Base):
 
         return self.db.instance_get_all_by_filters(context, filters,
                                                    sort_key, sort_dir,
-                                                   limit=limit, marker=marker)
+                                                   limit=limit, marker=marker,
+                                                   columns=columns)
 
     @wrap_check_policy
     @check_instance_state(vm_state=[vm_states.ACTIVE, vm_states.STOPPED])
@@ -3177,5 +3186,11 @@ class SecurityGroupAPI(base.Base, security_group_base.SecurityGroupBase):
         if groups:
             return [{'name': group['name']} for group in groups]
 
+    def get_instances_security_groups(self, req, instance_ids):
+        """Return the security groups of instances, keyed by instance id."""
+        return dict((instance_id,
+                     self.get_instance_security_groups(req, instance_id))
+                    for instance_id in instance_ids)
+
     def populate_security_groups(self, instance, security_groups):
         instance['security_groups'] = security_groups
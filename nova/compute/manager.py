@@ -114,6 +114,12 @@ interval_opts = [
                default=60,
                help="Number of seconds between instance info_cache self "
                         "healing updates"),
+    cfg.IntOpt('heal_instance_info_cache_batch_size',
+               default=1,
+               help='Number of instances whose info_cache is healed on each '
+                    'update. With more than one, their network info is '
+                    'fetched with a single network API call and only the '
+                    'caches that changed are written'),
     cfg.IntOpt('host_state_interval',
                default=120,
                help='Interval in seconds for querying the host status'),
@@ -127,6 +133,17 @@ interval_opts = [
     cfg.IntOpt('volume_usage_poll_interval',
                default=0,
                help='Interval in seconds for gathering volume usages'),
+    cfg.IntOpt('volume_usage_flush_interval',
+               default=0,
+               help='Interval in seconds for writing the gathered volume '
+                    'usages to the database. Only the latest usage of each '
+                    'volume is kept in between. 0 writes them every time '
+                    'they are gathered'),
+    cfg.IntOpt('sync_power_state_interval',
+               default=600,
+               help='Interval in seconds for syncing the power states of all '
+                    'the instances with the hypervisor. Drivers sending '
+                    'lifecycle events keep them in sync in between'),
 ]
 
 timeout_opts = [
@@ -334,6 +351,9 @@ class ComputeManager(manager.SchedulerDependentManager):
         self._last_host_check = 0
         self._last_bw_usage_poll = 0
         self._last_vol_usage_poll = 0
+        self._last_vol_usage_flush = 0
+        # { volume_id : latest usage not written to the database yet }
+        self._pending_vol_usages = {}
         self._last_info_cache_heal = 0
         self.compute_api = compute.API()
         self.compute_rpcapi = compute_rpcapi.ComputeAPI()
@@ -529,8 +549,6 @@ class ComputeManager(manager.SchedulerDependentManager):
                   {'state': event.get_transition(),
                    'uuid': event.get_instance_uuid()})
         context = nova.context.get_admin_context()
-        instance = self.conductor_api.instance_get_by_uuid(
-            context, event.get_instance_uuid())
         vm_power_state = None
         if event.get_transition() == virtevent.EVENT_LIFECYCLE_STOPPED:
             vm_power_state = power_state.SHUTDOWN
@@ -545,9 +563,18 @@ class ComputeManager(manager.SchedulerDependentManager):
                         event.get_transition())
 
         if vm_power_state is not None:
+            try:
+                instance = self.conductor_api.instance_get_by_uuid(
+                    context, event.get_instance_uuid())
+            except exception.InstanceNotFound:
+                LOG.debug(_("Lifecycle event for an instance not in the "
+                            "database. Ignore."))
+                return
+            # The instance was just read, no need to read it again:
             self._sync_instance_power_state(context,
                                             instance,
-                                            vm_power_state)
+                                            vm_power_state,
+                                            refresh=False)
 
     def handle_events(self, event):
         if isinstance(event, virtevent.LifecycleEvent):
@@ -932,7 +959,7 @@ class ComputeManager(manager.SchedulerDependentManager):
 
         filters = {'vm_state': vm_states.BUILDING}
         building_insts = self.conductor_api.instance_get_all_by_filters(
-            context, filters)
+            context, filters, columns=['uuid', 'created_at'])
 
         for instance in building_insts:
             if timeutils.is_older_than(instance['created_at'], timeout):
@@ -2910,6 +2937,9 @@ class ComputeManager(manager.SchedulerDependentManager):
             except NotImplementedError:
                 pass
 
+            # The totals below include the usage gathered since the last
+            # flush, which must not be written as current usage anymore.
+            self._pending_vol_usages.pop(volume_id, None)
             if vol_stats:
                 LOG.debug(_("Updating volume usage cache with totals"))
                 rd_req, rd_bytes, wr_req, wr_bytes, flush_ops = vol_stats
@@ -3324,6 +3354,11 @@ class ComputeManager(manager.SchedulerDependentManager):
             return
         self._last_info_cache_heal = curr_time
 
+        batch_size = CONF.heal_instance_info_cache_batch_size
+        if batch_size > 1:
+            self._heal_instance_info_caches(context, batch_size)
+            return
+
         instance_uuids = getattr(self, '_instance_uuids_to_heal', None)
         instance = None
 
@@ -3357,6 +3392,38 @@ class ComputeManager(manager.SchedulerDependentManager):
             # We don't care about any failures
             pass
 
+    def _heal_instance_info_caches(self, context, batch_size):
+        """Update the info_caches of the next batch_size instances of this
+        host with a single call to the network API.
+        """
+        instance_uuids = getattr(self, '_instance_uuids_to_heal', None)
+        if not instance_uuids:
+            db_instances = self.conductor_api.instance_get_all_by_host(
+                    context, self.host)
+            instance_uuids = [inst['uuid'] for inst in db_instances]
+        batch = instance_uuids[:batch_size]
+        self._instance_uuids_to_heal = instance_uuids[batch_size:]
+        if not batch:
+            return
+
+        # Read the batch again, the instances may have been deleted or
+        # moved away since the uuids were listed.
+        filters = {'uuid': batch, 'host': self.host, 'deleted': False}
+        instances = self.conductor_api.instance_get_all_by_filters(context,
+                                                                   filters)
+        if not instances:
+            return
+        try:
+            self.network_api.get_instance_nw_info_bulk(context, instances,
+                    conductor_api=self.conductor_api)
+            LOG.debug(_('Updated the info_cache of %d instances'),
+                      len(instances))
+        except Exception:
+            # The next batch is healed anyway, but don't let the caches
+            # stop healing unnoticed.
+            LOG.exception(_('Failed to update the info_cache of %d '
+                            'instances'), len(instances))
+
     @manager.periodic_task
     def _poll_rebooting_instances(self, context):
         if CONF.reboot_timeout > 0:
@@ -3510,27 +3577,37 @@ class ComputeManager(manager.SchedulerDependentManager):
                 # they just don't get the info in the usage events.
                 return
 
+            if not bw_counters:
+                return
+
+            # Read the usages of all the counters of this period, and those
+            # of the previous period for counters new to this one, at once.
+            uuids = set(bw_ctr['uuid'] for bw_ctr in bw_counters)
+            usages = self._get_bw_usages(context, uuids, start_time)
+            prev_uuids = set(bw_ctr['uuid'] for bw_ctr in bw_counters
+                             if (bw_ctr['uuid'], bw_ctr['mac_address'])
+                             not in usages)
+            prev_usages = {}
+            if prev_uuids:
+                prev_usages = self._get_bw_usages(context, prev_uuids,
+                                                  prev_time)
+
             refreshed = timeutils.utcnow()
+            updates = []
             for bw_ctr in bw_counters:
-                # Allow switching of greenthreads between queries.
-                greenthread.sleep(0)
                 bw_in = 0
                 bw_out = 0
                 last_ctr_in = None
                 last_ctr_out = None
-                usage = self.conductor_api.bw_usage_get(context,
-                                                        bw_ctr['uuid'],
-                                                        start_time,
-                                                        bw_ctr['mac_address'])
+                key = (bw_ctr['uuid'], bw_ctr['mac_address'])
+                usage = usages.get(key)
                 if usage:
                     bw_in = usage['bw_in']
                     bw_out = usage['bw_out']
                     last_ctr_in = usage['last_ctr_in']
                     last_ctr_out = usage['last_ctr_out']
                 else:
-                    usage = self.conductor_api.bw_usage_get(
-                        context, bw_ctr['uuid'], prev_time,
-                        bw_ctr['mac_address'])
+                    usage = prev_usages.get(key)
                     if usage:
                         last_ctr_in = usage['last_ctr_in']
                         last_ctr_out = usage['last_ctr_out']
@@ -3549,15 +3626,25 @@ class ComputeManager(manager.SchedulerDependentManager):
                     else:
                         bw_out += (bw_ctr['bw_out'] - last_ctr_out)
 
-                self.conductor_api.bw_usage_update(context,
-                                                   bw_ctr['uuid'],
-                                                   bw_ctr['mac_address'],
-                                                   start_time,
-                                                   bw_in,
-                                                   bw_out,
-                                                   bw_ctr['bw_in'],
-                                                   bw_ctr['bw_out'],
-                                                   last_refreshed=refreshed)
+                updates.append({'uuid': bw_ctr['uuid'],
+                                'mac': bw_ctr['mac_address'],
+                                'bw_in': bw_in,
+                                'bw_out': bw_out,
+                                'last_ctr_in': bw_ctr['bw_in'],
+                                'last_ctr_out': bw_ctr['bw_out']})
+
+            self.conductor_api.bw_usage_update_bulk(context, start_time,
+                                                    updates,
+                                                    last_refreshed=refreshed)
+
+    def _get_bw_usages(self, context, uuids, start_period):
+        """Return the bandwidth usages of the instances in an audit period
+        keyed by (instance uuid, mac address).
+        """
+        usages = self.conductor_api.bw_usage_get_by_uuids(
+            context, list(uuids), start_period)
+        return dict(((usage['uuid'], usage['mac']), usage)
+                    for usage in usages)
 
     def _get_host_volume_bdms(self, context, host):
         """Return all block device mappings on a compute host."""
@@ -3572,17 +3659,36 @@ class ComputeManager(manager.SchedulerDependentManager):
         return compute_host_bdms
 
     def _update_volume_usage_cache(self, context, vol_usages, refreshed):
-        """Updates the volume usage cache table with a list of stats."""
+        """Updates the volume usage cache table with a list of stats.
+
+        The usages are kept until volume_usage_flush_interval has passed
+        since the last update, then the latest one of each volume is
+        written at once.  Returns whether the table was updated.
+        """
         for usage in vol_usages:
-            # Allow switching of greenthreads between queries.
-            greenthread.sleep(0)
-            self.conductor_api.vol_usage_update(context, usage['volume'],
-                                                usage['rd_req'],
-                                                usage['rd_bytes'],
-                                                usage['wr_req'],
-                                                usage['wr_bytes'],
-                                                usage['instance'],
-                                                last_refreshed=refreshed)
+            # The counters are totals since the volume was attached, so
+            # the latest usage replaces the previous ones.
+            self._pending_vol_usages[usage['volume']] = {
+                'volume_id': usage['volume'],
+                'instance_uuid': usage['instance']['uuid'],
+                'rd_req': usage['rd_req'],
+                'rd_bytes': usage['rd_bytes'],
+                'wr_req': usage['wr_req'],
+                'wr_bytes': usage['wr_bytes']}
+
+        curr_time = time.time()
+        if (curr_time - self._last_vol_usage_flush <
+                CONF.volume_usage_flush_interval):
+            return False
+        self._last_vol_usage_flush = curr_time
+        if not self._pending_vol_usages:
+            return False
+
+        usages = self._pending_vol_usages.values()
+        self.conductor_api.vol_usage_update_bulk(context, usages,
+                                                 last_refreshed=refreshed)
+        self._pending_vol_usages = {}
+        return True
 
     def _send_volume_usage_notifications(self, context, start_time):
         """Queries vol usage cache table and sends a vol usage notification."""
@@ -3624,8 +3730,10 @@ class ComputeManager(manager.SchedulerDependentManager):
                         return
 
                     refreshed = timeutils.utcnow()
-                    self._update_volume_usage_cache(context, vol_usages,
-                                                    refreshed)
+                    if not self._update_volume_usage_cache(context,
+                                                           vol_usages,
+                                                           refreshed):
+                        return
 
                 self._send_volume_usage_notifications(context, start_time)
 
@@ -3643,20 +3751,36 @@ class ComputeManager(manager.SchedulerDependentManager):
                 capability['host_ip'] = CONF.my_ip
             self.update_service_capabilities(capabilities)
 
-    @manager.periodic_task(spacing=600.0, run_immediately=True)
+    @manager.periodic_task(spacing=CONF.sync_power_state_interval,
+                           run_immediately=True)
     def _sync_power_states(self, context):
         """Align power states between the database and the hypervisor.
 
-        To sync power state data we make a DB call to get the number of
-        virtual machines known by the hypervisor and if the number matches the
-        number of virtual machines known by the database, we proceed in a lazy
-        loop, one database record at a time, checking if the hypervisor has the
-        same power state as is in the database.
+        This is the safety net of the lifecycle events sent by the drivers
+        supporting them.  The instances of the host are read from the
+        database in one call and, if the driver can, the power states of
+        all of its instances are asked for in one call too.  Only the
+        instances whose states differ are then read again and synced one
+        at a time.
         """
-        db_instances = self.conductor_api.instance_get_all_by_host(context,
-                                                                   self.host)
-
-        num_vm_instances = self.driver.get_num_instances()
+        try:
+            vm_power_states = self.driver.list_instance_power_states()
+            num_vm_instances = len(vm_power_states)
+        except NotImplementedError:
+            vm_power_states = None
+            num_vm_instances = self.driver.get_num_instances()
+
+        if vm_power_states is not None:
+            # Only the states are compared, the instances out of sync are
+            # read again in full.
+            filters = {'host': self.host, 'deleted': False}
+            db_instances = self.conductor_api.instance_get_all_by_filters(
+                context, filters, columns=['uuid', 'task_state',
+                                           'vm_state', 'power_state'])
+        else:
+            # get_info() needs full instances
+            db_instances = self.conductor_api.instance_get_all_by_host(
+                context, self.host)
         num_db_instances = len(db_instances)
 
         if num_vm_instances != num_db_instances:
@@ -3669,27 +3793,56 @@ class ComputeManager(manager.SchedulerDependentManager):
                            "pending task. Skip."), instance=db_instance)
                 continue
             # No pending tasks. Now try to figure out the real vm_power_state.
-            try:
-                vm_instance = self.driver.get_info(db_instance)
-                vm_power_state = vm_instance['state']
-            except exception.InstanceNotFound:
-                vm_power_state = power_state.NOSTATE
+            if vm_power_states is not None:
+                vm_power_state = vm_power_states.get(db_instance['uuid'],
+                                                     power_state.NOSTATE)
+            else:
+                try:
+                    vm_instance = self.driver.get_info(db_instance)
+                    vm_power_state = vm_instance['state']
+                except exception.InstanceNotFound:
+                    vm_power_state = power_state.NOSTATE
             # Note(maoy): the above get_info call might take a long time,
             # for example, because of a broken libvirt driver.
+            if self._power_state_in_sync(db_instance, vm_power_state):
+                continue
             self._sync_instance_power_state(context,
                                             db_instance,
                                             vm_power_state)
 
-    def _sync_instance_power_state(self, context, db_instance, vm_power_state):
+    @staticmethod
+    def _power_state_in_sync(db_instance, vm_power_state):
+        """Return True if _sync_instance_power_state() would have nothing
+        to do for the instance.
+        """
+        if vm_power_state != db_instance['power_state']:
+            return False
+        vm_state = db_instance['vm_state']
+        if vm_state == vm_states.ACTIVE:
+            return vm_power_state == power_state.RUNNING
+        elif vm_state == vm_states.STOPPED:
+            return vm_power_state in (power_state.NOSTATE,
+                                      power_state.SHUTDOWN,
+                                      power_state.CRASHED)
+        elif vm_state in (vm_states.SOFT_DELETED, vm_states.DELETED):
+            return vm_power_state in (power_state.NOSTATE,
+                                      power_state.SHUTDOWN)
+        return True
+
+    def _sync_instance_power_state(self, context, db_instance, vm_power_state,
+                                   refresh=True):
         """Align instance power state between the database and hypervisor.
 
         If the instance is not found on the hypervisor, but is in the database,
         then a stop() API will be called on the instance."""
 
-        # We re-query the DB to get the latest instance info to minimize
-        # (not eliminate) race condition.
-        u = self.conductor_api.instance_get_by_uuid(context,
-                                                    db_instance['uuid'])
+        if refresh:
+            # We re-query the DB to get the latest instance info to minimize
+            # (not eliminate) race condition.
+            u = self.conductor_api.instance_get_by_uuid(context,
+                                                        db_instance['uuid'])
+        else:
+            u = db_instance
         db_power_state = u["power_state"]
         vm_state = u['vm_state']
 
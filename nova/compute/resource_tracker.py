@@ -28,10 +28,12 @@ from nova.compute import vm_states
 from nova import conductor
 from nova import context
 from nova import exception
+from nova.openstack.common import excutils
 from nova.openstack.common import importutils
 from nova.openstack.common import jsonutils
 from nova.openstack.common import lockutils
 from nova.openstack.common import log as logging
+from nova.openstack.common import timeutils
 
 resource_tracker_opts = [
     cfg.IntOpt('reserved_host_disk_mb', default=0,
@@ -40,7 +42,23 @@ resource_tracker_opts = [
                help='Amount of memory in MB to reserve for the host'),
     cfg.StrOpt('compute_stats_class',
                default='nova.compute.stats.Stats',
-               help='Class that will manage stats for the local compute host')
+               help='Class that will manage stats for the local compute host'),
+    cfg.IntOpt('compute_node_update_max_interval',
+               default=300,
+               help='Only the resources and stats which changed are written '
+                    'to the compute node record, and nothing is written if '
+                    'none changed. This is the maximum interval in seconds '
+                    'between writes of all the resources, which replace '
+                    'the claims made by schedulers in the record. 0 writes '
+                    'all of them every time'),
+    cfg.IntOpt('resource_audit_interval',
+               default=0,
+               help='Interval in seconds between full audits of the '
+                    'resources of the compute node. In between, the usage '
+                    'maintained by the resource claims is only checked for '
+                    'drift against the instances and migrations of the node '
+                    'and a full audit is only made if they differ. 0 makes '
+                    'a full audit every time'),
 ]
 
 CONF = cfg.CONF
@@ -49,6 +67,11 @@ CONF.register_opts(resource_tracker_opts)
 LOG = logging.getLogger(__name__)
 COMPUTE_RESOURCE_SEMAPHORE = claims.COMPUTE_RESOURCE_SEMAPHORE
 
+# Compute node fields which are not resources reported by the tracker.
+UNREPORTED_FIELDS = frozenset(['id', 'service_id', 'service', 'stats',
+                               'created_at', 'updated_at', 'deleted_at',
+                               'deleted', 'generation'])
+
 
 class ResourceTracker(object):
     """Compute helper class for keeping track of resource usage as instances
@@ -64,6 +87,15 @@ class ResourceTracker(object):
         self.tracked_instances = {}
         self.tracked_migrations = {}
         self.conductor_api = conductor.API()
+        # What was last written to the compute node record, to only write
+        # the changes:
+        self.reported_values = None
+        self.reported_stats = None
+        self.last_reported = None
+        # Bumped by every change of the usage made outside of an audit,
+        # to detect claims made while the audit data was gathered:
+        self.usage_generation = 0
+        self.last_audit = None
 
     @lockutils.synchronized(COMPUTE_RESOURCE_SEMAPHORE, 'nova-')
     def instance_claim(self, context, instance_ref, limits=None):
@@ -106,6 +138,7 @@ class ResourceTracker(object):
 
             # Mark resources in-use and update stats
             self._update_usage_from_instance(self.compute_node, instance_ref)
+            self.usage_generation += 1
 
             # persist changes to the compute node:
             self._update(context, self.compute_node)
@@ -147,6 +180,7 @@ class ResourceTracker(object):
             # compute host:
             self._update_usage_from_migration(instance_ref, self.compute_node,
                                               migration_ref)
+            self.usage_generation += 1
             elevated = context.elevated()
             self._update(elevated, self.compute_node)
 
@@ -189,6 +223,7 @@ class ResourceTracker(object):
         # and associated stats:
         instance['vm_state'] = vm_states.DELETED
         self._update_usage_from_instance(self.compute_node, instance)
+        self.usage_generation += 1
 
         ctxt = context.get_admin_context()
         self._update(ctxt, self.compute_node)
@@ -201,6 +236,7 @@ class ResourceTracker(object):
             if instance_type['id'] == migration['new_instance_type_id']:
                 self.stats.update_stats_for_migration(itype, sign=-1)
                 self._update_usage(self.compute_node, itype, sign=-1)
+                self.usage_generation += 1
 
                 ctxt = context.get_admin_context()
                 self._update(ctxt, self.compute_node)
@@ -219,13 +255,13 @@ class ResourceTracker(object):
         # claim first:
         if uuid in self.tracked_instances:
             self._update_usage_from_instance(self.compute_node, instance)
+            self.usage_generation += 1
             self._update(context.elevated(), self.compute_node)
 
     @property
     def disabled(self):
         return self.compute_node is None
 
-    @lockutils.synchronized(COMPUTE_RESOURCE_SEMAPHORE, 'nova-')
     def update_available_resource(self, context, delete=False):
         """Override in-memory calculations of compute node resource usage based
         on data audited from the hypervisor layer.
@@ -233,10 +269,120 @@ class ResourceTracker(object):
         Add in resource claims in progress to account for operations that have
         declared a need for resources, but not necessarily retrieved them from
         the hypervisor layer yet.
+
+        When resource_audit_interval is set, the full audit is only made
+        that often or when the usage maintained by the claims drifted from
+        the instances and migrations of the node.
+        """
+        if not delete and self._usage_in_sync(context):
+            return
+        self._audit(context, delete=delete)
+
+    def _usage_in_sync(self, context):
+        """Check the usage maintained by the claims against the instances
+        and migrations of the node, and keep it if they match and no full
+        audit is due yet.
+        """
+        interval = CONF.resource_audit_interval
+        if (interval <= 0 or self.disabled or not self.last_audit or
+            timeutils.is_older_than(self.last_audit, interval)):
+            return False
+
+        generation = self.usage_generation
+        instances = self.conductor_api.instance_get_all_by_host_and_node(
+            context, self.host, self.nodename)
+        migrations = self.conductor_api.\
+                migration_get_in_progress_by_host_and_node(context,
+                        self.host, self.nodename)
+        return self._check_usage(context, generation, instances, migrations)
+
+    @lockutils.synchronized(COMPUTE_RESOURCE_SEMAPHORE, 'nova-')
+    def _check_usage(self, context, generation, instances, migrations):
+        if generation != self.usage_generation:
+            # A claim raced with the check, check again next time.
+            return True
+        if self._usage_drifted(instances, migrations):
+            LOG.info(_("Resource usage drifted from the instances and "
+                       "migrations of %(host)s:%(node)s, auditing")
+                     % {'host': self.host, 'node': self.nodename})
+            return False
+        # Only touches the record if it was not for a while:
+        self._update(context, self.compute_node)
+        return True
+
+    def _usage_drifted(self, instances, migrations):
+        """Return True if the tracked instances and migrations differ from
+        the ones given.
+        """
+        uuids = set()
+        for instance in instances:
+            if instance['vm_state'] == vm_states.DELETED:
+                continue
+            uuid = instance['uuid']
+            uuids.add(uuid)
+            tracked = self.tracked_instances.get(uuid)
+            if not tracked:
+                return True
+            for key in ('memory_mb', 'root_gb', 'ephemeral_gb', 'vcpus'):
+                if tracked.get(key) != instance[key]:
+                    return True
+        if uuids != set(self.tracked_instances):
+            return True
+
+        migration_uuids = set()
+        for migration in migrations:
+            instance = migration['instance']
+            if not instance or not self._instance_in_resize_state(instance):
+                continue
+            uuid = instance['uuid']
+            migration_uuids.add(uuid)
+            if uuid in self.tracked_migrations:
+                if self.tracked_migrations[uuid][0]['id'] != migration['id']:
+                    return True
+            elif uuid not in self.tracked_instances:
+                return True
+        return not migration_uuids.issuperset(self.tracked_migrations)
+
+    def _audit(self, context, delete=False):
+        """Recalculate the resource usage of the node from scratch.
+
+        The hypervisor, instances and migrations are queried without
+        holding COMPUTE_RESOURCE_SEMAPHORE, so claims are not blocked by
+        them.  If a claim changed the usage meanwhile, the audit is made
+        again while holding it.
         """
         LOG.audit(_("Auditing locally available compute resources"))
+        generation = self.usage_generation
+        audit_data = self._get_audit_data(context)
+        self._apply_audit(context, generation, audit_data, delete)
+
+    def _get_audit_data(self, context):
         resources = self.driver.get_available_resource(self.nodename)
         if not resources:
+            return None
+
+        self._verify_resources(resources)
+
+        # Grab all instances assigned to this node:
+        instances = self.conductor_api.instance_get_all_by_host_and_node(
+            context, self.host, self.nodename)
+
+        # Grab all in-progress migrations:
+        capi = self.conductor_api
+        migrations = capi.migration_get_in_progress_by_host_and_node(context,
+                self.host, self.nodename)
+
+        usage = self.driver.get_per_instance_usage()
+        return resources, instances, migrations, usage
+
+    @lockutils.synchronized(COMPUTE_RESOURCE_SEMAPHORE, 'nova-')
+    def _apply_audit(self, context, generation, audit_data, delete):
+        if generation != self.usage_generation:
+            LOG.debug(_("Resource usage changed during the audit, "
+                        "auditing again"))
+            audit_data = self._get_audit_data(context)
+
+        if not audit_data:
             if delete:
                 self._delete_compute_node(context)
                 return
@@ -247,32 +393,24 @@ class ResourceTracker(object):
                 self.compute_node = None
                 return
 
-        self._verify_resources(resources)
+        resources, instances, migrations, usage = audit_data
 
         self._report_hypervisor_resource_view(resources)
 
-        # Grab all instances assigned to this node:
-        instances = self.conductor_api.instance_get_all_by_host_and_node(
-            context, self.host, self.nodename)
-
         # Now calculate usage based on instance utilization:
         self._update_usage_from_instances(resources, instances)
 
-        # Grab all in-progress migrations:
-        capi = self.conductor_api
-        migrations = capi.migration_get_in_progress_by_host_and_node(context,
-                self.host, self.nodename)
-
         self._update_usage_from_migrations(resources, migrations)
 
         # Detect and account for orphaned instances that may exist on the
         # hypervisor, but are not in the DB:
-        orphans = self._find_orphaned_instances()
+        orphans = self._find_orphaned_instances(usage)
         self._update_usage_from_orphans(resources, orphans)
 
         self._report_final_resource_view(resources)
 
         self._sync_compute_node(context, resources)
+        self.last_audit = timeutils.utcnow()
 
     def _delete_compute_node(self, context):
         """Delete a compute node DB record."""
@@ -280,6 +418,7 @@ class ResourceTracker(object):
             LOG.audit(_("Deleting compute node %s") % self.compute_node['id'])
             self.compute_node = self.conductor_api.compute_node_delete(
                     context, self.compute_node)
+            self._reset_reported()
 
     def _sync_compute_node(self, context, resources):
         """Create or update the compute node DB record."""
@@ -296,6 +435,8 @@ class ResourceTracker(object):
                     if cn.get('hypervisor_hostname') == self.nodename:
                         self.compute_node = cn
                         break
+            # Write the whole record the first time.
+            self._reset_reported()
 
         if not self.compute_node:
             # Need to create the ComputeNode record:
@@ -306,15 +447,18 @@ class ResourceTracker(object):
 
         else:
             # just update the record:
-            self._update(context, resources, prune_stats=True)
-            LOG.info(_('Compute_service record updated for %(host)s:%(node)s')
-                    % {'host': self.host, 'node': self.nodename})
+            if self._update(context, resources, prune_stats=True):
+                LOG.info(_('Compute_service record updated for '
+                           '%(host)s:%(node)s')
+                         % {'host': self.host, 'node': self.nodename})
 
     def _create(self, context, values):
         """Create the compute node in the DB."""
         # initialize load stats from existing instances:
         self.compute_node = self.conductor_api.compute_node_create(context,
                                                                    values)
+        self._reset_reported()
+        self._set_reported(values)
 
     def _get_service(self, context):
         try:
@@ -356,18 +500,110 @@ class ResourceTracker(object):
         else:
             LOG.audit(_("Free VCPU information unavailable"))
 
+    def _reset_reported(self):
+        self.reported_values = None
+        self.reported_stats = None
+        self.last_reported = None
+
+    def _set_reported(self, values):
+        """Remember the values written to the compute node record."""
+        if self.reported_values is None:
+            self.reported_values = {}
+        for key, value in values.iteritems():
+            if key not in UNREPORTED_FIELDS:
+                self.reported_values[key] = value
+
+        stats = values.get('stats')
+        if isinstance(stats, dict):
+            if self.reported_stats is None:
+                self.reported_stats = {}
+            for key, value in stats.iteritems():
+                if value is None:
+                    self.reported_stats.pop(key, None)
+                else:
+                    self.reported_stats[key] = value
+        self.last_reported = timeutils.utcnow()
+
+    def _get_changes(self, values):
+        """Return the values, and the stats in them, which differ from
+        what was last written to the compute node record.
+
+        Removed stats are set to None.
+        """
+        changes = dict((key, value) for key, value in values.iteritems()
+                       if key not in UNREPORTED_FIELDS and
+                       (key not in self.reported_values or
+                        self.reported_values[key] != value))
+
+        stats = values.get('stats')
+        if isinstance(stats, dict) and self.reported_stats is not None:
+            changed_stats = dict((key, value)
+                                 for key, value in stats.iteritems()
+                                 if self.reported_stats.get(key) != value)
+            for key in self.reported_stats:
+                if key not in stats:
+                    changed_stats[key] = None
+            if changed_stats:
+                changes['stats'] = changed_stats
+        elif isinstance(stats, dict):
+            changes['stats'] = stats
+        return changes
+
     def _update(self, context, values, prune_stats=False):
-        """Persist the compute node updates to the DB."""
+        """Persist the compute node updates to the DB.
+
+        Only the values which changed since the last update are written.
+        Returns whether the compute node record was written.
+        """
         if "service" in self.compute_node:
             del self.compute_node['service']
-        self.compute_node = self.conductor_api.compute_node_update(
-            context, self.compute_node, values, prune_stats)
+
+        if self.reported_values is None:
+            # Nothing written yet, write everything:
+            changes = values
+        else:
+            changes = self._get_changes(values)
+            if self.reported_stats is not None:
+                # Removed stats are deleted explicitly:
+                prune_stats = False
+            max_interval = CONF.compute_node_update_max_interval
+            if (max_interval <= 0 or
+                    timeutils.is_older_than(self.last_reported,
+                                            max_interval)):
+                # Schedulers claim resources in the record directly, so
+                # the unchanged resources are rewritten from time to time
+                # to drop the claims of instances which never came here.
+                for key, value in values.iteritems():
+                    if key not in UNREPORTED_FIELDS:
+                        changes.setdefault(key, value)
+            elif not changes:
+                LOG.debug(_("Compute node record unchanged, skipping the "
+                            "update"))
+                if values is not self.compute_node:
+                    self.compute_node.update(values)
+                return False
+
+        # The DB API consumes the stats from the values, note them first.
+        self._set_reported(changes)
+        try:
+            compute_node = self.conductor_api.compute_node_update(
+                context, self.compute_node, changes, prune_stats)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                self._reset_reported()
+        # The unchanged resources of the record may include claims made
+        # by schedulers, keep the tracker's own accounting of them.
+        for key, value in values.iteritems():
+            if key not in UNREPORTED_FIELDS:
+                compute_node[key] = value
+        self.compute_node = compute_node
+        return True
 
     def confirm_resize(self, context, migration, status='confirmed'):
         """Cleanup usage for a confirmed resize."""
         elevated = context.elevated()
         self.conductor_api.migration_update(elevated, migration, status)
-        self.update_available_resource(elevated)
+        self._audit(elevated)
 
     def revert_resize(self, context, migration, status='reverted'):
         """Cleanup usage for a reverted resize."""
@@ -519,7 +755,7 @@ class ResourceTracker(object):
             else:
                 self._update_usage_from_instance(resources, instance)
 
-    def _find_orphaned_instances(self):
+    def _find_orphaned_instances(self, usage=None):
         """Given the set of instances and migrations already account for
         by resource tracker, sanity check the hypervisor to determine
         if there are any "orphaned" instances left hanging around.
@@ -532,7 +768,8 @@ class ResourceTracker(object):
         uuids2 = frozenset(self.tracked_migrations.keys())
         uuids = uuids1 | uuids2
 
-        usage = self.driver.get_per_instance_usage()
+        if usage is None:
+            usage = self.driver.get_per_instance_usage()
         vuuids = frozenset(usage.keys())
 
         orphan_uuids = vuuids - uuids
@@ -84,11 +84,11 @@ class LocalAPI(object):
 
     def instance_get_all_by_filters(self, context, filters,
                                     sort_key='created_at',
-                                    sort_dir='desc'):
+                                    sort_dir='desc', columns=None,
+                                    expected_attrs=None):
         return self._manager.instance_get_all_by_filters(context,
-                                                         filters,
-                                                         sort_key,
-                                                         sort_dir)
+                filters, sort_key, sort_dir, columns=columns,
+                expected_attrs=expected_attrs)
 
     def instance_get_all_hung_in_rebooting(self, context, timeout):
         return self._manager.instance_get_all_hung_in_rebooting(context,
@@ -172,6 +172,16 @@ class LocalAPI(object):
                                              last_ctr_in, last_ctr_out,
                                              last_refreshed)
 
+    def bw_usage_get_by_uuids(self, context, uuids, start_period):
+        return self._manager.bw_usage_update_bulk(context, start_period,
+                                                  uuids=uuids)
+
+    def bw_usage_update_bulk(self, context, start_period, usages,
+                             last_refreshed=None):
+        return self._manager.bw_usage_update_bulk(
+            context, start_period, usages=usages,
+            last_refreshed=last_refreshed)
+
     def get_backdoor_port(self, context, host):
         raise exc.InvalidRequest
 
@@ -235,6 +245,10 @@ class LocalAPI(object):
                                               instance, last_refreshed,
                                               update_totals)
 
+    def vol_usage_update_bulk(self, context, usages, last_refreshed=None):
+        return self._manager.vol_usage_update_bulk(context, usages,
+                                                   last_refreshed)
+
     def service_get_all(self, context):
         return self._manager.service_get_all_by(context)
 
@@ -403,11 +417,11 @@ class API(object):
 
     def instance_get_all_by_filters(self, context, filters,
                                     sort_key='created_at',
-                                    sort_dir='desc'):
+                                    sort_dir='desc', columns=None,
+                                    expected_attrs=None):
         return self.conductor_rpcapi.instance_get_all_by_filters(context,
-                                                                 filters,
-                                                                 sort_key,
-                                                                 sort_dir)
+                filters, sort_key, sort_dir, columns=columns,
+                expected_attrs=expected_attrs)
 
     def instance_get_all_hung_in_rebooting(self, context, timeout):
         return self.conductor_rpcapi.instance_get_all_hung_in_rebooting(
@@ -499,6 +513,17 @@ class API(object):
             bw_in, bw_out, last_ctr_in, last_ctr_out,
             last_refreshed)
 
+    def bw_usage_get_by_uuids(self, context, uuids, start_period):
+        return self.conductor_rpcapi.bw_usage_update_bulk(context,
+                                                          start_period,
+                                                          uuids=uuids)
+
+    def bw_usage_update_bulk(self, context, start_period, usages,
+                             last_refreshed=None):
+        return self.conductor_rpcapi.bw_usage_update_bulk(
+            context, start_period, usages=usages,
+            last_refreshed=last_refreshed)
+
     #NOTE(mtreinish): This doesn't work on multiple conductors without any
     # topic calculation in conductor_rpcapi. So the host param isn't used
     # currently.
@@ -568,6 +593,10 @@ class API(object):
                                                       instance, last_refreshed,
                                                       update_totals)
 
+    def vol_usage_update_bulk(self, context, usages, last_refreshed=None):
+        return self.conductor_rpcapi.vol_usage_update_bulk(context, usages,
+                                                           last_refreshed)
+
     def service_get_all(self, context):
         return self.conductor_rpcapi.service_get_all_by(context)
 
@@ -49,7 +49,7 @@ datetime_fields = ['launched_at', 'terminated_at', 'updated_at']
 class ConductorManager(manager.Manager):
     """Mission: TBD."""
 
-    RPC_API_VERSION = '1.45'
+    RPC_API_VERSION = '1.48'
 
     def __init__(self, *args, **kwargs):
         super(ConductorManager, self).__init__(*args, **kwargs)
@@ -200,6 +200,16 @@ class ConductorManager(manager.Manager):
         usage = self.db.bw_usage_get(context, uuid, start_period, mac)
         return jsonutils.to_primitive(usage)
 
+    def bw_usage_update_bulk(self, context, start_period, usages=None,
+                             uuids=None, last_refreshed=None):
+        if usages:
+            self.db.bw_usage_update_bulk(context, start_period, usages,
+                                         last_refreshed)
+        if uuids:
+            result = self.db.bw_usage_get_by_uuids(context, uuids,
+                                                   start_period)
+            return jsonutils.to_primitive(result)
+
     def get_backdoor_port(self, context):
         return self.backdoor_port
 
@@ -254,9 +264,11 @@ class ConductorManager(manager.Manager):
                                       " invocation"))
 
     def instance_get_all_by_filters(self, context, filters, sort_key,
-                                    sort_dir):
+                                    sort_dir, columns=None,
+                                    expected_attrs=None):
         result = self.db.instance_get_all_by_filters(context, filters,
-                                                     sort_key, sort_dir)
+                sort_key, sort_dir, columns=columns,
+                expected_attrs=expected_attrs)
         return jsonutils.to_primitive(result)
 
     def instance_get_all_hung_in_rebooting(self, context, timeout):
@@ -305,6 +317,9 @@ class ConductorManager(manager.Manager):
                                  wr_bytes, instance['uuid'], last_refreshed,
                                  update_totals)
 
+    def vol_usage_update_bulk(self, context, usages, last_refreshed=None):
+        self.db.vol_usage_update_bulk(context, usages, last_refreshed)
+
     @rpc_common.client_exceptions(exception.ComputeHostNotFound,
                                   exception.HostBinaryNotFound)
     def service_get_all_by(self, context, topic=None, host=None, binary=None):
@@ -83,6 +83,9 @@ class ConductorAPI(nova.openstack.common.rpc.proxy.RpcProxy):
     1.43 - Added compute_stop
     1.44 - Added compute_node_delete
     1.45 - Added project_id to quota_commit and quota_rollback
+    1.46 - Added columns and expected_attrs to instance_get_all_by_filters
+    1.47 - Added bw_usage_update_bulk
+    1.48 - Added vol_usage_update_bulk
     """
 
     BASE_RPC_API_VERSION = '1.0'
@@ -197,6 +200,14 @@ class ConductorAPI(nova.openstack.common.rpc.proxy.RpcProxy):
                             last_refreshed=last_refreshed)
         return self.call(context, msg, version='1.5')
 
+    def bw_usage_update_bulk(self, context, start_period, usages=None,
+                             uuids=None, last_refreshed=None):
+        usages_p = jsonutils.to_primitive(usages)
+        msg = self.make_msg('bw_usage_update_bulk',
+                            start_period=start_period, usages=usages_p,
+                            uuids=uuids, last_refreshed=last_refreshed)
+        return self.call(context, msg, version='1.47')
+
     def get_backdoor_port(self, context):
         msg = self.make_msg('get_backdoor_port')
         return self.call(context, msg, version='1.6')
@@ -247,11 +258,13 @@ class ConductorAPI(nova.openstack.common.rpc.proxy.RpcProxy):
         return self.call(context, msg, version='1.14')
 
     def instance_get_all_by_filters(self, context, filters, sort_key,
-                                    sort_dir):
+                                    sort_dir, columns=None,
+                                    expected_attrs=None):
         msg = self.make_msg('instance_get_all_by_filters',
                             filters=filters, sort_key=sort_key,
-                            sort_dir=sort_dir)
-        return self.call(context, msg, version='1.15')
+                            sort_dir=sort_dir, columns=columns,
+                            expected_attrs=expected_attrs)
+        return self.call(context, msg, version='1.46')
 
     def instance_get_all_hung_in_rebooting(self, context, timeout):
         msg = self.make_msg('instance_get_all_hung_in_rebooting',
@@ -296,6 +309,12 @@ class ConductorAPI(nova.openstack.common.rpc.proxy.RpcProxy):
                             update_totals=update_totals)
         return self.call(context, msg, version='1.19')
 
+    def vol_usage_update_bulk(self, context, usages, last_refreshed=None):
+        usages_p = jsonutils.to_primitive(usages)
+        msg = self.make_msg('vol_usage_update_bulk', usages=usages_p,
+                            last_refreshed=last_refreshed)
+        return self.call(context, msg, version='1.48')
+
     def service_get_all_by(self, context, topic=None, host=None, binary=None):
         msg = self.make_msg('service_get_all_by', topic=topic, host=host,
                             binary=binary)
@@ -182,6 +182,15 @@ def compute_node_get_all(context):
     return IMPL.compute_node_get_all(context)
 
 
+def compute_node_get_all_changed_since(context, changes_since):
+    """Get all computeNodes created, updated or deleted since a given time.
+
+    Deleted computeNodes are included so callers can forget about them.
+    Services reporting in do not count as changes.
+    """
+    return IMPL.compute_node_get_all_changed_since(context, changes_since)
+
+
 def compute_node_search_by_hypervisor(context, hypervisor_match):
     """Get computeNodes given a hypervisor hostname match string."""
     return IMPL.compute_node_search_by_hypervisor(context, hypervisor_match)
@@ -195,11 +204,26 @@ def compute_node_create(context, values):
 def compute_node_update(context, compute_id, values, prune_stats=False):
     """Set the given properties on a computeNode and update it.
 
+    Only the stats given are updated, stats set to None are removed and,
+    if prune_stats is set, so are the stats not given.
+
     Raises ComputeHostNotFound if computeNode does not exist.
     """
     return IMPL.compute_node_update(context, compute_id, values, prune_stats)
 
 
+def compute_node_claim(context, compute_id, generation, memory_mb,
+                       local_gb, vcpus):
+    """Consume resources on a computeNode if it is still at the given
+    generation, and return its new generation.
+
+    Raises ComputeNodeGenerationConflict if the computeNode was updated
+    since.
+    """
+    return IMPL.compute_node_claim(context, compute_id, generation,
+                                   memory_mb, local_gb, vcpus)
+
+
 def compute_node_delete(context, compute_id):
     """Delete a computeNode from the database.
 
@@ -604,11 +628,19 @@ def instance_get_all(context, columns_to_join=None):
 
 
 def instance_get_all_by_filters(context, filters, sort_key='created_at',
-                                sort_dir='desc', limit=None, marker=None):
-    """Get all instances that match all filters."""
+                                sort_dir='desc', limit=None, marker=None,
+                                columns=None, expected_attrs=None):
+    """Get all instances that match all filters.
+
+    :param columns: list of the instance columns to return, as dicts
+                    without any relation, instead of the instances.
+    :param expected_attrs: list of the relations to load along with the
+                           instances, all of them by default.
+    """
     return IMPL.instance_get_all_by_filters(context, filters, sort_key,
                                             sort_dir, limit=limit,
-                                            marker=marker)
+                                            marker=marker, columns=columns,
+                                            expected_attrs=expected_attrs)
 
 
 def instance_get_active_by_window_joined(context, begin, end=None,
@@ -1431,6 +1463,29 @@ def bw_usage_update(context, uuid, mac, start_period, bw_in, bw_out,
     return rv
 
 
+def bw_usage_update_bulk(context, start_period, usages, last_refreshed=None,
+                         update_cells=True):
+    """Update the cached bandwidth usage of many instance networks in one
+    transaction.  Creates new records if needed.
+
+    :param usages: list of dicts with the uuid, mac, bw_in, bw_out,
+                   last_ctr_in and last_ctr_out of each network.
+    """
+    rv = IMPL.bw_usage_update_bulk(context, start_period, usages,
+                                   last_refreshed=last_refreshed)
+    if update_cells:
+        try:
+            cells_api = cells_rpcapi.CellsAPI()
+            for usage in usages:
+                cells_api.bw_usage_update_at_top(context, usage['uuid'],
+                        usage['mac'], start_period, usage['bw_in'],
+                        usage['bw_out'], usage['last_ctr_in'],
+                        usage['last_ctr_out'], last_refreshed)
+        except Exception:
+            LOG.exception(_("Failed to notify cells of bw_usage update"))
+    return rv
+
+
 ####################
 
 
@@ -1470,6 +1525,17 @@ def vol_usage_update(context, id, rd_req, rd_bytes, wr_req, wr_bytes,
                                  update_totals=update_totals)
 
 
+def vol_usage_update_bulk(context, usages, last_refreshed=None):
+    """Update the cached current usage of many volumes in one transaction.
+    Creates new records if needed.
+
+    :param usages: list of dicts with the volume_id, instance_uuid, rd_req,
+                   rd_bytes, wr_req and wr_bytes of each volume.
+    """
+    return IMPL.vol_usage_update_bulk(context, usages,
+                                      last_refreshed=last_refreshed)
+
+
 ###################
 
 
@@ -1515,6 +1581,16 @@ def aggregate_metadata_get_by_host(context, host, key=None):
     return IMPL.aggregate_metadata_get_by_host(context, host, key)
 
 
+def aggregate_metadata_get_all_by_host(context):
+    """Get the aggregate metadata of every host in an aggregate.
+
+    Returns a dictionary where each key is a hostname and each value is the
+    same dictionary aggregate_metadata_get_by_host would return for it.
+    return value:  {machine: {key: set( value1, value2 )}}
+    """
+    return IMPL.aggregate_metadata_get_all_by_host(context)
+
+
 def aggregate_host_get_by_metadata_key(context, key):
     """Get hosts with a specific metadata key metadata for all aggregates.
 
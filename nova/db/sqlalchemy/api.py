@@ -78,6 +78,10 @@ LOG = logging.getLogger(__name__)
 get_engine = db_session.get_engine
 get_session = db_session.get_session
 
+# Relations loaded with the instances by instance_get_all_by_filters:
+INSTANCE_JOINED_ATTRS = ('info_cache', 'security_groups', 'system_metadata',
+                         'metadata')
+
 
 def get_backend():
     """The backend is this module itself."""
@@ -465,6 +469,17 @@ def compute_node_get_all(context):
             all()
 
 
+@require_admin_context
+def compute_node_get_all_changed_since(context, changes_since):
+    return model_query(context, models.ComputeNode, read_deleted="yes").\
+            options(joinedload('service')).\
+            options(joinedload('stats')).\
+            filter(or_(models.ComputeNode.created_at >= changes_since,
+                       models.ComputeNode.updated_at >= changes_since,
+                       models.ComputeNode.deleted_at >= changes_since)).\
+            all()
+
+
 @require_admin_context
 def compute_node_search_by_hypervisor(context, hypervisor_match):
     field = models.ComputeNode.hypervisor_hostname
@@ -511,10 +526,17 @@ def _update_stats(context, new_stats, compute_id, session, prune_stats=False):
     stats = []
     for k, v in new_stats.iteritems():
         old_stat = statmap.pop(k, None)
+        if v is None:
+            # remove the stat:
+            if old_stat:
+                session.add(old_stat)
+                old_stat.soft_delete(session=session)
+            continue
         if old_stat:
-            # update existing value:
-            old_stat.update({'value': v})
-            stats.append(old_stat)
+            # update existing value, unless it is unchanged:
+            if old_stat['value'] != unicode(v):
+                old_stat.update({'value': v})
+                stats.append(old_stat)
         else:
             # add new stat:
             stat = models.ComputeNodeStat()
@@ -550,9 +572,37 @@ def compute_node_update(context, compute_id, values, prune_stats=False):
             values['updated_at'] = timeutils.utcnow()
         convert_datetimes(values, 'created_at', 'deleted_at', 'updated_at')
         compute_ref.update(values)
+        # The generation is bumped in SQL, so a claim committed since the
+        # row was read still conflicts with the scheduler's view of it.
+        compute_ref.generation = models.ComputeNode.generation + 1
+        session.flush()
+        session.refresh(compute_ref, ['generation'])
     return compute_ref
 
 
+@require_admin_context
+def compute_node_claim(context, compute_id, generation, memory_mb,
+                       local_gb, vcpus):
+    node = models.ComputeNode
+    result = model_query(context, node, read_deleted="no").\
+             filter_by(id=compute_id).\
+             filter_by(generation=generation).\
+             update({'generation': node.generation + 1,
+                     'free_ram_mb': node.free_ram_mb - memory_mb,
+                     'memory_mb_used': node.memory_mb_used + memory_mb,
+                     'free_disk_gb': node.free_disk_gb - local_gb,
+                     'disk_available_least':
+                            node.disk_available_least - local_gb,
+                     'local_gb_used': node.local_gb_used + local_gb,
+                     'vcpus_used': node.vcpus_used + vcpus,
+                     'updated_at': timeutils.utcnow()},
+                    synchronize_session=False)
+    if not result:
+        raise exception.ComputeNodeGenerationConflict(compute_id=compute_id,
+                                                      generation=generation)
+    return generation + 1
+
+
 @require_admin_context
 def compute_node_delete(context, compute_id):
     """Delete a ComputeNode record."""
@@ -1573,22 +1623,35 @@ def instance_get_all(context, columns_to_join=None):
 
 @require_context
 def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
-                                limit=None, marker=None, session=None):
+                                limit=None, marker=None, session=None,
+                                columns=None, expected_attrs=None):
     """Return instances that match all filters.  Deleted instances
     will be returned by default, unless there's a filter that says
-    otherwise"""
+    otherwise
+
+    expected_attrs lists the relations to load along with the instances,
+    all of INSTANCE_JOINED_ATTRS by default.  When columns is given, only
+    these columns are queried, without any relation, and dicts of them are
+    returned instead of instances."""
 
     sort_fn = {'desc': desc, 'asc': asc}
 
     if not session:
         session = get_session()
 
-    query_prefix = session.query(models.Instance).\
-            options(joinedload('info_cache')).\
-            options(joinedload('security_groups')).\
-            options(joinedload('system_metadata')).\
-            options(joinedload('metadata')).\
-            order_by(sort_fn[sort_dir](getattr(models.Instance, sort_key)))
+    if columns is not None:
+        query_prefix = session.query(*_instance_columns(columns))
+    else:
+        query_prefix = session.query(models.Instance)
+        if expected_attrs is None:
+            expected_attrs = INSTANCE_JOINED_ATTRS
+        for attr in expected_attrs:
+            if attr not in INSTANCE_JOINED_ATTRS:
+                raise exception.InvalidInput(
+                        reason=_("Unknown instance attribute %s") % attr)
+            query_prefix = query_prefix.options(joinedload(attr))
+    query_prefix = query_prefix.order_by(
+            sort_fn[sort_dir](getattr(models.Instance, sort_key)))
 
     # Make a copy of the filters dictionary to use going forward, as we'll
     # be modifying it and we shouldn't affect the caller's use of it.
@@ -1643,9 +1706,21 @@ def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
                            sort_dir=sort_dir)
 
     instances = query_prefix.all()
+    if columns is not None:
+        return [dict(zip(columns, row)) for row in instances]
     return instances
 
 
+def _instance_columns(columns):
+    """Return the Instance columns of the given names."""
+    table_columns = models.Instance.__table__.columns
+    for name in columns:
+        if name not in table_columns:
+            raise exception.InvalidInput(
+                    reason=_("Unknown instance column %s") % name)
+    return [getattr(models.Instance, name) for name in columns]
+
+
 def regex_filter(query, model, filters):
     """Applies regular expression filtering to a query.
 
@@ -3956,6 +4031,42 @@ def bw_usage_update(context, uuid, mac, start_period, bw_in, bw_out,
         bwusage.save(session=session)
 
 
+@require_context
+@_retry_on_deadlock
+def bw_usage_update_bulk(context, start_period, usages, last_refreshed=None):
+    if not usages:
+        return
+
+    if last_refreshed is None:
+        last_refreshed = timeutils.utcnow()
+
+    session = get_session()
+    with session.begin():
+        uuids = set(usage['uuid'] for usage in usages)
+        rows = model_query(context, models.BandwidthUsage,
+                           session=session, read_deleted="yes").\
+                       filter(models.BandwidthUsage.uuid.in_(uuids)).\
+                       filter_by(start_period=start_period).\
+                       all()
+        existing = dict(((row.uuid, row.mac), row) for row in rows)
+
+        for usage in usages:
+            key = (usage['uuid'], usage['mac'])
+            bwusage = existing.get(key)
+            if bwusage is None:
+                bwusage = models.BandwidthUsage()
+                bwusage.start_period = start_period
+                bwusage.uuid = usage['uuid']
+                bwusage.mac = usage['mac']
+                session.add(bwusage)
+                existing[key] = bwusage
+            bwusage.last_refreshed = last_refreshed
+            bwusage.bw_in = usage['bw_in']
+            bwusage.bw_out = usage['bw_out']
+            bwusage.last_ctr_in = usage['last_ctr_in']
+            bwusage.last_ctr_out = usage['last_ctr_out']
+
+
 ####################
 
 
@@ -4115,6 +4226,40 @@ def vol_usage_update(context, id, rd_req, rd_bytes, wr_req, wr_bytes,
     return
 
 
+@require_context
+def vol_usage_update_bulk(context, usages, last_refreshed=None):
+    if not usages:
+        return
+
+    if last_refreshed is None:
+        last_refreshed = timeutils.utcnow()
+
+    session = get_session()
+    with session.begin():
+        volume_ids = set(usage['volume_id'] for usage in usages)
+        rows = model_query(context, models.VolumeUsage,
+                           session=session, read_deleted="yes").\
+                           filter(models.VolumeUsage.volume_id.in_(
+                                  volume_ids)).\
+                           all()
+        existing = dict((row.volume_id, row) for row in rows)
+
+        for usage in usages:
+            vol_usage = existing.get(usage['volume_id'])
+            if vol_usage is None:
+                vol_usage = models.VolumeUsage()
+                vol_usage.tot_last_refreshed = timeutils.utcnow()
+                vol_usage.volume_id = usage['volume_id']
+                session.add(vol_usage)
+                existing[usage['volume_id']] = vol_usage
+            vol_usage.curr_last_refreshed = last_refreshed
+            vol_usage.curr_reads = usage['rd_req']
+            vol_usage.curr_read_bytes = usage['rd_bytes']
+            vol_usage.curr_writes = usage['wr_req']
+            vol_usage.curr_write_bytes = usage['wr_bytes']
+            vol_usage.instance_id = usage['instance_uuid']
+
+
 ####################
 
 
@@ -4239,6 +4384,18 @@ def aggregate_metadata_get_by_host(context, host, key=None):
     return dict(metadata)
 
 
+@require_admin_context
+def aggregate_metadata_get_all_by_host(context):
+    rows = _aggregate_get_query(context, models.Aggregate).all()
+    metadata = collections.defaultdict(lambda: collections.defaultdict(set))
+    for agg in rows:
+        for agghost in agg._hosts:
+            for kv in agg._metadata:
+                metadata[agghost.host][kv['key']].add(kv['value'])
+    return dict((host, dict(host_metadata))
+                for host, host_metadata in metadata.iteritems())
+
+
 @require_admin_context
 def aggregate_host_get_by_metadata_key(context, key):
     query = model_query(context, models.Aggregate).join(
@@ -95,6 +95,10 @@ class ComputeNode(BASE, NovaBase):
     cpu_info = Column(Text, nullable=True)
     disk_available_least = Column(Integer)
 
+    # Incremented on every update, so that schedulers claiming resources
+    # on the compute node can detect that their view of it is stale.
+    generation = Column(Integer, default=0)
+
 
 class ComputeNodeStat(BASE, NovaBase):
     """Stats related to the current workload of a compute host that are
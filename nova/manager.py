@@ -53,6 +53,7 @@ This module provides Manager, a base class for managers.
 
 """
 
+import random
 import time
 
 import eventlet
@@ -71,6 +72,30 @@ periodic_opts = [
                default=True,
                help=('Some periodic tasks can be run in a separate process. '
                      'Should we run them here?')),
+    cfg.IntOpt('periodic_task_workers',
+               default=1,
+               help='Number of periodic tasks of a service that can run at '
+                    'the same time. With 1, the tasks run one after '
+                    'another. When all the workers are busy, the periodic '
+                    'loop waits for one of them before starting the next '
+                    'due task'),
+    cfg.IntOpt('periodic_task_deadline',
+               default=0,
+               help='Seconds a periodic task may run before it is reported '
+                    'as overrunning. 0 uses the interval of each task. '
+                    'With more than one periodic_task_workers, a task is '
+                    'reported while it is still running'),
+    cfg.FloatOpt('periodic_task_jitter',
+                 default=0.0,
+                 help='Delay the first run of each periodic task by a '
+                      'random fraction of its interval up to this value, '
+                      'so that hosts started together do not run their '
+                      'tasks at the same time'),
+    cfg.IntOpt('periodic_task_stats_interval',
+               default=600,
+               help='Interval in seconds between logging the runtime '
+                    'statistics of the periodic tasks. A negative value '
+                    'disables the logging'),
     ]
 
 CONF = cfg.CONF
@@ -200,8 +225,28 @@ class Manager(base.Base):
         self.host = host
         self.load_plugins()
         self.backdoor_port = None
+        self._init_periodic_tasks()
         super(Manager, self).__init__(db_driver)
 
+    def _init_periodic_tasks(self):
+        self._periodic_last_run = self._periodic_last_run.copy()
+        # { task_name : time the running task started }
+        self._periodic_running = {}
+        # names of the running tasks reported as overrunning
+        self._periodic_overrunning = set()
+        self._periodic_stats = {}
+        self._periodic_stats_logged = time.time()
+        self._periodic_pool = None
+
+        jitter = CONF.periodic_task_jitter
+        if jitter <= 0:
+            return
+        for task_name, task in self._periodic_tasks:
+            spacing = self._periodic_spacing[task_name]
+            if spacing and self._periodic_last_run[task_name] is not None:
+                self._periodic_last_run[task_name] += random.uniform(
+                        0, jitter * spacing)
+
     def load_plugins(self):
         pluginmgr = pluginmanager.PluginManager('nova', self.__class__)
         pluginmgr.load_plugins()
@@ -215,43 +260,164 @@ class Manager(base.Base):
         return rpc_dispatcher.RpcDispatcher([self])
 
     def periodic_tasks(self, context, raise_on_error=False):
-        """Tasks to be run at a periodic interval."""
+        """Tasks to be run at a periodic interval.
+
+        When periodic_task_workers allows it, the due tasks are spawned
+        and run concurrently, and this returns without waiting for them
+        to finish.  Spawning blocks while every worker is busy, so a pass
+        with more due tasks than free workers waits for the earlier ones.
+        A task still running from a previous pass is not started again,
+        and is reported once it runs past its deadline.
+        With raise_on_error, the tasks are run one after another so their
+        errors are raised to the caller.
+        """
+        self._check_running_periodic_tasks()
+        self._log_periodic_task_stats()
+
         idle_for = DEFAULT_INTERVAL
+        parallel = CONF.periodic_task_workers > 1 and not raise_on_error
         for task_name, task in self._periodic_tasks:
             full_task_name = '.'.join([self.__class__.__name__, task_name])
+            spacing = self._periodic_spacing[task_name]
 
             # If a periodic task is _nearly_ due, then we'll run it early
-            if self._periodic_spacing[task_name] is None:
+            if spacing is None:
                 wait = 0
             elif self._periodic_last_run[task_name] is None:
                 wait = 0
             else:
-                due = (self._periodic_last_run[task_name] +
-                       self._periodic_spacing[task_name])
+                due = self._periodic_last_run[task_name] + spacing
                 wait = max(0, due - time.time())
                 if wait > 0.2:
                     if wait < idle_for:
                         idle_for = wait
                     continue
 
-            LOG.debug(_("Running periodic task %(full_task_name)s"), locals())
-            self._periodic_last_run[task_name] = time.time()
-
-            try:
-                task(self, context)
-            except Exception as e:
-                if raise_on_error:
-                    raise
-                LOG.exception(_("Error during %(full_task_name)s: %(e)s"),
-                              locals())
-
-            if (not self._periodic_spacing[task_name] is None and
-                self._periodic_spacing[task_name] < idle_for):
-                idle_for = self._periodic_spacing[task_name]
+            if task_name in self._periodic_running:
+                self._skip_periodic_task(task_name, full_task_name)
+            else:
+                LOG.debug(_("Running periodic task %(full_task_name)s"),
+                          locals())
+                self._periodic_last_run[task_name] = time.time()
+                self._periodic_running[task_name] = time.time()
+                if parallel:
+                    if self._periodic_pool is None:
+                        self._periodic_pool = eventlet.GreenPool(
+                                CONF.periodic_task_workers)
+                    self._periodic_pool.spawn_n(self._run_periodic_task,
+                            context, task_name, task, raise_on_error)
+                else:
+                    self._run_periodic_task(context, task_name, task,
+                                            raise_on_error)
+
+            if spacing is not None and spacing < idle_for:
+                idle_for = spacing
             eventlet.sleep(0)
 
         return idle_for
 
+    def _run_periodic_task(self, context, task_name, task, raise_on_error):
+        full_task_name = '.'.join([self.__class__.__name__, task_name])
+        start = self._periodic_running[task_name]
+        failed = False
+        try:
+            task(self, context)
+        except Exception as e:
+            failed = True
+            if raise_on_error:
+                raise
+            LOG.exception(_("Error during %(full_task_name)s: %(e)s"),
+                          locals())
+        finally:
+            del self._periodic_running[task_name]
+            self._record_periodic_task_run(task_name, full_task_name,
+                                           time.time() - start, failed)
+            self._periodic_overrunning.discard(task_name)
+
+    def _periodic_task_deadline(self, task_name):
+        return (CONF.periodic_task_deadline or
+                self._periodic_spacing[task_name])
+
+    def _get_periodic_task_stats(self, task_name):
+        return self._periodic_stats.setdefault(task_name,
+                dict(runs=0, failures=0, overruns=0, skipped=0,
+                     last_duration=0.0, max_duration=0.0,
+                     total_duration=0.0))
+
+    def _check_running_periodic_tasks(self):
+        """Report the running tasks that passed their deadline."""
+        now = time.time()
+        for task_name, start in self._periodic_running.items():
+            deadline = self._periodic_task_deadline(task_name)
+            if (not deadline or now - start <= deadline or
+                    task_name in self._periodic_overrunning):
+                continue
+            self._periodic_overrunning.add(task_name)
+            self._get_periodic_task_stats(task_name)['overruns'] += 1
+            LOG.warn(_("Periodic task %(task)s has been running for "
+                       "%(duration).2f seconds, more than its deadline of "
+                       "%(deadline)s seconds"),
+                     {'task': '.'.join([self.__class__.__name__,
+                                        task_name]),
+                      'duration': now - start, 'deadline': deadline})
+
+    def _record_periodic_task_run(self, task_name, full_task_name,
+                                  duration, failed):
+        overrunning = task_name in self._periodic_overrunning
+        stats = self._get_periodic_task_stats(task_name)
+        stats['runs'] += 1
+        if failed:
+            stats['failures'] += 1
+        stats['last_duration'] = duration
+        stats['max_duration'] = max(stats['max_duration'], duration)
+        stats['total_duration'] += duration
+        LOG.debug(_("Periodic task %(task)s took %(duration).2f seconds"),
+                  {'task': full_task_name, 'duration': duration})
+
+        deadline = self._periodic_task_deadline(task_name)
+        if deadline and duration > deadline:
+            if not overrunning:
+                stats['overruns'] += 1
+            LOG.warn(_("Periodic task %(task)s took %(duration).2f seconds, "
+                       "more than its deadline of %(deadline)s seconds"),
+                     {'task': full_task_name, 'duration': duration,
+                      'deadline': deadline})
+
+    def _skip_periodic_task(self, task_name, full_task_name):
+        stats = self._get_periodic_task_stats(task_name)
+        stats['skipped'] += 1
+        LOG.warn(_("Skipping periodic task %(task)s because its previous "
+                   "run, started %(age).2f seconds ago, is still going"),
+                 {'task': full_task_name,
+                  'age': time.time() - self._periodic_running[task_name]})
+
+    def _log_periodic_task_stats(self):
+        """Log the statistics of the periodic tasks every
+        periodic_task_stats_interval seconds.
+        """
+        interval = CONF.periodic_task_stats_interval
+        now = time.time()
+        if interval < 0 or now - self._periodic_stats_logged < interval:
+            return
+        self._periodic_stats_logged = now
+        for task_name, stats in sorted(self._periodic_stats.iteritems()):
+            LOG.info(_("Periodic task %(task)s: %(runs)d runs, "
+                       "%(failures)d failures, %(overruns)d overruns, "
+                       "%(skipped)d skipped, %(max_duration).2f seconds "
+                       "max, %(total_duration).2f seconds in total"),
+                     dict(stats, task='.'.join([self.__class__.__name__,
+                                                task_name])))
+
+    def get_periodic_task_stats(self):
+        """Return the runtime statistics of the periodic tasks.
+
+        For each task that ran: the number of runs, failures, overruns of
+        the deadline and runs skipped because the task was still running,
+        and the last, maximum and total durations in seconds.
+        """
+        return dict((task_name, dict(stats))
+                    for task_name, stats in self._periodic_stats.iteritems())
+
     def init_host(self):
         """Hook to do additional manager initialization when one requests
         the service be started.  This is called before any service record
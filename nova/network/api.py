@@ -26,6 +26,7 @@ from nova import exception
 from nova.network import floating_ips
 from nova.network import model as network_model
 from nova.network import rpcapi as network_rpcapi
+from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
 from nova import policy
 from nova import utils
@@ -79,6 +80,44 @@ def update_instance_cache_with_nw_info(api, context, instance,
         LOG.exception(_('Failed storing info cache'), instance=instance)
 
 
+def update_instance_caches_with_nw_info(api, context, instances, nw_infos,
+                                        conductor_api=None):
+    """Store the network info of many instances in their info caches.
+
+    Only the caches whose network info changed are written, the current
+    one being read from the info_cache of each instance.  Returns the
+    uuids of the instances whose cache was updated.
+    """
+    updated = []
+    for instance in instances:
+        nw_info = nw_infos.get(instance['uuid'])
+        if nw_info is None:
+            continue
+        network_info = nw_info.json()
+        info_cache = instance.get('info_cache') or {}
+        try:
+            cached = jsonutils.loads(info_cache.get('network_info') or '[]')
+            if cached == jsonutils.loads(network_info):
+                continue
+        except ValueError:
+            # A corrupted cache is replaced below.
+            pass
+
+        cache = {'network_info': network_info}
+        try:
+            if conductor_api:
+                conductor_api.instance_info_cache_update(context, instance,
+                                                         cache)
+            else:
+                api.db.instance_info_cache_update(context, instance['uuid'],
+                                                  cache)
+        except Exception:
+            LOG.exception(_('Failed storing info cache'), instance=instance)
+        else:
+            updated.append(instance['uuid'])
+    return updated
+
+
 def wrap_check_policy(func):
     """Check policy corresponding to the wrapped methods prior to execution."""
 
@@ -375,6 +414,26 @@ class API(base.Base):
 
         return network_model.NetworkInfo.hydrate(nw_info)
 
+    @wrap_check_policy
+    def get_instance_nw_info_bulk(self, context, instances,
+                                  conductor_api=None):
+        """Returns the network info of many instances keyed by uuid, and
+        updates the info caches that changed.
+        """
+        args = []
+        for instance in instances:
+            instance_type = instance_types.extract_instance_type(instance)
+            args.append({'instance_id': instance['uuid'],
+                         'rxtx_factor': instance_type['rxtx_factor'],
+                         'host': instance['host']})
+        nw_infos = self.network_rpcapi.get_instance_nw_info_bulk(context,
+                                                                 args)
+        nw_infos = dict((uuid, network_model.NetworkInfo.hydrate(nw_info))
+                        for uuid, nw_info in nw_infos.iteritems())
+        update_instance_caches_with_nw_info(self, context, instances,
+                                            nw_infos, conductor_api)
+        return nw_infos
+
     @wrap_check_policy
     def validate_networks(self, context, requested_networks):
         """validate the networks passed at the time of creating
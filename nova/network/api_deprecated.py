@@ -36,6 +36,8 @@ LOG = logging.getLogger(__name__)
 refresh_cache = shiny_api.refresh_cache
 _update_instance_cache = shiny_api.update_instance_cache_with_nw_info
 update_instance_cache_with_nw_info = _update_instance_cache
+update_instance_caches_with_nw_info = \
+        shiny_api.update_instance_caches_with_nw_info
 wrap_check_policy = shiny_api.wrap_check_policy
 
 
@@ -268,6 +270,26 @@ class API(base.Base):
 
         return network_model.NetworkInfo.hydrate(nw_info)
 
+    @wrap_check_policy
+    def get_instance_nw_info_bulk(self, context, instances,
+                                  conductor_api=None):
+        """Returns the network info of many instances keyed by uuid, and
+        updates the info caches that changed.
+        """
+        args = []
+        for instance in instances:
+            instance_type = instance_types.extract_instance_type(instance)
+            args.append({'instance_id': instance['uuid'],
+                         'rxtx_factor': instance_type['rxtx_factor'],
+                         'host': instance['host']})
+        nw_infos = self.network_rpcapi.get_instance_nw_info_bulk(context,
+                                                                 args)
+        nw_infos = dict((uuid, network_model.NetworkInfo.hydrate(nw_info))
+                        for uuid, nw_info in nw_infos.iteritems())
+        update_instance_caches_with_nw_info(self, context, instances,
+                                            nw_infos, conductor_api)
+        return nw_infos
+
     @wrap_check_policy
     def validate_networks(self, context, requested_networks):
         """validate the networks passed at the time of creating
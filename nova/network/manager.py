@@ -268,7 +268,7 @@ class NetworkManager(manager.Manager):
         The one at a time part is to flatten the layout to help scale
     """
 
-    RPC_API_VERSION = '1.9'
+    RPC_API_VERSION = '1.10'
 
     # If True, this manager requires VIF to create a bridge.
     SHOULD_CREATE_BRIDGE = False
@@ -572,14 +572,47 @@ class NetworkManager(manager.Manager):
         instance_uuid = instance_id
 
         host = kwargs.get('host')
+        return self._get_instance_nw_info(context, instance_uuid,
+                                          rxtx_factor, host)
+
+    def get_instance_nw_info_bulk(self, context, instances):
+        """Creates the network info lists of many instances.
+
+        :param instances: list of dicts with the instance_id (uuid),
+                          rxtx_factor and host of each instance.
+        :returns: dict of network info lists keyed by instance uuid.
+                  Instances whose network info couldn't be built are
+                  left out.
+        """
+        # The networks are shared by the instances, look each one up once.
+        networks_by_id = {}
+        nw_infos = {}
+        for instance in instances:
+            instance_uuid = instance['instance_id']
+            try:
+                nw_infos[instance_uuid] = self._get_instance_nw_info(
+                        context, instance_uuid, instance['rxtx_factor'],
+                        instance['host'], networks_by_id)
+            except Exception:
+                LOG.exception(_('Failed to get network info'),
+                              instance_uuid=instance_uuid)
+        return nw_infos
+
+    def _get_instance_nw_info(self, context, instance_uuid, rxtx_factor,
+                              host, networks_by_id=None):
+        if networks_by_id is None:
+            networks_by_id = {}
         vifs = self.db.virtual_interface_get_by_instance(context,
                                                          instance_uuid)
         networks = {}
 
         for vif in vifs:
-            if vif.get('network_id') is not None:
-                network = self._get_network_by_id(context, vif['network_id'])
-                networks[vif['uuid']] = network
+            network_id = vif.get('network_id')
+            if network_id is not None:
+                if network_id not in networks_by_id:
+                    networks_by_id[network_id] = self._get_network_by_id(
+                            context, network_id)
+                networks[vif['uuid']] = networks_by_id[network_id]
 
         nw_info = self.build_network_info_model(context, vifs, networks,
                                                          rxtx_factor, host)
@@ -16,6 +16,7 @@
 #
 # vim: tabstop=4 shiftwidth=4 softtabstop=4
 
+import itertools
 import time
 
 from oslo.config import cfg
@@ -78,8 +79,12 @@ LOG = logging.getLogger(__name__)
 
 NET_EXTERNAL = 'router:external'
 
+# Limit the length of the query strings of the bulk listings
+MAX_IDS_PER_REQUEST = 100
+
 refresh_cache = network_api.refresh_cache
 update_instance_info_cache = network_api.update_instance_cache_with_nw_info
+update_instance_info_caches = network_api.update_instance_caches_with_nw_info
 
 
 class API(base.Base):
@@ -366,6 +371,78 @@ class API(base.Base):
         nw_info = self._build_network_info_model(context, instance, networks)
         return network_model.NetworkInfo.hydrate(nw_info)
 
+    def get_instance_nw_info_bulk(self, context, instances,
+                                  conductor_api=None):
+        """Returns the network info of many instances keyed by uuid, and
+        updates the info caches that changed.
+        """
+        result = self._get_instance_nw_info_bulk(context, instances)
+        update_instance_info_caches(self, context, instances, result,
+                                    conductor_api)
+        return result
+
+    def _get_instance_nw_info_bulk(self, context, instances):
+        """Build the network info of many instances from one listing of
+        their ports, floating ips, subnets and dhcp ports.
+        """
+        if not instances:
+            return {}
+        client = quantumv2.get_client(context, admin=True)
+        ports_by_instance = {}
+        for port in _list_chunked(client.list_ports, 'ports', 'device_id',
+                                  [instance['uuid']
+                                   for instance in instances]):
+            ports_by_instance.setdefault(port['device_id'], []).append(port)
+        ports = list(itertools.chain.from_iterable(
+                ports_by_instance.values()))
+
+        floating_ips = {}
+        subnets = {}
+        dhcp_ports = []
+        if ports:
+            for fip in _list_chunked(client.list_floatingips, 'floatingips',
+                                     'port_id',
+                                     [port['id'] for port in ports]):
+                key = (fip['port_id'], fip['fixed_ip_address'])
+                floating_ips.setdefault(key, []).append(fip)
+
+            subnet_ids = set(fixed_ip['subnet_id'] for port in ports
+                             for fixed_ip in port['fixed_ips'])
+            if subnet_ids:
+                subnets = dict((subnet['id'], subnet) for subnet in
+                               _list_chunked(client.list_subnets, 'subnets',
+                                             'id', subnet_ids))
+                network_ids = set(subnet['network_id']
+                                  for subnet in subnets.values())
+                dhcp_ports = _list_chunked(client.list_ports, 'ports',
+                                           'network_id', network_ids,
+                                           device_owner='network:dhcp')
+
+        networks_by_project = {}
+        nw_infos = {}
+        for instance in instances:
+            project_id = instance['project_id']
+            try:
+                if project_id not in networks_by_project:
+                    networks_by_project[project_id] = (
+                            self._get_available_networks(context,
+                                                         project_id))
+                instance_ports = [port for port in
+                                  ports_by_instance.get(instance['uuid'], [])
+                                  if port['tenant_id'] == project_id]
+                nw_info = self._build_vifs(context, client, instance_ports,
+                                           networks_by_project[project_id],
+                                           floating_ips=floating_ips,
+                                           subnets=subnets,
+                                           dhcp_ports=dhcp_ports)
+            except Exception:
+                LOG.exception(_('Failed to get network info'),
+                              instance=instance)
+                continue
+            nw_infos[instance['uuid']] = network_model.NetworkInfo.hydrate(
+                    nw_info)
+        return nw_infos
+
     @refresh_cache
     def add_fixed_ip_to_instance(self, context, instance, network_id,
                                  conductor_api=None):
@@ -785,7 +862,16 @@ class API(base.Base):
                 lambda x: x['network_id'],
                 ports,
                 [n['id'] for n in networks])
+        return self._build_vifs(context, client, ports, networks)
 
+    def _build_vifs(self, context, client, ports, networks,
+                    floating_ips=None, subnets=None, dhcp_ports=None):
+        """Build the network info of the ports of an instance.
+
+        The floating ips keyed by (port id, fixed ip address), the subnets
+        keyed by id and the dhcp ports of their networks can be passed in
+        when already known, otherwise they are looked up for each port.
+        """
         nw_info = network_model.NetworkInfo()
         for port in ports:
             network_name = None
@@ -803,16 +889,21 @@ class API(base.Base):
             network_IPs = []
             for fixed_ip in port['fixed_ips']:
                 fixed = network_model.FixedIP(address=fixed_ip['ip_address'])
-                floats = self._get_floating_ips_by_fixed_and_port(
-                        client, fixed_ip['ip_address'], port['id'])
+                if floating_ips is None:
+                    floats = self._get_floating_ips_by_fixed_and_port(
+                            client, fixed_ip['ip_address'], port['id'])
+                else:
+                    floats = floating_ips.get(
+                            (port['id'], fixed_ip['ip_address']), [])
                 for ip in floats:
                     fip = network_model.IP(address=ip['floating_ip_address'],
                                            type='floating')
                     fixed.add_floating_ip(fip)
                 network_IPs.append(fixed)
 
-            subnets = self._get_subnets_from_port(context, port)
-            for subnet in subnets:
+            port_subnets = self._get_subnets_from_port(context, port,
+                                                       subnets, dhcp_ports)
+            for subnet in port_subnets:
                 subnet['ips'] = [fixed_ip for fixed_ip in network_IPs
                                  if fixed_ip.is_in_subnet(subnet)]
 
@@ -843,7 +934,7 @@ class API(base.Base):
                 label=network_name,
                 tenant_id=net['tenant_id']
             )
-            network['subnets'] = subnets
+            network['subnets'] = port_subnets
             if should_create_bridge is not None:
                 network['should_create_bridge'] = should_create_bridge
             nw_info.append(network_model.VIF(
@@ -855,8 +946,13 @@ class API(base.Base):
                 devname=devname))
         return nw_info
 
-    def _get_subnets_from_port(self, context, port):
-        """Return the subnets for a given port."""
+    def _get_subnets_from_port(self, context, port, subnets=None,
+                               dhcp_ports=None):
+        """Return the subnets for a given port.
+
+        The subnets keyed by id and the dhcp ports of their networks are
+        looked up unless passed in.
+        """
 
         fixed_ips = port['fixed_ips']
         # No fixed_ips for the port means there is no subnet associated
@@ -866,10 +962,17 @@ class API(base.Base):
         # related to the port. To avoid this, the method returns here.
         if not fixed_ips:
             return []
-        search_opts = {'id': [ip['subnet_id'] for ip in fixed_ips]}
-        data = quantumv2.get_client(context).list_subnets(**search_opts)
-        ipam_subnets = data.get('subnets', [])
-        subnets = []
+        if subnets is None:
+            search_opts = {'id': [ip['subnet_id'] for ip in fixed_ips]}
+            data = quantumv2.get_client(context).list_subnets(**search_opts)
+            ipam_subnets = data.get('subnets', [])
+        else:
+            ipam_subnets = []
+            for ip in fixed_ips:
+                subnet = subnets.get(ip['subnet_id'])
+                if subnet is not None and subnet not in ipam_subnets:
+                    ipam_subnets.append(subnet)
+        port_subnets = []
 
         for subnet in ipam_subnets:
             subnet_dict = {'cidr': subnet['cidr'],
@@ -879,11 +982,16 @@ class API(base.Base):
             }
 
             # attempt to populate DHCP server field
-            search_opts = {'network_id': subnet['network_id'],
-                           'device_owner': 'network:dhcp'}
-            data = quantumv2.get_client(context).list_ports(**search_opts)
-            dhcp_ports = data.get('ports', [])
-            for p in dhcp_ports:
+            if dhcp_ports is None:
+                search_opts = {'network_id': subnet['network_id'],
+                               'device_owner': 'network:dhcp'}
+                data = quantumv2.get_client(context).list_ports(**search_opts)
+                network_dhcp_ports = data.get('ports', [])
+            else:
+                network_dhcp_ports = [p for p in dhcp_ports
+                                      if p['network_id'] ==
+                                      subnet['network_id']]
+            for p in network_dhcp_ports:
                 for ip_pair in p['fixed_ips']:
                     if ip_pair['subnet_id'] == subnet['id']:
                         subnet_dict['dhcp_server'] = ip_pair['ip_address']
@@ -895,8 +1003,8 @@ class API(base.Base):
                     network_model.IP(address=dns, type='dns'))
 
             # TODO(gongysh) get the routes for this subnet
-            subnets.append(subnet_object)
-        return subnets
+            port_subnets.append(subnet_object)
+        return port_subnets
 
     def get_dns_domains(self, context):
         """Return a list of available dns domains.
@@ -942,3 +1050,15 @@ def _ensure_requested_network_ordering(accessor, unordered, preferred):
     """Sort a list with respect to the preferred network ordering."""
     if preferred:
         unordered.sort(key=lambda i: preferred.index(accessor(i)))
+
+
+def _list_chunked(list_items, collection, key, ids, **params):
+    """List the items of collection whose key is one of ids, passing at
+    most MAX_IDS_PER_REQUEST ids per request.
+    """
+    ids = list(ids)
+    items = []
+    for i in xrange(0, len(ids), MAX_IDS_PER_REQUEST):
+        params[key] = ids[i:i + MAX_IDS_PER_REQUEST]
+        items.extend(list_items(**params).get(collection, []))
+    return items
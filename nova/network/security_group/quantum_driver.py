@@ -41,6 +41,9 @@ wrap_check_security_groups_policy = compute_api.policy_decorator(
 CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
+# Limit the length of the query string of the port listings
+MAX_DEVICE_IDS_PER_REQUEST = 100
+
 
 class SecurityGroupAPI(security_group_base.SecurityGroupBase):
 
@@ -247,13 +250,23 @@ class SecurityGroupAPI(security_group_base.SecurityGroupBase):
         return self._convert_to_nova_security_group_rule_format(rule)
 
     def get_instance_security_groups(self, req, instance_id):
-        dict_security_groups = {}
+        return self.get_instances_security_groups(req,
+                                                  [instance_id])[instance_id]
+
+    def get_instances_security_groups(self, req, instance_ids):
+        """Return the security groups of instances, keyed by instance id,
+        listing the ports and security groups only once.
+        """
         security_group_name_map = {}
         admin_context = context.get_admin_context()
 
         quantum = quantumv2.get_client(admin_context)
-        params = {'device_id': instance_id}
-        ports = quantum.list_ports(**params)
+        instance_ids = list(instance_ids)
+        ports = []
+        for i in xrange(0, len(instance_ids), MAX_DEVICE_IDS_PER_REQUEST):
+            params = {'device_id':
+                      instance_ids[i:i + MAX_DEVICE_IDS_PER_REQUEST]}
+            ports.extend(quantum.list_ports(**params).get('ports'))
         security_groups = quantum.list_security_groups().get('security_groups')
 
         for security_group in security_groups:
@@ -263,10 +276,16 @@ class SecurityGroupAPI(security_group_base.SecurityGroupBase):
                 name = security_group['id']
             security_group_name_map[security_group['id']] = name
 
-        for port in ports['ports']:
+        dict_security_groups = dict((instance_id, {})
+                                    for instance_id in instance_ids)
+        for port in ports:
+            instance_security_groups = dict_security_groups.get(
+                port.get('device_id'))
+            if instance_security_groups is None:
+                continue
             for security_group in port.get('security_groups', []):
                 try:
-                    dict_security_groups[security_group] = (
+                    instance_security_groups[security_group] = (
                         security_group_name_map[security_group])
                 except KeyError:
                     # If this should only happen due to a race condition
@@ -274,9 +293,10 @@ class SecurityGroupAPI(security_group_base.SecurityGroupBase):
                     # ports were returned. We pass since this security group
                     # is no longer on the port.
                     pass
-        ret = []
-        for security_group in dict_security_groups.values():
-            ret.append({'name': security_group})
+
+        ret = {}
+        for instance_id, names in dict_security_groups.iteritems():
+            ret[instance_id] = [{'name': name} for name in names.values()]
         return ret
 
     def _has_security_group_requirements(self, port):
@@ -207,6 +207,9 @@ class SecurityGroupBase(object):
     def get_instance_security_groups(self, req, instance_id):
         raise NotImplementedError()
 
+    def get_instances_security_groups(self, req, instance_ids):
+        raise NotImplementedError()
+
     def add_to_instance(self, context, instance, security_group_name):
         raise NotImplementedError()
 
@@ -19,6 +19,7 @@ You can customize this scheduler by specifying your own Host Filters and
 Weighing Functions.
 """
 
+import heapq
 import random
 
 from oslo.config import cfg
@@ -29,6 +30,7 @@ from nova.openstack.common import log as logging
 from nova.openstack.common.notifier import api as notifier
 from nova.scheduler import driver
 from nova.scheduler import scheduler_options
+from nova.scheduler import stats as scheduler_stats
 
 CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
@@ -43,11 +45,30 @@ filter_scheduler_opts = [
                     'chosen from. A value of 1 chooses the '
                     'first host returned by the weighing functions. '
                     'This value must be at least 1. Any value less than 1 '
-                    'will be ignored, and 1 will be used instead')
+                    'will be ignored, and 1 will be used instead'),
+    cfg.BoolOpt('scheduler_bulk_placement',
+                default=False,
+                help='When scheduling several instances at once, filter and '
+                     'weigh all hosts only once, then only filter and weigh '
+                     'again the hosts chosen for each instance. This gives '
+                     'the same placements as long as filters and weighers '
+                     'only look at the host being checked.'),
+    cfg.BoolOpt('scheduler_optimistic_claims',
+                default=False,
+                help='Claim the resources of each instance on the compute '
+                     'node of the chosen host, unless the compute node was '
+                     'updated since the scheduler loaded it, in which case '
+                     'the host is reloaded and another one is chosen. This '
+                     'lets several schedulers, like scheduler_workers, run '
+                     'without placing instances on the same resources.'),
 ]
 
 CONF.register_opts(filter_scheduler_opts)
 
+# How many times the claims of the hosts chosen for a request may conflict
+# with another scheduler before giving up on the remaining instances.
+MAX_CLAIM_CONFLICTS = 10
+
 
 class FilterScheduler(driver.Scheduler):
     """Scheduler that can be used for filtering and weighing."""
@@ -281,6 +302,15 @@ class FilterScheduler(driver.Scheduler):
         """Returns a list of hosts that meet the required specs,
         ordered by their fitness.
         """
+        request_stats = scheduler_stats.start_request()
+        try:
+            return self._filter_and_weigh_hosts(context, request_spec,
+                    filter_properties, instance_uuids)
+        finally:
+            scheduler_stats.end_request(context, request_stats, request_spec)
+
+    def _filter_and_weigh_hosts(self, context, request_spec,
+                                filter_properties, instance_uuids):
         elevated = context.elevated()
         instance_properties = request_spec['instance_properties']
         instance_type = request_spec.get("instance_type", None)
@@ -325,12 +355,18 @@ class FilterScheduler(driver.Scheduler):
         # are being scanned in a filter or weighing function.
         hosts = self.host_manager.get_all_host_states(elevated)
 
-        selected_hosts = []
         if instance_uuids:
             num_instances = len(instance_uuids)
         else:
             num_instances = request_spec.get('num_instances', 1)
-        for num in xrange(num_instances):
+        if CONF.scheduler_bulk_placement and num_instances > 1:
+            return self._schedule_bulk(elevated, hosts, num_instances,
+                    filter_properties, instance_properties,
+                    update_group_hosts)
+
+        selected_hosts = []
+        claim_conflicts = 0
+        while len(selected_hosts) < num_instances:
             # Filter local hosts based on requirements ...
             hosts = self.host_manager.get_filtered_hosts(hosts,
                     filter_properties)
@@ -340,17 +376,23 @@ class FilterScheduler(driver.Scheduler):
 
             LOG.debug(_("Filtered %(hosts)s") % locals())
 
-            weighed_hosts = self.host_manager.get_weighed_hosts(hosts,
-                    filter_properties)
+            scheduler_host_subset_size = self._get_host_subset_size()
 
-            scheduler_host_subset_size = CONF.scheduler_host_subset_size
+            # Only the best hosts are chosen from, don't sort all of them.
+            weighed_hosts = self.host_manager.get_weighed_hosts(hosts,
+                    filter_properties, limit=scheduler_host_subset_size)
             if scheduler_host_subset_size > len(weighed_hosts):
                 scheduler_host_subset_size = len(weighed_hosts)
-            if scheduler_host_subset_size < 1:
-                scheduler_host_subset_size = 1
 
             chosen_host = random.choice(
                 weighed_hosts[0:scheduler_host_subset_size])
+            if not self._claim_host(elevated, chosen_host.obj,
+                                    instance_properties):
+                # The host was reloaded, filter and weigh it again.
+                claim_conflicts += 1
+                if claim_conflicts > MAX_CLAIM_CONFLICTS:
+                    break
+                continue
             LOG.debug(_("Choosing host %(chosen_host)s") % locals())
             selected_hosts.append(chosen_host)
 
@@ -361,6 +403,112 @@ class FilterScheduler(driver.Scheduler):
                 filter_properties['group_hosts'].append(chosen_host.obj.host)
         return selected_hosts
 
+    def _get_host_subset_size(self):
+        scheduler_host_subset_size = CONF.scheduler_host_subset_size
+        if scheduler_host_subset_size < 1:
+            scheduler_host_subset_size = 1
+        return scheduler_host_subset_size
+
+    def _claim_host(self, context, host_state, instance_properties):
+        """Claim the resources of an instance on a host if
+        scheduler_optimistic_claims is set.
+
+        Returns False if the host changed since it was loaded, in which
+        case it is reloaded.
+        """
+        if not CONF.scheduler_optimistic_claims:
+            return True
+        try:
+            self.host_manager.claim_host(context, host_state,
+                                         instance_properties)
+        except exception.ComputeNodeGenerationConflict:
+            LOG.debug(_("Host %(host_state)s changed while scheduling, "
+                        "choosing again") % locals())
+            return False
+        return True
+
+    def _schedule_bulk(self, context, hosts, num_instances,
+                       filter_properties, instance_properties,
+                       update_group_hosts):
+        """Choose hosts for several instances, filtering and weighing all
+        hosts only once.
+
+        The weighed hosts are kept in a heap ordered like the sorted list
+        of weighed hosts.  Consuming an instance only changes the chosen
+        host and, through group_hosts, the hosts with the same name, so
+        only those are filtered again and only the chosen host is weighed
+        again before the next instance.
+        """
+        hosts = self.host_manager.get_filtered_hosts(hosts,
+                filter_properties)
+        if not hosts:
+            return []
+        LOG.debug(_("Filtered %(hosts)s") % locals())
+
+        # Ties are broken by the position of the hosts in the filtered
+        # list, like the stable sort of the weighed hosts does.
+        positions = dict((id(host), i) for i, host in enumerate(hosts))
+        heap = [(-weighed_host.weight, positions[id(weighed_host.obj)],
+                 weighed_host) for weighed_host in
+                self.host_manager.get_weighed_hosts(hosts, filter_properties)]
+        heapq.heapify(heap)
+        eligible = set(xrange(len(hosts)))
+        positions_by_name = {}
+        for i, host in enumerate(hosts):
+            positions_by_name.setdefault(host.host, []).append(i)
+
+        scheduler_host_subset_size = self._get_host_subset_size()
+        selected_hosts = []
+        claim_conflicts = 0
+        while len(selected_hosts) < num_instances:
+            best = []
+            while heap and len(best) < scheduler_host_subset_size:
+                entry = heapq.heappop(heap)
+                # Hosts which stopped passing the filters are dropped here.
+                if entry[1] in eligible:
+                    best.append(entry)
+            if not best:
+                # Can't get any more locally.
+                break
+
+            chosen_entry = random.choice(best)
+            for entry in best:
+                if entry is not chosen_entry:
+                    heapq.heappush(heap, entry)
+            chosen_host = chosen_entry[2]
+            if self._claim_host(context, chosen_host.obj,
+                                instance_properties):
+                LOG.debug(_("Choosing host %(chosen_host)s") % locals())
+                selected_hosts.append(chosen_host)
+
+                chosen_host.obj.consume_from_instance(instance_properties)
+                if update_group_hosts is True:
+                    filter_properties['group_hosts'].append(
+                            chosen_host.obj.host)
+            else:
+                # The host was reloaded, filter and weigh it again below.
+                claim_conflicts += 1
+                if claim_conflicts > MAX_CLAIM_CONFLICTS:
+                    break
+
+            changed = [i for i in positions_by_name[chosen_host.obj.host]
+                       if i in eligible]
+            passing = set(id(host) for host in
+                          self.host_manager.get_filtered_hosts(
+                                  [hosts[i] for i in changed],
+                                  filter_properties))
+            for i in changed:
+                if id(hosts[i]) not in passing:
+                    eligible.discard(i)
+
+            chosen_position = chosen_entry[1]
+            if chosen_position in eligible:
+                weighed_host = self.host_manager.get_weighed_hosts(
+                        [chosen_host.obj], filter_properties)[0]
+                heapq.heappush(heap, (-weighed_host.weight, chosen_position,
+                                      weighed_host))
+        return selected_hosts
+
     def _assert_compute_node_has_enough_memory(self, context,
                                               instance_ref, dest):
         """Checks if destination host has enough memory for live migration.
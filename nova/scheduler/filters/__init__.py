@@ -17,14 +17,27 @@
 Scheduler host filters
 """
 
+import time
+
 from nova import filters
 from nova.openstack.common import log as logging
+from nova.scheduler import stats
 
 LOG = logging.getLogger(__name__)
 
 
 class BaseHostFilter(filters.BaseFilter):
     """Base class for host filters."""
+
+    # Filters which can look up the hosts passing them in a
+    # host_manager.HostStateIndex set this and override filter_index().
+    use_host_index = False
+
+    # Set this as well if filter_index() returns exactly the hosts that
+    # pass host_passes() and host_passes() has no side effects, so that
+    # host_passes() is not run again on each remaining host.
+    filter_index_only = False
+
     def _filter_one(self, obj, filter_properties):
         """Return True if the object passes the filter, otherwise False."""
         return self.host_passes(obj, filter_properties)
@@ -35,11 +48,36 @@ class BaseHostFilter(filters.BaseFilter):
         """
         raise NotImplementedError()
 
+    def filter_index(self, host_index, filter_properties):
+        """Return the set of HostStates from host_index which may pass the
+        filter, or None if no host can be ruled out this way.
+        Override this in a subclass which sets use_host_index.
+        """
+        return None
+
 
 class HostFilterHandler(filters.BaseFilterHandler):
     def __init__(self):
         super(HostFilterHandler, self).__init__(BaseHostFilter)
 
+    def get_filtered_objects(self, filter_classes, objs,
+            filter_properties):
+        request_stats = stats.current_request()
+        if request_stats is None:
+            return super(HostFilterHandler, self).get_filtered_objects(
+                    filter_classes, objs, filter_properties)
+
+        # Run the filters one after the other rather than chained, to
+        # time each of them and count the hosts it let through.
+        objs = list(objs)
+        for filter_cls in filter_classes:
+            start = time.time()
+            passing = list(filter_cls().filter_all(objs, filter_properties))
+            request_stats.add_filter(filter_cls.__name__,
+                    time.time() - start, len(objs), len(passing))
+            objs = passing
+        return objs
+
 
 def all_filters():
     """Return a list of filter classes found in this directory.
@@ -43,7 +43,8 @@ class DifferentHostFilter(AffinityFilter):
             return not self.compute_api.get_all(context,
                                                 {'host': host_state.host,
                                                  'uuid': affinity_uuids,
-                                                 'deleted': False})
+                                                 'deleted': False},
+                                                columns=['uuid'])
         # With no different_host key
         return True
 
@@ -63,7 +64,8 @@ class SameHostFilter(AffinityFilter):
         if affinity_uuids:
             return self.compute_api.get_all(context, {'host': host_state.host,
                                                       'uuid': affinity_uuids,
-                                                      'deleted': False})
+                                                      'deleted': False},
+                                            columns=['uuid'])
         # With no same_host key
         return True
 
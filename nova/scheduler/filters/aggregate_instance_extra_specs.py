@@ -26,6 +26,35 @@ LOG = logging.getLogger(__name__)
 class AggregateInstanceExtraSpecsFilter(filters.BaseHostFilter):
     """AggregateInstanceExtraSpecsFilter works with InstanceType records."""
 
+    use_host_index = True
+    filter_index_only = True
+
+    def filter_index(self, host_index, filter_properties):
+        """Return the set of hosts in aggregates matching the extra specs
+        of the instance type, or None if it has none to check.
+        """
+        instance_type = filter_properties.get('instance_type')
+        if 'extra_specs' not in instance_type:
+            return None
+
+        context = filter_properties['context'].elevated()
+        passing = None
+        for key, req in instance_type['extra_specs'].iteritems():
+            # NOTE(jogo) any key containing a scope (scope is terminated
+            # by a `:') will be ignored by this filter. (bug 1039386)
+            if key.count(':'):
+                continue
+            hosts = set()
+            aggregate_vals = host_index.metadata_values(context, key)
+            for aggregate_val, val_hosts in aggregate_vals.iteritems():
+                if extra_specs_ops.match(aggregate_val, req):
+                    hosts |= val_hosts
+            if passing is None:
+                passing = hosts
+            else:
+                passing &= hosts
+        return passing
+
     def host_passes(self, host_state, filter_properties):
         """Return a list of hosts that can create instance_type
 
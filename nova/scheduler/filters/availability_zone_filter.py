@@ -30,10 +30,29 @@ class AvailabilityZoneFilter(filters.BaseHostFilter):
     Note: in theory a compute node can be part of multiple availability_zones
     """
 
-    def host_passes(self, host_state, filter_properties):
+    use_host_index = True
+    filter_index_only = True
+
+    def _requested_zone(self, filter_properties):
         spec = filter_properties.get('request_spec', {})
         props = spec.get('instance_properties', {})
-        availability_zone = props.get('availability_zone')
+        return props.get('availability_zone')
+
+    def filter_index(self, host_index, filter_properties):
+        availability_zone = self._requested_zone(filter_properties)
+        if not availability_zone:
+            return None
+
+        context = filter_properties['context'].elevated()
+        zones = host_index.metadata_values(context, 'availability_zone')
+        hosts = zones.get(availability_zone, set())
+        if availability_zone == CONF.default_availability_zone:
+            hosts = hosts | host_index.hosts_without_metadata(context,
+                    'availability_zone')
+        return hosts
+
+    def host_passes(self, host_state, filter_properties):
+        availability_zone = self._requested_zone(filter_properties)
 
         if availability_zone:
             context = filter_properties['context'].elevated()
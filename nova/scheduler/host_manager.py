@@ -17,6 +17,8 @@
 Manage hosts in the current zone.
 """
 
+import datetime
+import time
 import UserDict
 
 from oslo.config import cfg
@@ -25,9 +27,11 @@ from nova.compute import task_states
 from nova.compute import vm_states
 from nova import db
 from nova import exception
+from nova.openstack.common import excutils
 from nova.openstack.common import log as logging
 from nova.openstack.common import timeutils
 from nova.scheduler import filters
+from nova.scheduler import stats as scheduler_stats
 from nova.scheduler import weights
 
 host_manager_opts = [
@@ -51,13 +55,37 @@ host_manager_opts = [
     cfg.ListOpt('scheduler_weight_classes',
                 default=['nova.scheduler.weights.all_weighers'],
                 help='Which weight class names to use for weighing hosts'),
+    cfg.IntOpt('scheduler_full_refresh_interval',
+               default=0,
+               help='Number of seconds between full reloads of all compute '
+                    'nodes from the database. In between, host states are '
+                    'kept in a cache and only compute nodes that changed '
+                    'since the previous request are fetched. 0 disables '
+                    'the cache and reloads all compute nodes on every '
+                    'request.'),
+    cfg.IntOpt('scheduler_host_state_max_staleness',
+               default=0,
+               help='Number of seconds cached host states may be used '
+                    'without checking the database for changed compute '
+                    'nodes. Only used when scheduler_full_refresh_interval '
+                    'is set. 0 checks for changes on every request.'),
+    cfg.BoolOpt('scheduler_use_host_index',
+                default=False,
+                help='Let filters which support it narrow down the hosts '
+                     'with aggregate metadata loaded for all hosts at once '
+                     'before the remaining filters check each host.'),
     ]
 
 CONF = cfg.CONF
 CONF.register_opts(host_manager_opts)
+CONF.import_opt('compute_topic', 'nova.compute.rpcapi')
 
 LOG = logging.getLogger(__name__)
 
+# Compute node changes are looked up starting a little before the previous
+# lookup, so rows committed while it was running are not missed.
+CHANGES_SINCE_MARGIN = datetime.timedelta(seconds=5)
+
 
 class ReadOnlyDict(UserDict.IterableUserDict):
     """A read-only dict."""
@@ -127,6 +155,11 @@ class HostState(object):
         # Resource oversubscription values for the compute host:
         self.limits = {}
 
+        # The compute node this state was loaded from and its generation,
+        # to claim resources on it.
+        self.compute_node_id = None
+        self.generation = None
+
         self.updated = None
 
     def update_capabilities(self, capabilities=None, service=None):
@@ -161,6 +194,8 @@ class HostState(object):
         self.vcpus_total = compute['vcpus']
         self.vcpus_used = compute['vcpus_used']
         self.updated = compute['updated_at']
+        self.compute_node_id = compute.get('id')
+        self.generation = compute.get('generation')
 
         stats = compute.get('stats', [])
         statmap = self._statmap(stats)
@@ -250,6 +285,58 @@ class HostState(object):
                  self.num_io_ops, self.num_instances, self.allowed_vm_type))
 
 
+class HostStateIndex(object):
+    """Lookup structures over a list of HostStates.
+
+    Built for a single filtering pass, it lets filters find the hosts
+    passing them with set operations over aggregate metadata loaded with a
+    single query, instead of one query per host.  The metadata is only
+    loaded when first used.
+    """
+
+    def __init__(self, host_states):
+        self.host_states = list(host_states)
+        self._metadata_values = None
+        self._hosts_by_name = None
+
+    def _load_aggregate_metadata(self, context):
+        self._hosts_by_name = {}
+        for host_state in self.host_states:
+            self._hosts_by_name.setdefault(host_state.host,
+                                           []).append(host_state)
+
+        # { key : { value : set([host_state, ...]) } }
+        self._metadata_values = {}
+        metadata = db.aggregate_metadata_get_all_by_host(context)
+        for host, host_metadata in metadata.iteritems():
+            host_states = self._hosts_by_name.get(host)
+            if not host_states:
+                continue
+            for key, values in host_metadata.iteritems():
+                key_values = self._metadata_values.setdefault(key, {})
+                for value in values:
+                    key_values.setdefault(value, set()).update(host_states)
+
+    def metadata_values(self, context, key):
+        """Return a dict mapping each aggregate metadata value of key to the
+        set of HostStates in an aggregate with that value.
+
+        The aggregate metadata of all hosts is loaded with a single query.
+        """
+        if self._metadata_values is None:
+            self._load_aggregate_metadata(context)
+        return self._metadata_values.get(key, {})
+
+    def hosts_without_metadata(self, context, key):
+        """Return the set of HostStates not in any aggregate with key in
+        its metadata.
+        """
+        hosts = set(self.host_states)
+        for value_hosts in self.metadata_values(context, key).itervalues():
+            hosts -= value_hosts
+        return hosts
+
+
 class HostManager(object):
     """Base HostManager class."""
 
@@ -260,6 +347,10 @@ class HostManager(object):
         # { (host, hypervisor_hostname) : { <service> : { cap k : v }}}
         self.service_states = {}
         self.host_state_map = {}
+        # { compute_node id : (host, hypervisor_hostname) }
+        self.compute_node_keys = {}
+        self.last_full_refresh = None
+        self.last_refresh = None
         self.filter_handler = filters.HostFilterHandler()
         self.filter_classes = self.filter_handler.get_matching_classes(
                 CONF.scheduler_available_filters)
@@ -338,13 +429,55 @@ class HostManager(object):
                     return name_to_cls_map.values()
             hosts = name_to_cls_map.itervalues()
 
+        if CONF.scheduler_use_host_index:
+            hosts, filter_classes = self._filter_hosts_with_index(hosts,
+                    filter_classes, filter_properties)
+
         return self.filter_handler.get_filtered_objects(filter_classes,
                 hosts, filter_properties)
 
-    def get_weighed_hosts(self, hosts, weight_properties):
-        """Weigh the hosts."""
+    def _filter_hosts_with_index(self, hosts, filter_classes,
+            filter_properties):
+        """Narrow down the hosts with the filters using a HostStateIndex.
+
+        Returns the remaining hosts, in their original order, and the
+        filter classes which still have to check each of them.
+        """
+        index_filter_classes = [cls for cls in filter_classes
+                                if cls.use_host_index]
+        if not index_filter_classes:
+            return hosts, filter_classes
+
+        request_stats = scheduler_stats.current_request()
+        host_index = HostStateIndex(hosts)
+        candidates = None
+        for filter_cls in index_filter_classes:
+            start = time.time()
+            passing = filter_cls().filter_index(host_index, filter_properties)
+            if passing is None:
+                continue
+            hosts_in = len(host_index.host_states if candidates is None
+                           else candidates)
+            if candidates is None:
+                candidates = passing
+            else:
+                candidates = candidates & passing
+            if request_stats is not None:
+                name = '%s.filter_index' % filter_cls.__name__
+                request_stats.add_filter(name, time.time() - start,
+                                         hosts_in, len(candidates))
+
+        hosts = host_index.host_states
+        if candidates is not None:
+            hosts = [host for host in hosts if host in candidates]
+        filter_classes = [cls for cls in filter_classes
+                          if not cls.filter_index_only]
+        return hosts, filter_classes
+
+    def get_weighed_hosts(self, hosts, weight_properties, limit=None):
+        """Weigh the hosts, returning only the limit best ones if given."""
         return self.weight_handler.get_weighed_objects(self.weight_classes,
-                hosts, weight_properties)
+                hosts, weight_properties, limit=limit)
 
     def update_service_capabilities(self, service_name, host, capabilities):
         """Update the per-service capabilities based on this notification."""
@@ -362,42 +495,142 @@ class HostManager(object):
         capab_copy["timestamp"] = timeutils.utcnow()  # Reported time
         self.service_states[state_key] = capab_copy
 
-    def get_all_host_states(self, context):
-        """Returns a list of HostStates that represents all the hosts
-        the HostManager knows about. Also, each of the consumable resources
-        in HostState are pre-populated and adjusted based on data in the db.
-        """
+        # Keep a cached host state current without waiting for its
+        # compute node to be reloaded.
+        host_state = self.host_state_map.get(state_key)
+        if host_state:
+            host_state.update_capabilities(capab_copy, host_state.service)
+
+    def _update_host_state_from_compute_node(self, compute,
+                                             discard_usage=False):
+        """Create or update the HostState of a compute node.
 
-        # Get resource usage across the available compute nodes:
+        Resources consumed from a cached HostState since its compute node
+        was last updated are kept, unless discard_usage is set.
+
+        Returns the state key of the compute node, or None if the compute
+        node has no service.
+        """
+        service = compute['service']
+        if not service:
+            LOG.warn(_("No service for compute ID %s") % compute['id'])
+            return None
+        host = service['host']
+        node = compute.get('hypervisor_hostname')
+        state_key = (host, node)
+        capabilities = self.service_states.get(state_key, None)
+        host_state = self.host_state_map.get(state_key)
+        if host_state:
+            host_state.update_capabilities(capabilities,
+                                           dict(service.iteritems()))
+            if discard_usage:
+                host_state.updated = None
+        else:
+            host_state = self.host_state_cls(host, node,
+                    capabilities=capabilities,
+                    service=dict(service.iteritems()))
+            self.host_state_map[state_key] = host_state
+        host_state.update_from_compute_node(compute)
+        self.compute_node_keys[compute['id']] = state_key
+        return state_key
+
+    def claim_host(self, context, host_state, instance):
+        """Claim the resources of an instance on the compute node of a
+        host state, unless the compute node was updated since the host
+        state was loaded from it.
+
+        Raises ComputeNodeGenerationConflict on a conflict, after
+        reloading the host state from its compute node.
+        """
+        try:
+            host_state.generation = db.compute_node_claim(context,
+                    host_state.compute_node_id, host_state.generation,
+                    instance['memory_mb'],
+                    instance['root_gb'] + instance['ephemeral_gb'],
+                    instance['vcpus'])
+        except exception.ComputeNodeGenerationConflict:
+            with excutils.save_and_reraise_exception():
+                compute = db.compute_node_get(context,
+                                              host_state.compute_node_id)
+                # The compute node accounts for the resources claimed by
+                # every scheduler, reload it even though the host state
+                # was consumed from more recently.
+                host_state.updated = None
+                host_state.update_from_compute_node(compute)
+
+    def _remove_host_state(self, state_key):
+        host, node = state_key
+        LOG.info(_("Removing dead compute node %(host)s:%(node)s "
+                   "from scheduler") % locals())
+        del self.host_state_map[state_key]
+
+    def _refresh_all_host_states(self, context, discard_usage=False):
+        """Reload every compute node from the database."""
         compute_nodes = db.compute_node_get_all(context)
+        self.compute_node_keys = {}
         seen_nodes = set()
         for compute in compute_nodes:
-            service = compute['service']
-            if not service:
-                LOG.warn(_("No service for compute ID %s") % compute['id'])
-                continue
-            host = service['host']
-            node = compute.get('hypervisor_hostname')
-            state_key = (host, node)
-            capabilities = self.service_states.get(state_key, None)
-            host_state = self.host_state_map.get(state_key)
-            if host_state:
-                host_state.update_capabilities(capabilities,
-                                               dict(service.iteritems()))
-            else:
-                host_state = self.host_state_cls(host, node,
-                        capabilities=capabilities,
-                        service=dict(service.iteritems()))
-                self.host_state_map[state_key] = host_state
-            host_state.update_from_compute_node(compute)
-            seen_nodes.add(state_key)
+            state_key = self._update_host_state_from_compute_node(compute,
+                    discard_usage=discard_usage)
+            if state_key:
+                seen_nodes.add(state_key)
 
         # remove compute nodes from host_state_map if they are not active
         dead_nodes = set(self.host_state_map.keys()) - seen_nodes
         for state_key in dead_nodes:
-            host, node = state_key
-            LOG.info(_("Removing dead compute node %(host)s:%(node)s "
-                       "from scheduler") % locals())
-            del self.host_state_map[state_key]
+            self._remove_host_state(state_key)
+
+    def _refresh_changed_host_states(self, context, changes_since):
+        """Only reload the compute nodes changed since a given time."""
+        compute_nodes = db.compute_node_get_all_changed_since(context,
+                changes_since - CHANGES_SINCE_MARGIN)
+        for compute in compute_nodes:
+            if compute['deleted']:
+                state_key = self.compute_node_keys.pop(compute['id'], None)
+                if state_key in self.host_state_map:
+                    self._remove_host_state(state_key)
+                continue
+            self._update_host_state_from_compute_node(compute)
+        LOG.debug(_("Refreshed %d changed compute nodes") %
+                  len(compute_nodes))
+
+        # Services report in far more often than their compute nodes
+        # change, so their liveness is refreshed separately.
+        services = {}
+        for service in db.service_get_all(context):
+            if service['topic'] == CONF.compute_topic:
+                services[service['host']] = service
+        for host_state in self.host_state_map.itervalues():
+            service = services.get(host_state.host)
+            if service:
+                host_state.update_capabilities(host_state.capabilities,
+                                               dict(service.iteritems()))
+
+    def get_all_host_states(self, context):
+        """Returns a list of HostStates that represents all the hosts
+        the HostManager knows about. Also, each of the consumable resources
+        in HostState are pre-populated and adjusted based on data in the db.
+
+        If scheduler_full_refresh_interval is set, the HostStates are cached
+        and only the compute nodes changed since the previous refresh are
+        reloaded, at most every scheduler_host_state_max_staleness seconds.
+        Resources consumed from the cached HostStates are dropped on each
+        full reload.
+        """
+        now = timeutils.utcnow()
+        full_refresh_interval = CONF.scheduler_full_refresh_interval
+        max_staleness = CONF.scheduler_host_state_max_staleness
+
+        if (full_refresh_interval <= 0 or self.last_full_refresh is None or
+                timeutils.is_older_than(self.last_full_refresh,
+                                        full_refresh_interval)):
+            self._refresh_all_host_states(context,
+                    discard_usage=full_refresh_interval > 0)
+            self.last_full_refresh = now
+            self.last_refresh = now
+        elif (max_staleness <= 0 or
+                timeutils.is_older_than(self.last_refresh, max_staleness)):
+            self._refresh_changed_host_states(context, self.last_refresh)
+            self.last_refresh = now
 
         return self.host_state_map.itervalues()
@@ -40,6 +40,7 @@ from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
 from nova.openstack.common.notifier import api as notifier
 from nova import quota
+from nova.scheduler import stats as scheduler_stats
 
 
 LOG = logging.getLogger(__name__)
@@ -50,6 +51,7 @@ scheduler_driver_opt = cfg.StrOpt('scheduler_driver',
 
 CONF = cfg.CONF
 CONF.register_opt(scheduler_driver_opt)
+CONF.import_opt('scheduler_stats_interval', 'nova.scheduler.stats')
 
 QUOTAS = quota.QUOTAS
 
@@ -289,6 +291,10 @@ class SchedulerManager(manager.Manager):
     def _expire_reservations(self, context):
         QUOTAS.expire(context)
 
+    @manager.periodic_task(spacing=CONF.scheduler_stats_interval)
+    def _log_scheduler_stats(self, context):
+        scheduler_stats.log_aggregated_stats()
+
     def get_backdoor_port(self, context):
         return self.backdoor_port
 
@@ -0,0 +1,164 @@
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Timing and rejection statistics of the scheduler filters and weighers.
+
+When scheduler_instrumentation is enabled, the time spent in each filter
+and weigher and the number of hosts going in and out of each filter are
+recorded for every scheduling request.  They are sent in a
+scheduler.instrumentation notification and summed up for the statistics
+periodically logged by nova-scheduler.
+"""
+
+from oslo.config import cfg
+
+from nova.openstack.common import local
+from nova.openstack.common import log as logging
+from nova.openstack.common.notifier import api as notifier
+
+stats_opts = [
+    cfg.BoolOpt('scheduler_instrumentation',
+                default=False,
+                help='Record the time spent in each scheduler filter and '
+                     'weigher and the number of hosts each filter removed'),
+    cfg.IntOpt('scheduler_stats_interval',
+               default=600,
+               help='Interval in seconds between logging the aggregated '
+                    'filter and weigher statistics when '
+                    'scheduler_instrumentation is enabled. A negative '
+                    'value disables the logging'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(stats_opts)
+
+LOG = logging.getLogger(__name__)
+
+
+class RequestStats(object):
+    """Filter and weigher statistics of one scheduling request."""
+
+    def __init__(self):
+        self.filters = []
+        self.weighers = []
+
+    def add_filter(self, name, seconds, hosts_in, hosts_out):
+        self.filters.append(dict(name=name, seconds=seconds,
+                                 hosts_in=hosts_in, hosts_out=hosts_out))
+
+    def add_weigher(self, name, seconds, hosts):
+        self.weighers.append(dict(name=name, seconds=seconds, hosts=hosts))
+
+    def to_dict(self):
+        return dict(filters=self.filters, weighers=self.weighers)
+
+
+class AggregatedStats(object):
+    """Filter and weigher statistics summed up over many requests."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        # { name : { 'calls': ..., 'seconds': ..., ... } }
+        self.filters = {}
+        self.weighers = {}
+
+    def add_request(self, request_stats):
+        self.requests += 1
+        for entry in request_stats.filters:
+            totals = self.filters.setdefault(entry['name'],
+                    dict(calls=0, seconds=0.0, hosts_in=0, hosts_out=0,
+                         removed_all=0))
+            totals['calls'] += 1
+            totals['seconds'] += entry['seconds']
+            totals['hosts_in'] += entry['hosts_in']
+            totals['hosts_out'] += entry['hosts_out']
+            if entry['hosts_in'] and not entry['hosts_out']:
+                totals['removed_all'] += 1
+        for entry in request_stats.weighers:
+            totals = self.weighers.setdefault(entry['name'],
+                    dict(calls=0, seconds=0.0, hosts=0))
+            totals['calls'] += 1
+            totals['seconds'] += entry['seconds']
+            totals['hosts'] += entry['hosts']
+
+    def log(self):
+        """Log the statistics and start over."""
+        LOG.info(_("Scheduler statistics of %d requests"), self.requests)
+        for name, totals in sorted(self.filters.iteritems()):
+            LOG.info(_("Filter %(name)s: %(calls)d calls, %(seconds).3f "
+                       "seconds, %(hosts_in)d hosts in, %(hosts_out)d hosts "
+                       "out, removed all hosts %(removed_all)d times"),
+                     dict(totals, name=name))
+        for name, totals in sorted(self.weighers.iteritems()):
+            LOG.info(_("Weigher %(name)s: %(calls)d calls, %(seconds).3f "
+                       "seconds, %(hosts)d hosts weighed"),
+                     dict(totals, name=name))
+        self.reset()
+
+
+_aggregated_stats = AggregatedStats()
+
+
+def start_request():
+    """Start recording the statistics of a scheduling request.
+
+    Returns the RequestStats the filters and weighers run by this
+    greenthread record to, or None if scheduler_instrumentation is
+    disabled.  The caller must keep it until the request is over.
+    """
+    if not CONF.scheduler_instrumentation:
+        return None
+    request_stats = RequestStats()
+    local.store.scheduler_stats = request_stats
+    return request_stats
+
+
+def current_request():
+    """Return the RequestStats of the request run by this greenthread,
+    or None if its statistics are not recorded.
+    """
+    return getattr(local.store, 'scheduler_stats', None)
+
+
+def end_request(context, request_stats, request_spec):
+    """Stop recording, send the statistics of the request in a
+    notification and add them to the aggregated statistics.
+    """
+    if request_stats is None:
+        return
+    del local.store.scheduler_stats
+    _aggregated_stats.add_request(request_stats)
+
+    payload = request_stats.to_dict()
+    payload['instance_uuids'] = request_spec.get('instance_uuids')
+    notifier.notify(context, notifier.publisher_id("scheduler"),
+                    'scheduler.instrumentation', notifier.INFO, payload)
+
+
+def get_aggregated_stats():
+    return _aggregated_stats
+
+
+def log_aggregated_stats():
+    """Log and reset the statistics of the requests made since the
+    last call.
+    """
+    if not CONF.scheduler_instrumentation or not _aggregated_stats.requests:
+        return
+    _aggregated_stats.log()
@@ -17,9 +17,12 @@
 Scheduler host weights
 """
 
+import time
+
 from oslo.config import cfg
 
 from nova.openstack.common import log as logging
+from nova.scheduler import stats
 from nova.scheduler.weights import least_cost
 from nova import weights
 
@@ -49,6 +52,16 @@ class HostWeightHandler(weights.BaseWeightHandler):
     def __init__(self):
         super(HostWeightHandler, self).__init__(BaseHostWeigher)
 
+    def _weigh_with(self, weigher, weigh_method, objs, weighing_properties):
+        request_stats = stats.current_request()
+        if request_stats is None:
+            return weigh_method(objs, weighing_properties)
+        start = time.time()
+        result = weigh_method(objs, weighing_properties)
+        request_stats.add_weigher(weigher.__class__.__name__,
+                                  time.time() - start, len(objs))
+        return result
+
 
 def all_weighers():
     """Return a list of weight plugin classes found in this directory."""
@@ -93,6 +93,11 @@ service_opts = [
     cfg.IntOpt('metadata_workers',
                default=None,
                help='Number of workers for metadata service'),
+    cfg.IntOpt('scheduler_workers',
+               default=None,
+               help='Number of workers for scheduler service. Each worker '
+                    'has its own view of the hosts, see '
+                    'scheduler_optimistic_claims'),
     cfg.StrOpt('compute_manager',
                default='nova.compute.manager.ComputeManager',
                help='full class name for the Manager for compute'),
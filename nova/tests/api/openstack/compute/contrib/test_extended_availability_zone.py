@@ -44,6 +44,10 @@ def fake_get_host_availability_zone(context, host):
     return host
 
 
+def fake_get_host_availability_zones(context, hosts):
+    return dict((host, 'bulk-%s' % host) for host in hosts)
+
+
 class ExtendedServerAttributesTest(test.TestCase):
     content_type = 'application/json'
     prefix = 'OS-EXT-AZ:'
@@ -55,6 +59,8 @@ class ExtendedServerAttributesTest(test.TestCase):
         self.stubs.Set(compute.api.API, 'get_all', fake_compute_get_all)
         self.stubs.Set(availability_zones, 'get_host_availability_zone',
                        fake_get_host_availability_zone)
+        self.stubs.Set(availability_zones, 'get_host_availability_zones',
+                       fake_get_host_availability_zones)
 
         self.flags(
             osapi_compute_extension=[
@@ -88,6 +94,19 @@ class ExtendedServerAttributesTest(test.TestCase):
         url = '/v2/fake/servers/detail'
         res = self._make_request(url)
 
+        self.assertEqual(res.status_int, 200)
+        for i, server in enumerate(self._get_servers(res.body)):
+            self.assertServerAttributes(server, 'bulk-all-host')
+
+    def test_detail_prefetch_failure(self):
+        def fake_get_host_availability_zones(context, hosts):
+            raise exception.NovaException()
+
+        self.stubs.Set(availability_zones, 'get_host_availability_zones',
+                       fake_get_host_availability_zones)
+        url = '/v2/fake/servers/detail'
+        res = self._make_request(url)
+
         self.assertEqual(res.status_int, 200)
         for i, server in enumerate(self._get_servers(res.body)):
             self.assertServerAttributes(server, 'all-host')
@@ -31,6 +31,7 @@ import nova.db
 from nova import exception
 from nova.network import quantumv2
 from nova.network.quantumv2 import api as quantum_api
+from nova.network.security_group import quantum_driver
 from nova.openstack.common import jsonutils
 from nova import test
 from nova.tests.api.openstack.compute.contrib import test_security_groups
@@ -227,6 +228,57 @@ class TestQuantumSecurityGroups(
         req = fakes.HTTPRequest.blank('/v2/fake/servers/1/action')
         self.manager._removeSecurityGroup(req, '1', body)
 
+    def test_get_instances_security_groups(self):
+        sg1 = self._create_sg_template(name='sg1').get('security_group')
+        sg2 = self._create_sg_template(name='sg2').get('security_group')
+        net = self._create_network()
+        self._create_port(network_id=net['network']['id'],
+                          security_groups=[sg1['id'], sg2['id']],
+                          device_id='instance1')
+        self._create_port(network_id=net['network']['id'],
+                          security_groups=[sg1['id']],
+                          device_id='instance1')
+        self._create_port(network_id=net['network']['id'],
+                          security_groups=[sg2['id']],
+                          device_id='instance2')
+
+        req = fakes.HTTPRequest.blank('/v2/fake/servers/detail')
+        groups = self.controller.security_group_api.\
+                get_instances_security_groups(req, ['instance1', 'instance2',
+                                                    'instance3'])
+        self.assertEqual(['sg1', 'sg2'],
+                         sorted(g['name'] for g in groups['instance1']))
+        self.assertEqual([{'name': 'sg2'}], groups['instance2'])
+        self.assertEqual([], groups['instance3'])
+
+    def test_get_instances_security_groups_chunked(self):
+        self.stubs.Set(quantum_driver, 'MAX_DEVICE_IDS_PER_REQUEST', 2)
+        sg1 = self._create_sg_template(name='sg1').get('security_group')
+        net = self._create_network()
+        for instance_id in ('instance1', 'instance3', 'instance5'):
+            self._create_port(network_id=net['network']['id'],
+                              security_groups=[sg1['id']],
+                              device_id=instance_id)
+
+        list_ports = MockClient.list_ports
+        requested = []
+
+        def fake_list_ports(client, **params):
+            requested.append(params['device_id'])
+            return list_ports(client, **params)
+
+        self.stubs.Set(MockClient, 'list_ports', fake_list_ports)
+        req = fakes.HTTPRequest.blank('/v2/fake/servers/detail')
+        instance_ids = ['instance%d' % i for i in xrange(1, 6)]
+        groups = self.controller.security_group_api.\
+                get_instances_security_groups(req, instance_ids)
+        self.assertEqual([['instance1', 'instance2'],
+                          ['instance3', 'instance4'],
+                          ['instance5']], requested)
+        for instance_id in ('instance1', 'instance3', 'instance5'):
+            self.assertEqual([{'name': 'sg1'}], groups[instance_id])
+        self.assertEqual([], groups['instance2'])
+
 
 class TestQuantumSecurityGroupRulesTestCase(TestQuantumSecurityGroupsTestCase):
     def setUp(self):
@@ -510,7 +562,8 @@ class MockClient(object):
                'port_security_enabled': p.get('port_security_enabled'),
                'device_owner': str(uuid.uuid4())}
 
-        fields = ['network_id', 'security_groups', 'admin_state_up']
+        fields = ['network_id', 'security_groups', 'admin_state_up',
+                  'device_id']
         for field in fields:
             ret[field] = p.get(field)
 
@@ -611,8 +664,11 @@ class MockClient(object):
                 [network for network in self._fake_networks.values()]}
 
     def list_ports(self, **_params):
-        return {'ports':
-                [port for port in self._fake_ports.values()]}
+        ports = self._fake_ports.values()
+        if 'device_id' in _params:
+            ports = [port for port in ports
+                     if port.get('device_id') in _params['device_id']]
+        return {'ports': ports}
 
     def list_subnets(self, **_params):
         return {'subnets':
@@ -29,6 +29,7 @@ from nova.api.openstack.compute import views
 from nova.api.openstack import xmlutil
 import nova.context
 from nova.openstack.common import jsonutils
+from nova.openstack.common import memorycache
 from nova import test
 from nova.tests.api.openstack import fakes
 from nova.tests import matchers
@@ -634,6 +635,121 @@ class LimiterTest(BaseLimitTestSuite):
         self.assertEqual(expected, results)
 
 
+class SharedLimiterTest(BaseLimitTestSuite):
+    """
+    Tests for the `limits.SharedLimiter` class, sharing its state through
+    the in-memory cache client.
+    """
+
+    def setUp(self):
+        """Run before each test."""
+        super(SharedLimiterTest, self).setUp()
+        self.cache = memorycache.Client()
+        self.stubs.Set(memorycache, 'get_client', lambda: self.cache)
+        self.stubs.Set(limits.SharedLimiter, '_get_time', self._get_time)
+        userlimits = {'user:user3': ''}
+        self.limiter = limits.SharedLimiter(TEST_LIMITS, **userlimits)
+
+    def _check(self, num, verb, url, username=None, limiter=None):
+        """Check and yield results from checks."""
+        limiter = limiter or self.limiter
+        for x in xrange(num):
+            yield limiter.check_for_delay(verb, url, username)[0]
+
+    def test_no_delay_GET(self):
+        # Requests no limit applies to don't reach the cache.
+        self.stubs.Set(self.cache, 'incr', None)
+        delay = self.limiter.check_for_delay("GET", "/anything")
+        self.assertEqual((None, None), delay)
+
+    def test_delay_PUT(self):
+        # The 11th PUT waits for the end of the minute.
+        self.time = 15.0
+        expected = [None] * 10 + [45.0]
+        self.assertEqual(expected, list(self._check(11, "PUT", "/anything")))
+
+        self.time = 60.0
+        self.assertEqual([None], list(self._check(1, "PUT", "/anything")))
+
+    def test_delay_PUT_servers(self):
+        expected = [None] * 5 + [60.0]
+        self.assertEqual(expected, list(self._check(6, "PUT", "/servers")))
+
+        # The rejected request was counted by the wider limit too.
+        expected = [None] * 4 + [60.0]
+        self.assertEqual(expected, list(self._check(5, "PUT", "/anything")))
+
+    def test_multiple_users(self):
+        expected = [None] * 10 + [60.0] * 5
+        self.assertEqual(expected,
+                         list(self._check(15, "PUT", "/anything", "user1")))
+        self.assertEqual([None] * 10,
+                         list(self._check(10, "PUT", "/anything", "user2")))
+        self.assertEqual([None] * 20,
+                         list(self._check(20, "PUT", "/anything", "user3")))
+
+    def test_shared_state(self):
+        # Limiters of different processes enforce the limits together.
+        other = limits.SharedLimiter(TEST_LIMITS)
+        for limiter in (self.limiter, other) * 5:
+            delay = limiter.check_for_delay("PUT", "/anything")
+            self.assertEqual((None, None), delay)
+
+        delay = other.check_for_delay("PUT", "/anything")
+        self.assertEqual((60.0, TEST_LIMITS[3].error_message), delay)
+
+    def test_concurrent_requests(self):
+        # Requests checked while another process is checking one are
+        # counted exactly once each.
+        other = limits.SharedLimiter(TEST_LIMITS)
+        incr = self.cache.incr
+        results = []
+
+        def concurrent_incr(key, delta=1):
+            self.stubs.Set(self.cache, 'incr', incr)
+            results.extend(self._check(10, "PUT", "/anything",
+                                       limiter=other))
+            return incr(key, delta)
+
+        self.stubs.Set(self.cache, 'incr', concurrent_incr)
+        results.extend(self._check(1, "PUT", "/anything"))
+        self.assertEqual([None] * 10 + [60.0], results)
+
+    def test_get_limits(self):
+        for i in range(4):
+            self.limiter.check_for_delay("PUT", "/anything")
+        other = limits.SharedLimiter(TEST_LIMITS)
+
+        remaining = dict((limit['regex'], limit['remaining'])
+                         for limit in other.get_limits()
+                         if limit['verb'] == 'PUT')
+        self.assertEqual({'': 6, '^/servers': 5}, remaining)
+
+
+class LimitMatcherTest(test.TestCase):
+    """
+    Tests for the `limits.LimitMatcher` class.
+    """
+
+    def test_match(self):
+        matcher = limits.LimitMatcher(TEST_LIMITS)
+        self.assertEqual([0], matcher("GET", "/delayed"))
+        self.assertEqual([], matcher("GET", "/servers"))
+        self.assertEqual([1, 2], matcher("POST", "/servers/detail"))
+        self.assertEqual([3], matcher("PUT", "/images"))
+        self.assertEqual([], matcher("DELETE", "/servers"))
+
+    def test_match_separately(self):
+        # Regexes with groups are not combined
+        matcher = limits.LimitMatcher([
+            limits.Limit("GET", "*", "^/(a|b)\\1$", 1, limits.PER_MINUTE),
+            limits.Limit("GET", "*", "^/a", 1, limits.PER_MINUTE),
+        ])
+        self.assertTrue(isinstance(matcher.patterns["GET"], list))
+        self.assertEqual([0, 1], matcher("GET", "/aa"))
+        self.assertEqual([1], matcher("GET", "/ab"))
+
+
 class WsgiLimiterTest(BaseLimitTestSuite):
     """
     Tests for `limits.WsgiLimiter` class.
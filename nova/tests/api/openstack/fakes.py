@@ -420,7 +420,7 @@ def stub_instance(id, user_id=None, project_id=None, host=None,
                   include_fake_metadata=True, config_drive=None,
                   power_state=None, nw_cache=None, metadata=None,
                   security_groups=None, root_device_name=None,
-                  limit=None, marker=None):
+                  limit=None, marker=None, columns=None):
 
     if user_id is None:
         user_id = 'fake_user'
@@ -505,6 +505,10 @@ def stub_instance(id, user_id=None, project_id=None, host=None,
 
     instance.update(info_cache)
 
+    if columns is not None:
+        # Only the requested columns are loaded, without any relation
+        instance = dict((column, instance[column]) for column in columns)
+
     return instance
 
 
@@ -142,6 +142,14 @@ class JSONDictSerializerTest(test.TestCase):
         result = result.replace('\n', '').replace(' ', '')
         self.assertEqual(result, expected_json)
 
+    def test_json_iter(self):
+        input_dict = dict(servers=[dict(id=1), dict(id=2)],
+                          servers_links=[])
+        serializer = wsgi.JSONDictSerializer()
+        result = list(serializer.serialize_iter(input_dict))
+        self.assertTrue(len(result) > 1)
+        self.assertEqual(''.join(result), serializer.serialize(input_dict))
+
 
 class TextDeserializerTest(test.TestCase):
     def test_dispatch_default(self):
@@ -709,6 +717,66 @@ class ResourceTest(test.TestCase):
         self.assertEqual(called, [2])
         self.assertEqual(response, 'foo')
 
+    def test_post_process_extensions_prefetch(self):
+        class Controller(object):
+            def index(self, req, pants=None):
+                return pants
+
+        controller = Controller()
+        resource = wsgi.Resource(controller)
+
+        prefetched = []
+
+        @wsgi.prefetcher('fake_data')
+        def prefetch_fake_data(req):
+            prefetched.append(req)
+            return 'data'
+
+        self.addCleanup(wsgi._prefetchers.pop, 'fake_data')
+
+        called = []
+
+        @wsgi.extends(prefetch=['fake_data'])
+        def extension1(req, resp_obj):
+            called.append(req.get_prefetched('fake_data'))
+
+        @wsgi.extends(prefetch=['fake_data'])
+        def extension2(req, resp_obj):
+            called.append(req.get_prefetched('fake_data'))
+
+        req = wsgi.Request.blank('/tests/123')
+        response = resource.post_process_extensions(
+                iter([extension2, extension1]), None, req, {})
+        self.assertEqual(called, ['data', 'data'])
+        self.assertEqual(prefetched, [req])
+        self.assertEqual(response, None)
+
+    def test_post_process_extensions_prefetch_failure(self):
+        class Controller(object):
+            def index(self, req, pants=None):
+                return pants
+
+        controller = Controller()
+        resource = wsgi.Resource(controller)
+
+        @wsgi.prefetcher('fake_data')
+        def prefetch_fake_data(req):
+            raise Exception('fake')
+
+        self.addCleanup(wsgi._prefetchers.pop, 'fake_data')
+
+        called = []
+
+        @wsgi.extends(prefetch=['fake_data'])
+        def extension1(req, resp_obj):
+            called.append(req.get_prefetched('fake_data'))
+
+        req = wsgi.Request.blank('/tests/123')
+        response = resource.post_process_extensions([extension1], None, req,
+                                                    {})
+        self.assertEqual(called, [None])
+        self.assertEqual(response, None)
+
     def test_post_process_extensions_generator(self):
         class Controller(object):
             def index(self, req, pants=None):
@@ -880,6 +948,21 @@ class ResponseObjectTest(test.TestCase):
             self.assertEqual(response.status_int, 202)
             self.assertEqual(response.body, mtype)
 
+    def test_serialize_stream(self):
+        class JSONSerializer(object):
+            def serialize(self, obj):
+                return 'json'
+
+            def serialize_iter(self, obj):
+                return iter(['streamed ', 'json'])
+
+        robj = wsgi.ResponseObject({}, json=JSONSerializer)
+        robj.stream = True
+        request = wsgi.Request.blank('/tests/123')
+        response = robj.serialize(request, 'application/json')
+
+        self.assertEqual(response.body, 'streamed json')
+
 
 class ValidBodyTest(test.TestCase):
 
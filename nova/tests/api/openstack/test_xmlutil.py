@@ -81,6 +81,25 @@ class SelectorTest(test.TestCase):
         self.assertEqual(sel.value, 'Foobar')
         self.assertEqual(sel(self.obj_for_test), 'Foobar')
 
+    def test_compiled_selector(self):
+        for chain in [(), ('test',), ('test', 'name'), ('test', 'values', 0),
+                      ('test', 'attrs', xmlutil.get_items), ('test2',),
+                      ('test', 'values', 5), ('test2', 'attrs')]:
+            sel = xmlutil.Selector(*chain)
+            compiled = xmlutil._compile_selector(sel)
+            self.assertEqual(compiled(self.obj_for_test),
+                             sel(self.obj_for_test))
+            try:
+                expected = sel(self.obj_for_test, True)
+            except KeyError:
+                self.assertRaises(KeyError, compiled, self.obj_for_test,
+                                  True)
+            else:
+                self.assertEqual(compiled(self.obj_for_test, True), expected)
+
+        sel = xmlutil.ConstantSelector('Foobar')
+        self.assertEqual(xmlutil._compile_selector(sel), sel)
+
 
 class TemplateElementTest(test.TestCase):
     def test_element_initial_attributes(self):
@@ -655,6 +674,79 @@ class TemplateTest(test.TestCase):
                          str(obj['test']['image']['id']))
         self.assertEqual(result[idx].text, obj['test']['image']['name'])
 
+    def _make_template(self):
+        root = xmlutil.TemplateElement('test', selector='test', name='name')
+        value = xmlutil.SubTemplateElement(root, 'value', selector='values')
+        value.text = xmlutil.Selector()
+        master = xmlutil.MasterTemplate(root, 1)
+
+        root_slave = xmlutil.TemplateElement('test', selector='test')
+        image = xmlutil.SubTemplateElement(root_slave, 'image',
+                                           selector='image', id='id')
+        image.text = xmlutil.Selector('name')
+        slave = xmlutil.SlaveTemplate(root_slave, 1, nsmap=dict(b='bar'))
+        return master, slave
+
+    def test_compile(self):
+        obj = {'test': {'name': 'foobar',
+                        'values': [1, 2, 3],
+                        'image': {'name': 'image_foobar', 'id': 42}}}
+        master, slave = self._make_template()
+        master.attach(slave)
+
+        plan = master.compile()
+        self.assertEqual(plan.tag, 'test')
+        self.assertEqual([child.tag for child in plan.children],
+                         ['value', 'image'])
+        self.assertEqual(plan.children[0].key, 'values')
+
+        expected = master._serialize(None, obj, master._siblings(),
+                                     master._nsmap())
+        self.assertEqual(etree.tostring(master.make_tree(obj)),
+                         etree.tostring(expected))
+
+    def test_compile_cached(self):
+        master, slave = self._make_template()
+        plan = master.compile()
+        self.assertEqual(master.copy().compile(), plan)
+
+        # Attaching a slave changes the siblings of the root
+        master.attach(slave)
+        slave_plan = master.compile()
+        self.assertNotEqual(slave_plan, plan)
+        self.assertEqual(master.copy().compile(), slave_plan)
+
+        # Modifying an element invalidates the plans
+        master.root['value'].set('foo')
+        self.assertNotEqual(master.compile(), slave_plan)
+        self.assertEqual(master.compile().children[0].attrib[0][0], 'foo')
+
+    def _make_list_template(self):
+        root = xmlutil.TemplateElement('servers')
+        elem = xmlutil.SubTemplateElement(root, 'server',
+                                          selector='servers')
+        elem.set('id')
+        elem.set('name')
+        xmlutil.SubTemplateElement(root, 'link', selector='servers_links',
+                                   rel='rel')
+        return xmlutil.MasterTemplate(root, 1, nsmap=dict(f='foo'))
+
+    def test_serialize_iter(self):
+        template = self._make_list_template()
+        obj = {'servers': [dict(id=str(i), name='server%d' % i)
+                           for i in range(25)],
+               'servers_links': [dict(rel='next')]}
+
+        chunks = list(template.serialize_iter(obj, batch_size=10))
+        self.assertEqual(len(chunks), 6)
+        self.assertEqual(''.join(chunks), template.serialize(obj))
+
+    def test_serialize_iter_empty(self):
+        template = self._make_list_template()
+        for obj in ({}, {'servers': []}):
+            self.assertEqual(''.join(template.serialize_iter(obj)),
+                             template.serialize(obj))
+
 
 class MasterTemplateBuilder(xmlutil.TemplateBuilder):
     def construct(self):
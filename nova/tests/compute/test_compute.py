@@ -67,6 +67,7 @@ from nova.tests import fake_network_cache_model
 from nova.tests.image import fake as fake_image
 from nova.tests import matchers
 from nova import utils
+from nova.virt import event as virtevent
 from nova.virt import fake
 from nova.volume import cinder
 
@@ -3273,6 +3274,95 @@ class ComputeTestCase(BaseTestCase):
 
         self.compute.post_live_migration_at_destination(admin_ctxt, instance)
 
+    def test_sync_power_states_only_out_of_sync(self):
+        ctxt = context.get_admin_context()
+        in_sync = {'uuid': 'fake-uuid1', 'task_state': None,
+                   'vm_state': vm_states.ACTIVE,
+                   'power_state': power_state.RUNNING}
+        out_of_sync = {'uuid': 'fake-uuid2', 'task_state': None,
+                       'vm_state': vm_states.ACTIVE,
+                       'power_state': power_state.RUNNING}
+        busy = {'uuid': 'fake-uuid3', 'task_state': task_states.REBOOTING,
+                'vm_state': vm_states.ACTIVE,
+                'power_state': power_state.RUNNING}
+
+        self.mox.StubOutWithMock(self.compute.conductor_api,
+                                 'instance_get_all_by_filters')
+        self.mox.StubOutWithMock(self.compute.driver,
+                                 'list_instance_power_states')
+        self.mox.StubOutWithMock(self.compute.driver, 'get_info')
+        self.mox.StubOutWithMock(self.compute, '_sync_instance_power_state')
+        self.compute.driver.list_instance_power_states().AndReturn(
+                {'fake-uuid1': power_state.RUNNING,
+                 'fake-uuid3': power_state.RUNNING})
+        self.compute.conductor_api.instance_get_all_by_filters(
+                ctxt, {'host': self.compute.host, 'deleted': False},
+                columns=['uuid', 'task_state', 'vm_state',
+                         'power_state']).AndReturn([in_sync, out_of_sync,
+                                                    busy])
+        self.compute._sync_instance_power_state(ctxt, out_of_sync,
+                                                power_state.NOSTATE)
+        self.mox.ReplayAll()
+
+        self.compute._sync_power_states(ctxt)
+
+    def test_sync_power_states_without_bulk_driver_call(self):
+        ctxt = context.get_admin_context()
+        instance = {'uuid': 'fake-uuid1', 'task_state': None,
+                    'vm_state': vm_states.STOPPED,
+                    'power_state': power_state.SHUTDOWN}
+
+        self.mox.StubOutWithMock(self.compute.conductor_api,
+                                 'instance_get_all_by_host')
+        self.mox.StubOutWithMock(self.compute.driver,
+                                 'list_instance_power_states')
+        self.mox.StubOutWithMock(self.compute.driver, 'get_num_instances')
+        self.mox.StubOutWithMock(self.compute.driver, 'get_info')
+        self.mox.StubOutWithMock(self.compute, '_sync_instance_power_state')
+        self.compute.driver.list_instance_power_states().AndRaise(
+                NotImplementedError())
+        self.compute.driver.get_num_instances().AndReturn(1)
+        self.compute.conductor_api.instance_get_all_by_host(
+                ctxt, self.compute.host).AndReturn([instance])
+        self.compute.driver.get_info(instance).AndReturn(
+                {'state': power_state.RUNNING})
+        self.compute._sync_instance_power_state(ctxt, instance,
+                                                power_state.RUNNING)
+        self.mox.ReplayAll()
+
+        self.compute._sync_power_states(ctxt)
+
+    def test_handle_lifecycle_event(self):
+        instance = {'uuid': 'fake-uuid'}
+        event = virtevent.LifecycleEvent('fake-uuid',
+                                         virtevent.EVENT_LIFECYCLE_STOPPED)
+
+        self.mox.StubOutWithMock(self.compute.conductor_api,
+                                 'instance_get_by_uuid')
+        self.mox.StubOutWithMock(self.compute, '_sync_instance_power_state')
+        self.compute.conductor_api.instance_get_by_uuid(
+                mox.IgnoreArg(), 'fake-uuid').AndReturn(instance)
+        self.compute._sync_instance_power_state(mox.IgnoreArg(), instance,
+                                                power_state.SHUTDOWN,
+                                                refresh=False)
+        self.mox.ReplayAll()
+
+        self.compute.handle_events(event)
+
+    def test_handle_lifecycle_event_deleted_instance(self):
+        event = virtevent.LifecycleEvent('fake-uuid',
+                                         virtevent.EVENT_LIFECYCLE_STOPPED)
+
+        self.mox.StubOutWithMock(self.compute.conductor_api,
+                                 'instance_get_by_uuid')
+        self.mox.StubOutWithMock(self.compute, '_sync_instance_power_state')
+        self.compute.conductor_api.instance_get_by_uuid(
+                mox.IgnoreArg(), 'fake-uuid').AndRaise(
+                        exception.InstanceNotFound(instance_id='fake-uuid'))
+        self.mox.ReplayAll()
+
+        self.compute.handle_events(event)
+
     def test_run_kill_vm(self):
         # Detect when a vm is terminated behind the scenes.
         self.stubs.Set(compute_manager.ComputeManager,
@@ -3559,6 +3649,60 @@ class ComputeTestCase(BaseTestCase):
         self.assertEqual(call_info['get_by_uuid'], 3)
         self.assertEqual(call_info['get_nw_info'], 4)
 
+    def test_heal_instance_info_cache_batch(self):
+        # Update on every call for the test
+        self.flags(heal_instance_info_cache_interval=-1,
+                   heal_instance_info_cache_batch_size=2)
+        ctxt = context.get_admin_context()
+
+        instances = [{'uuid': 'fake-uuid-%s' % x, 'host': CONF.host,
+                      'deleted': False}
+                     for x in xrange(3)]
+        call_info = {'get_all_by_host': 0, 'filters': [], 'nw_info': []}
+
+        def fake_instance_get_all_by_host(context, host):
+            call_info['get_all_by_host'] += 1
+            return [inst for inst in instances if not inst['deleted']]
+
+        def fake_instance_get_all_by_filters(context, filters):
+            call_info['filters'].append(filters)
+            return [inst for inst in instances
+                    if inst['uuid'] in filters['uuid'] and
+                    inst['deleted'] == filters['deleted']]
+
+        def fake_get_instance_nw_info_bulk(context, instances,
+                                           conductor_api=None):
+            call_info['nw_info'].append([inst['uuid'] for inst in instances])
+
+        self.stubs.Set(self.compute.conductor_api, 'instance_get_all_by_host',
+                fake_instance_get_all_by_host)
+        self.stubs.Set(self.compute.conductor_api,
+                'instance_get_all_by_filters',
+                fake_instance_get_all_by_filters)
+        self.stubs.Set(self.compute.network_api, 'get_instance_nw_info_bulk',
+                fake_get_instance_nw_info_bulk)
+
+        self.compute._heal_instance_info_cache(ctxt)
+        self.assertEqual(1, call_info['get_all_by_host'])
+        self.assertEqual({'uuid': ['fake-uuid-0', 'fake-uuid-1'],
+                          'host': CONF.host, 'deleted': False},
+                         call_info['filters'][0])
+        self.assertEqual([['fake-uuid-0', 'fake-uuid-1']],
+                         call_info['nw_info'])
+
+        # The remaining instance was deleted in the meantime.
+        instances[2]['deleted'] = True
+        self.compute._heal_instance_info_cache(ctxt)
+        self.assertEqual(1, call_info['get_all_by_host'])
+        self.assertEqual(1, len(call_info['nw_info']))
+        self.assertEqual([], self.compute._instance_uuids_to_heal)
+
+        # Starts over from the DB.
+        self.compute._heal_instance_info_cache(ctxt)
+        self.assertEqual(2, call_info['get_all_by_host'])
+        self.assertEqual(['fake-uuid-0', 'fake-uuid-1'],
+                         call_info['nw_info'][1])
+
     def test_poll_rescued_instances(self):
         timed_out_time = timeutils.utcnow() - datetime.timedelta(minutes=5)
         not_timed_out_time = timeutils.utcnow()
@@ -3593,6 +3737,99 @@ class ComputeTestCase(BaseTestCase):
         for instance in unrescued_instances.values():
             self.assertTrue(instance)
 
+    def test_poll_bandwidth_usage(self):
+        ctxt = context.get_admin_context()
+        prev_time, start_time = utils.last_completed_audit_period()
+        db.bw_usage_update(ctxt, 'uuid1', 'mac1', start_time,
+                           100, 200, 1000, 2000)
+        db.bw_usage_update(ctxt, 'uuid2', 'mac2', prev_time,
+                           50, 50, 500, 600)
+        bw_counters = [
+            dict(uuid='uuid1', mac_address='mac1', bw_in=1100, bw_out=1500),
+            dict(uuid='uuid2', mac_address='mac2', bw_in=700, bw_out=900),
+            dict(uuid='uuid3', mac_address='mac3', bw_in=10, bw_out=20)]
+        self.stubs.Set(self.compute.driver, 'get_all_bw_counters',
+                       lambda instances: bw_counters)
+
+        bulk_updates = []
+        orig_update_bulk = self.compute.conductor_api.bw_usage_update_bulk
+
+        def fake_update_bulk(*args, **kwargs):
+            bulk_updates.append(args)
+            return orig_update_bulk(*args, **kwargs)
+
+        self.stubs.Set(self.compute.conductor_api, 'bw_usage_update_bulk',
+                       fake_update_bulk)
+        self.stubs.Set(self.compute.conductor_api, 'bw_usage_update',
+                       self.fail)
+
+        self.compute._last_bw_usage_poll = 0
+        self.compute._poll_bandwidth_usage(ctxt)
+
+        self.assertEqual(1, len(bulk_updates))
+        usages = db.bw_usage_get_by_uuids(ctxt, ['uuid1', 'uuid2', 'uuid3'],
+                                          start_time)
+        usages = dict((usage['uuid'], (usage['bw_in'], usage['bw_out'],
+                                       usage['last_ctr_in'],
+                                       usage['last_ctr_out']))
+                      for usage in usages)
+        # The outgoing counter of uuid1 rolled over.
+        self.assertEqual({'uuid1': (200, 1700, 1100, 1500),
+                          'uuid2': (200, 300, 700, 900),
+                          'uuid3': (0, 0, 10, 20)}, usages)
+
+    def _fake_volume_usages(self, instance, rd_req):
+        return [dict(volume='fake-vol', instance=instance, rd_req=rd_req,
+                     rd_bytes=2, wr_req=3, wr_bytes=4)]
+
+    def test_poll_volume_usage(self):
+        self.flags(volume_usage_poll_interval=10)
+        ctxt = context.get_admin_context()
+        instance = jsonutils.to_primitive(self._create_fake_instance())
+        self.stubs.Set(self.compute, '_get_host_volume_bdms',
+                       lambda *args: ['fake-bdm'])
+        self.stubs.Set(self.compute.driver, 'get_all_volume_usage',
+                       lambda *args: self._fake_volume_usages(instance, 1))
+        self.stubs.Set(self.compute.conductor_api, 'vol_usage_update',
+                       self.fail)
+
+        self.compute._poll_volume_usage(ctxt)
+
+        vol_usages = db.vol_get_usage_by_time(ctxt,
+                timeutils.utcnow() - datetime.timedelta(seconds=10))
+        self.assertEqual(1, len(vol_usages))
+        self.assertEqual('fake-vol', vol_usages[0]['volume_id'])
+        self.assertEqual(instance['uuid'], vol_usages[0]['instance_id'])
+        self.assertEqual(1, vol_usages[0]['curr_reads'])
+        self.assertEqual({}, self.compute._pending_vol_usages)
+
+    def test_poll_volume_usage_flush_interval(self):
+        self.flags(volume_usage_poll_interval=10,
+                   volume_usage_flush_interval=60)
+        ctxt = context.get_admin_context()
+        instance = jsonutils.to_primitive(self._create_fake_instance())
+        self.compute._last_vol_usage_flush = time.time()
+
+        flushed = []
+        self.stubs.Set(self.compute.conductor_api, 'vol_usage_update_bulk',
+                       lambda context, usages, last_refreshed=None:
+                           flushed.append(usages))
+
+        for rd_req in (1, 2):
+            self.compute._update_volume_usage_cache(ctxt,
+                    self._fake_volume_usages(instance, rd_req), None)
+        self.assertEqual([], flushed)
+        self.assertEqual(2,
+                self.compute._pending_vol_usages['fake-vol']['rd_req'])
+
+        # Only the latest usage of the volume is written.
+        self.compute._last_vol_usage_flush = time.time() - 60
+        self.compute._update_volume_usage_cache(ctxt,
+                self._fake_volume_usages(instance, 3), None)
+        self.assertEqual(1, len(flushed))
+        self.assertEqual([3], [usage['rd_req'] for usage in flushed[0]])
+        self.assertEqual({}, self.compute._pending_vol_usages)
+
     def test_poll_unconfirmed_resizes(self):
         instances = [{'uuid': 'fake_uuid1', 'vm_state': vm_states.RESIZED,
                       'task_state': None},
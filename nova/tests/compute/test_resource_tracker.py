@@ -375,6 +375,7 @@ class BaseTrackerTestCase(BaseTestCase):
     def _fake_compute_node_update(self, ctx, compute_node_id, values,
             prune_stats=False):
         self.updated = True
+        self.update_values = dict(values)
         values['stats'] = [{"key": "num_instances", "value": "1"}]
 
         self.compute.update(values)
@@ -458,6 +459,76 @@ class TrackerTestCase(BaseTrackerTestCase):
         self.assertFalse(self.tracker.disabled)
         self.assertEqual(0, self.tracker.compute_node['current_workload'])
 
+    def test_update_unchanged_compute_node_skipped(self):
+        self.updated = False
+        self.tracker.update_available_resource(self.context)
+        self.assertFalse(self.updated)
+
+    def test_update_unchanged_compute_node_after_max_interval(self):
+        self.flags(compute_node_update_max_interval=60)
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        self.tracker.last_reported = timeutils.utcnow()
+        self.updated = False
+
+        timeutils.advance_time_seconds(30)
+        self.tracker.update_available_resource(self.context)
+        self.assertFalse(self.updated)
+
+        timeutils.advance_time_seconds(31)
+        self.tracker.update_available_resource(self.context)
+        self.assertTrue(self.updated)
+        self.assertEqual(FAKE_VIRT_MEMORY_MB, self.update_values['memory_mb'])
+        self.assertEqual(FAKE_VIRT_MEMORY_MB,
+                         self.update_values['free_ram_mb'])
+        self.assertEqual(0, self.update_values['vcpus_used'])
+        self.assertNotIn('stats', self.update_values)
+
+    def test_update_replaces_scheduler_claims(self):
+        self.flags(compute_node_update_max_interval=60)
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        self.tracker.last_reported = timeutils.utcnow()
+
+        # A scheduler claimed resources for an instance which never came
+        self.compute = dict(self.compute)
+        self.compute['free_ram_mb'] -= 512
+        self.compute['vcpus_used'] += 1
+        self.tracker.driver.local_gb += 1
+        self.tracker.update_available_resource(self.context)
+        self.assertEqual(FAKE_VIRT_MEMORY_MB - 512,
+                         self.compute['free_ram_mb'])
+        self._assert(FAKE_VIRT_MEMORY_MB, 'free_ram_mb')
+        self._assert(0, 'vcpus_used')
+
+        timeutils.advance_time_seconds(61)
+        self.tracker.update_available_resource(self.context)
+        self.assertEqual(FAKE_VIRT_MEMORY_MB, self.compute['free_ram_mb'])
+        self.assertEqual(0, self.compute['vcpus_used'])
+
+    def test_update_only_changes(self):
+        self.tracker.driver.memory_mb += 1
+        self.tracker.update_available_resource(self.context)
+        self.assertEqual({'memory_mb': FAKE_VIRT_MEMORY_MB + 1,
+                          'free_ram_mb': FAKE_VIRT_MEMORY_MB + 1},
+                         self.update_values)
+        self._assert(FAKE_VIRT_MEMORY_MB + 1, 'memory_mb')
+
+    def test_update_changed_stats(self):
+        instance = self._fake_instance(memory_mb=1, root_gb=1,
+                                       ephemeral_gb=0, task_state=None)
+        self.tracker.instance_claim(self.context, instance, self.limits)
+        stats = self.update_values['stats']
+        self.assertEqual(1, stats['num_instances'])
+        self.assertEqual(1, stats['num_proj_123456'])
+
+        instance['task_state'] = task_states.SCHEDULING
+        self.tracker.update_usage(self.context, instance)
+        stats = self.update_values['stats']
+        self.assertNotIn('num_instances', stats)
+        self.assertEqual(1, stats['num_task_%s' % task_states.SCHEDULING])
+        self.assertEqual(0, stats['num_task_None'])
+
 
 class InstanceClaimTestCase(BaseTrackerTestCase):
 
@@ -876,6 +947,72 @@ class ResizeClaimTestCase(BaseTrackerTestCase):
         self.assertEqual('fakenode', instance['node'])
 
 
+class IncrementalAuditTestCase(BaseTrackerTestCase):
+
+    def setUp(self):
+        super(IncrementalAuditTestCase, self).setUp()
+        self.flags(resource_audit_interval=600)
+        self.audits = 0
+        get_available_resource = self.tracker.driver.get_available_resource
+
+        def _get_available_resource(nodename):
+            self.audits += 1
+            return get_available_resource(nodename)
+        self.stubs.Set(self.tracker.driver, 'get_available_resource',
+                       _get_available_resource)
+
+    def test_no_audit_when_in_sync(self):
+        instance = self._fake_instance(memory_mb=1, root_gb=1,
+                                       ephemeral_gb=0)
+        self.tracker.instance_claim(self.context, instance, self.limits)
+        self.tracker.update_available_resource(self.context)
+        self.assertEqual(0, self.audits)
+        self._assert(1, 'memory_mb_used')
+
+    def test_audit_on_drift(self):
+        # An instance assigned to the node without a claim:
+        self._fake_instance(memory_mb=1, root_gb=1, ephemeral_gb=0,
+                            host=self.host, node='fakenode')
+        self.tracker.update_available_resource(self.context)
+        self.assertEqual(1, self.audits)
+        self._assert(1, 'memory_mb_used')
+
+    def test_audit_on_changed_instance(self):
+        instance = self._fake_instance(memory_mb=1, root_gb=1,
+                                       ephemeral_gb=0)
+        self.tracker.instance_claim(self.context, instance, self.limits)
+        instance['memory_mb'] = 2
+        self.tracker.update_available_resource(self.context)
+        self.assertEqual(1, self.audits)
+        self._assert(2, 'memory_mb_used')
+
+    def test_audit_after_interval(self):
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        self.tracker.last_audit = timeutils.utcnow()
+        timeutils.advance_time_seconds(601)
+        self.tracker.update_available_resource(self.context)
+        self.assertEqual(1, self.audits)
+
+    def test_audit_disabled(self):
+        self.flags(resource_audit_interval=0)
+        self.tracker.update_available_resource(self.context)
+        self.assertEqual(1, self.audits)
+
+    def test_audit_again_after_claim(self):
+        audit_data = self.tracker._get_audit_data(self.context)
+        generation = self.tracker.usage_generation
+        instance = self._fake_instance(memory_mb=1, root_gb=1,
+                                       ephemeral_gb=0)
+        self.tracker.instance_claim(self.context, instance, self.limits)
+
+        self.tracker._apply_audit(self.context, generation, audit_data,
+                                  False)
+        self.assertEqual(2, self.audits)
+        # The claimed instance was not lost:
+        self._assert(1, 'memory_mb_used')
+
+
 class OrphanTestCase(BaseTrackerTestCase):
     def _driver(self):
         class OrphanVirtDriver(FakeVirtDriver):
@@ -266,6 +266,15 @@ class _BaseTestCase(object):
         result = self.conductor.bw_usage_update(*update_args)
         self.assertEqual(result, 'foo')
 
+    def test_bw_usage_update_bulk(self):
+        self.mox.StubOutWithMock(db, 'bw_usage_update_bulk')
+        usages = [{'uuid': 'uuid', 'mac': 'mac', 'bw_in': 10, 'bw_out': 20,
+                   'last_ctr_in': 5, 'last_ctr_out': 10}]
+        db.bw_usage_update_bulk(self.context, 0, usages, 20)
+        self.mox.ReplayAll()
+        self.conductor.bw_usage_update_bulk(self.context, 0, usages,
+                                            last_refreshed=20)
+
     def test_get_backdoor_port(self):
         backdoor_port = 59697
 
@@ -407,6 +416,15 @@ class _BaseTestCase(object):
                                         {'uuid': 'fake-id'}, 'fake-refr',
                                         'fake-bool')
 
+    def test_vol_usage_update_bulk(self):
+        self.mox.StubOutWithMock(db, 'vol_usage_update_bulk')
+        usages = [{'volume_id': 'fake-vol', 'instance_uuid': 'fake-id',
+                   'rd_req': 1, 'rd_bytes': 2, 'wr_req': 3, 'wr_bytes': 4}]
+        db.vol_usage_update_bulk(self.context, usages, 'fake-refr')
+        self.mox.ReplayAll()
+        self.conductor.vol_usage_update_bulk(self.context, usages,
+                                             'fake-refr')
+
     def test_ping(self):
         result = self.conductor.ping(self.context, 'foo')
         self.assertEqual(result, {'service': 'conductor', 'arg': 'foo'})
@@ -599,6 +617,17 @@ class _BaseTestCase(object):
         self.mox.ReplayAll()
         self.conductor.compute_stop(self.context, 'instance')
 
+    def test_instance_get_all_by_filters_columns(self):
+        filters = {'foo': 'bar'}
+        self.mox.StubOutWithMock(db, 'instance_get_all_by_filters')
+        db.instance_get_all_by_filters(self.context, filters,
+                'fake-key', 'fake-sort', columns=['uuid'],
+                expected_attrs=None).AndReturn([{'uuid': 'fake-uuid'}])
+        self.mox.ReplayAll()
+        result = self.conductor.instance_get_all_by_filters(self.context,
+                filters, 'fake-key', 'fake-sort', columns=['uuid'])
+        self.assertEqual([{'uuid': 'fake-uuid'}], result)
+
 
 class ConductorTestCase(_BaseTestCase, test.TestCase):
     """Conductor Manager Tests."""
@@ -657,7 +686,8 @@ class ConductorTestCase(_BaseTestCase, test.TestCase):
         filters = {'foo': 'bar'}
         self.mox.StubOutWithMock(db, 'instance_get_all_by_filters')
         db.instance_get_all_by_filters(self.context, filters,
-                                       'fake-key', 'fake-sort')
+                                       'fake-key', 'fake-sort',
+                                       columns=None, expected_attrs=None)
         self.mox.ReplayAll()
         self.conductor.instance_get_all_by_filters(self.context, filters,
                                                    'fake-key', 'fake-sort')
@@ -813,7 +843,8 @@ class ConductorRPCAPITestCase(_BaseTestCase, test.TestCase):
         filters = {'foo': 'bar'}
         self.mox.StubOutWithMock(db, 'instance_get_all_by_filters')
         db.instance_get_all_by_filters(self.context, filters,
-                                       'fake-key', 'fake-sort')
+                                       'fake-key', 'fake-sort',
+                                       columns=None, expected_attrs=None)
         self.mox.ReplayAll()
         self.conductor.instance_get_all_by_filters(self.context, filters,
                                                    'fake-key', 'fake-sort')
@@ -919,6 +950,14 @@ class ConductorAPITestCase(_BaseTestCase, test.TestCase):
         result = self.conductor.bw_usage_get(*get_args)
         self.assertEqual(result, 'foo')
 
+    def test_bw_usage_get_by_uuids(self):
+        self.mox.StubOutWithMock(db, 'bw_usage_get_by_uuids')
+        db.bw_usage_get_by_uuids(self.context, ['uuid'], 0).AndReturn('foo')
+        self.mox.ReplayAll()
+        result = self.conductor.bw_usage_get_by_uuids(self.context, ['uuid'],
+                                                      0)
+        self.assertEqual(result, 'foo')
+
     def test_block_device_mapping_update_or_create(self):
         self.mox.StubOutWithMock(db, 'block_device_mapping_create')
         self.mox.StubOutWithMock(db, 'block_device_mapping_update')
@@ -960,7 +999,8 @@ class ConductorAPITestCase(_BaseTestCase, test.TestCase):
         self.mox.StubOutWithMock(db, 'instance_get_all_by_filters')
         db.instance_get_all(self.context)
         db.instance_get_all_by_filters(self.context, {'name': 'fake-inst'},
-                                       'updated_at', 'asc')
+                                       'updated_at', 'asc', columns=None,
+                                       expected_attrs=None)
         self.mox.ReplayAll()
         self.conductor.instance_get_all(self.context)
         self.conductor.instance_get_all_by_filters(self.context,
@@ -28,6 +28,7 @@ from nova import exception
 from nova import network
 from nova.network import api
 from nova.network import floating_ips
+from nova.network import model as network_model
 from nova.network import rpcapi as network_rpcapi
 from nova import policy
 from nova import test
@@ -267,3 +268,37 @@ class ApiTestCase(test.TestCase):
 
         port = self.network_api.get_backdoor_port(self.context, 'fake_host')
         self.assertEqual(port, backdoor_port)
+
+    def test_get_instance_nw_info_bulk(self):
+        inst_type = instance_types.get_default_instance_type()
+        sys_meta = utils.dict_to_metadata(
+                instance_types.save_instance_type_info({}, inst_type))
+        nw_info = network_model.NetworkInfo([network_model.VIF(id='vif1')])
+        instances = [dict(uuid='uuid%d' % i, host='host',
+                          system_metadata=sys_meta,
+                          info_cache={'network_info': cache})
+                     for i, cache in ((1, nw_info.json()),
+                                      (2, '[]'),
+                                      (3, 'corrupted'))]
+
+        self.mox.StubOutWithMock(self.network_api.network_rpcapi,
+                                 'get_instance_nw_info_bulk')
+        self.network_api.network_rpcapi.get_instance_nw_info_bulk(
+                self.context,
+                [{'instance_id': 'uuid%d' % i,
+                  'rxtx_factor': inst_type['rxtx_factor'],
+                  'host': 'host'} for i in xrange(1, 4)]).AndReturn(
+                dict(('uuid%d' % i, nw_info) for i in xrange(1, 4)))
+
+        # Only the caches that changed are written.
+        self.mox.StubOutWithMock(self.network_api.db,
+                                 'instance_info_cache_update')
+        for uuid in ('uuid2', 'uuid3'):
+            self.network_api.db.instance_info_cache_update(self.context,
+                    uuid, {'network_info': nw_info.json()})
+        self.mox.ReplayAll()
+
+        result = self.network_api.get_instance_nw_info_bulk(self.context,
+                                                            instances)
+        self.assertEqual(['uuid1', 'uuid2', 'uuid3'], sorted(result))
+        self.assertEqual(nw_info, result['uuid1'])
@@ -206,6 +206,34 @@ class FlatNetworkTestCase(test.TestCase):
                       for ip_num in xrange(1, num_fixed_ips + 1)]
             self.assertThat(info['ips'], matchers.DictListMatches(check))
 
+    def test_get_instance_nw_info_bulk(self):
+        self.mox.StubOutWithMock(db, 'virtual_interface_get_by_instance')
+        self.mox.StubOutWithMock(self.network, '_get_network_by_id')
+        self.mox.StubOutWithMock(self.network, 'build_network_info_model')
+        vifs = [{'uuid': 'vif1', 'network_id': 1}]
+
+        db.virtual_interface_get_by_instance(self.context,
+                                             'uuid1').AndReturn(vifs)
+        self.network._get_network_by_id(self.context,
+                                        1).AndReturn(networks[0])
+        self.network.build_network_info_model(self.context, vifs,
+                {'vif1': networks[0]}, 1.0, HOST).AndReturn('nw_info1')
+        db.virtual_interface_get_by_instance(self.context,
+                'uuid2').AndRaise(test.TestingException())
+        # The network is looked up only once.
+        db.virtual_interface_get_by_instance(self.context,
+                                             'uuid3').AndReturn(vifs)
+        self.network.build_network_info_model(self.context, vifs,
+                {'vif1': networks[0]}, 1.0, HOST).AndReturn('nw_info3')
+        self.mox.ReplayAll()
+
+        instances = [dict(instance_id='uuid%d' % i, rxtx_factor=1.0,
+                          host=HOST) for i in xrange(1, 4)]
+        nw_infos = self.network.get_instance_nw_info_bulk(self.context,
+                                                          instances)
+        self.assertEqual({'uuid1': 'nw_info1', 'uuid3': 'nw_info3'},
+                         nw_infos)
+
     def test_validate_networks(self):
         self.mox.StubOutWithMock(db, 'network_get')
         self.mox.StubOutWithMock(db, 'network_get_all_by_uuids')
@@ -379,6 +379,78 @@ class TestQuantumv2(test.TestCase):
         self.assertEquals('my_mac%s' % id_suffix, nw_inf[0]['address'])
         self.assertEquals(0, len(nw_inf[0]['network']['subnets']))
 
+    def _get_instance_nw_info_bulk(self, device_id_chunks):
+        api = quantumapi.API()
+        project_id = self.instance['project_id']
+        instances = [dict(self.instance, uuid='device_id1'),
+                     dict(self.instance, uuid='device_id2'),
+                     dict(self.instance, uuid='device_id3')]
+        ports = [dict(port, tenant_id=project_id)
+                 for port in self.port_data2]
+        dhcp_ports = [dict(self.dhcp_port_data1[0], network_id='my_netid1')]
+
+        for device_ids in device_id_chunks:
+            self.moxed_client.list_ports(device_id=device_ids).AndReturn(
+                {'ports': [port for port in ports
+                           if port['device_id'] in device_ids]})
+        self.moxed_client.list_floatingips(
+            port_id=mox.SameElementsAs(['my_portid1', 'my_portid2'])
+            ).AndReturn({'floatingips': self.float_data2})
+        self.moxed_client.list_subnets(
+            id=mox.SameElementsAs(['my_subid1', 'my_subid2'])).AndReturn(
+                {'subnets': self.subnet_data1 + self.subnet_data2})
+        self.moxed_client.list_ports(
+            network_id=mox.SameElementsAs(['my_netid1', 'my_netid2']),
+            device_owner='network:dhcp').AndReturn({'ports': dhcp_ports})
+        # The networks of the project are listed once.
+        self.moxed_client.list_networks(
+            tenant_id=project_id, shared=False).AndReturn(
+                {'networks': self.nets2})
+        self.moxed_client.list_networks(
+            shared=True).AndReturn({'networks': []})
+        quantumv2.get_client(mox.IgnoreArg(),
+                             admin=True).MultipleTimes().AndReturn(
+            self.moxed_client)
+
+        # The caches of the instances with ports are written.
+        self.mox.StubOutWithMock(api.db, 'instance_info_cache_update')
+        api.db.instance_info_cache_update(mox.IgnoreArg(), 'device_id1',
+                                          mox.IgnoreArg())
+        api.db.instance_info_cache_update(mox.IgnoreArg(), 'device_id2',
+                                          mox.IgnoreArg())
+        self.mox.ReplayAll()
+
+        return api.get_instance_nw_info_bulk(self.context, instances)
+
+    def test_get_instance_nw_info_bulk(self):
+        # Test to get the ports of three instances with one listing.
+        nw_infos = self._get_instance_nw_info_bulk(
+                [['device_id1', 'device_id2', 'device_id3']])
+        self.assertEqual(['device_id1', 'device_id2', 'device_id3'],
+                         sorted(nw_infos))
+        self.assertEqual([], nw_infos['device_id3'])
+        self._verify_nw_info(nw_infos['device_id1'], 0)
+        nw_inf = nw_infos['device_id2']
+        self.assertEqual(1, len(nw_inf))
+        self.assertEqual('my_portid2', nw_inf[0]['id'])
+        self.assertEqual('172.0.2.2',
+                         nw_inf.fixed_ips()[0].floating_ip_addresses()[0])
+        self.assertEqual('10.0.2.0/24',
+                         nw_inf[0]['network']['subnets'][0]['cidr'])
+        subnet = nw_infos['device_id1'][0]['network']['subnets'][0]
+        self.assertEqual('10.0.1.9', subnet.get_meta('dhcp_server'))
+
+    def test_get_instance_nw_info_bulk_chunked(self):
+        # The ids passed to a listing are limited to keep its query
+        # string short.
+        self.stubs.Set(quantumapi, 'MAX_IDS_PER_REQUEST', 2)
+        nw_infos = self._get_instance_nw_info_bulk(
+                [['device_id1', 'device_id2'], ['device_id3']])
+        self.assertEqual(['device_id1', 'device_id2', 'device_id3'],
+                         sorted(nw_infos))
+        self._verify_nw_info(nw_infos['device_id1'], 0)
+        self.assertEqual('my_portid2', nw_infos['device_id2'][0]['id'])
+
     def test_refresh_quantum_extensions_cache(self):
         api = quantumapi.API()
         self.moxed_client.list_extensions().AndReturn(
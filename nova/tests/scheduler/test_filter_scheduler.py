@@ -16,6 +16,8 @@
 Tests For Filter Scheduler.
 """
 
+import random
+
 import mox
 
 from nova.compute import instance_types
@@ -161,7 +163,8 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
         self.next_weight = 1.0
 
-        def _fake_weigh_objects(_self, functions, hosts, options):
+        def _fake_weigh_objects(_self, functions, hosts, options,
+                                limit=None):
             self.next_weight += 2.0
             host_state = hosts[0]
             return [weights.WeighedHost(host_state, self.next_weight)]
@@ -506,7 +509,8 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
                                            'ephemeral_gb': 0, 'vcpus': 1}}
         self.next_weight = 1.0
 
-        def _fake_weigh_objects(_self, functions, hosts, options):
+        def _fake_weigh_objects(_self, functions, hosts, options,
+                                limit=None):
             self.next_weight += 2.0
             host_state = hosts[0]
             return [weights.WeighedHost(host_state, self.next_weight)]
@@ -630,7 +634,8 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
         self.next_weight = 50
 
-        def _fake_weigh_objects(_self, functions, hosts, options):
+        def _fake_weigh_objects(_self, functions, hosts, options,
+                                limit=None):
             this_weight = self.next_weight
             self.next_weight = 0
             host_state = hosts[0]
@@ -667,7 +672,8 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
         selected_hosts = []
 
-        def _fake_weigh_objects(_self, functions, hosts, options):
+        def _fake_weigh_objects(_self, functions, hosts, options,
+                                limit=None):
             self.next_weight += 2.0
             host_state = hosts[0]
             selected_hosts.append(host_state.host)
@@ -697,3 +703,95 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
         hosts = sched.select_hosts(fake_context, request_spec, {})
         self.assertEquals(len(hosts), 10)
         self.assertEquals(hosts, selected_hosts)
+
+    def _schedule_fake_hosts(self, num_instances, subset_size,
+                             fake_claim_host=None):
+        self.flags(scheduler_host_subset_size=subset_size,
+                   scheduler_default_filters=['RamFilter', 'CoreFilter'],
+                   ram_allocation_ratio=1.0, cpu_allocation_ratio=1.0)
+        sched = fakes.FakeFilterScheduler()
+        if fake_claim_host:
+            self.flags(scheduler_optimistic_claims=True)
+            self.stubs.Set(sched.host_manager, 'claim_host',
+                           fake_claim_host)
+        hosts = [fakes.FakeHostState('host%s' % (i / 2), 'node%s' % i,
+                                     {'free_ram_mb': ram,
+                                      'total_usable_ram_mb': 4096,
+                                      'vcpus_total': vcpus,
+                                      'vcpus_used': 0})
+                 for i, (ram, vcpus) in enumerate([(2048, 4), (1024, 2),
+                                                   (4096, 1), (512, 8),
+                                                   (3072, 3), (1024, 8),
+                                                   (2048, 2)])]
+        self.stubs.Set(sched.host_manager, 'get_all_host_states',
+                       lambda context: iter(hosts))
+
+        instance_type = {'memory_mb': 512, 'root_gb': 0, 'ephemeral_gb': 0,
+                         'vcpus': 1}
+        instance_properties = dict(instance_type, project_id=1,
+                                   os_type='Linux')
+        request_spec = {'num_instances': num_instances,
+                        'instance_type': instance_type,
+                        'instance_properties': instance_properties}
+        random.seed(42)
+        weighed_hosts = sched._schedule(self.context, request_spec, {})
+        return [(weighed_host.obj.nodename, weighed_host.weight)
+                for weighed_host in weighed_hosts]
+
+    def test_schedule_bulk_same_placements(self):
+        for subset_size in (1, 3):
+            expected = self._schedule_fake_hosts(40, subset_size)
+            self.assertTrue(len(expected) > 10)
+            self.flags(scheduler_bulk_placement=True)
+            self.assertEqual(expected,
+                             self._schedule_fake_hosts(40, subset_size))
+            self.flags(scheduler_bulk_placement=False)
+
+    def test_schedule_claim_conflicts(self):
+        # Every other claim conflicts and the host turns out to be full.
+        claims = []
+
+        def fake_claim_host(context, host_state, instance):
+            claims.append(host_state.nodename)
+            if len(claims) % 2:
+                host_state.free_ram_mb = 0
+                raise exception.ComputeNodeGenerationConflict(
+                        compute_id=1, generation=0)
+
+        results = []
+        for bulk in (False, True):
+            self.flags(scheduler_bulk_placement=bulk)
+            claims[:] = []
+            results.append(self._schedule_fake_hosts(3, 1,
+                                                     fake_claim_host))
+            self.assertEqual(6, len(claims))
+            self.assertEqual(claims[1::2],
+                             [nodename for nodename, weight in results[-1]])
+            self.assertNotIn(claims[0], claims[1::2])
+        self.assertEqual(results[0], results[1])
+
+    def test_schedule_too_many_claim_conflicts(self):
+        claims = []
+
+        def fake_claim_host(context, host_state, instance):
+            claims.append(host_state.nodename)
+            raise exception.ComputeNodeGenerationConflict(compute_id=1,
+                                                          generation=0)
+
+        for bulk in (False, True):
+            self.flags(scheduler_bulk_placement=bulk)
+            claims[:] = []
+            self.assertEqual([], self._schedule_fake_hosts(3, 1,
+                                                           fake_claim_host))
+            self.assertEqual(filter_scheduler.MAX_CLAIM_CONFLICTS + 1,
+                             len(claims))
+
+    def test_schedule_bulk_no_hosts(self):
+        self.flags(scheduler_bulk_placement=True)
+        sched = fakes.FakeFilterScheduler()
+        self.stubs.Set(sched.host_manager, 'get_all_host_states',
+                       lambda context: iter([]))
+        request_spec = {'num_instances': 2,
+                        'instance_properties': {'project_id': 1,
+                                                'os_type': 'Linux'}}
+        self.assertEqual([], sched._schedule(self.context, request_spec, {}))
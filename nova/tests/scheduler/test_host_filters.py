@@ -27,6 +27,7 @@ from nova.openstack.common import timeutils
 from nova.scheduler import filters
 from nova.scheduler.filters import extra_specs_ops
 from nova.scheduler.filters import trusted_filter
+from nova.scheduler import host_manager
 from nova import servicegroup
 from nova import test
 from nova.tests.scheduler import fakes
@@ -831,6 +832,29 @@ class HostFiltersTestCase(test.TestCase):
                     'trust:trusted_host': 'true'},
             passes=False)
 
+    def test_aggregate_filter_index_extra_specs(self):
+        filt_cls = self.class_map['AggregateInstanceExtraSpecsFilter']()
+        self._create_aggregate_with_host(metadata={'opt1': '1', 'opt2': '2'},
+                                         hosts=['host1', 'host2'])
+        self._create_aggregate_with_host(name='fake2',
+                                         metadata={'opt2': '3'},
+                                         hosts=['host2', 'host3'])
+        host1 = fakes.FakeHostState('host1', 'node1', {})
+        host2 = fakes.FakeHostState('host2', 'node2', {})
+        host3 = fakes.FakeHostState('host3', 'node3', {})
+        host_index = host_manager.HostStateIndex([host1, host2, host3])
+
+        extra_specs = {'opt1': '1', 'opt2': '<in> 3',
+                       'trust:trusted_host': 'true'}
+        filter_properties = {'context': self.context, 'instance_type':
+                {'memory_mb': 1024, 'extra_specs': extra_specs}}
+        self.assertEqual(set([host2]),
+                         filt_cls.filter_index(host_index, filter_properties))
+
+        filter_properties['instance_type']['extra_specs'] = {'opt2': '2'}
+        self.assertEqual(set([host1, host2]),
+                         filt_cls.filter_index(host_index, filter_properties))
+
     def test_isolated_hosts_fails_isolated_on_non_isolated(self):
         self.flags(isolated_images=['isolated'], isolated_hosts=['isolated'])
         filt_cls = self.class_map['IsolatedHostsFilter']()
@@ -1345,6 +1369,23 @@ class HostFiltersTestCase(test.TestCase):
                                    {'service': service})
         self.assertFalse(filt_cls.host_passes(host, request))
 
+    def test_availability_zone_filter_index(self):
+        filt_cls = self.class_map['AvailabilityZoneFilter']()
+        self.flags(default_availability_zone='nova')
+        self._create_aggregate_with_host(hosts=['host1'])
+        host1 = fakes.FakeHostState('host1', 'node1', {})
+        host2 = fakes.FakeHostState('host2', 'node2', {})
+        host_index = host_manager.HostStateIndex([host1, host2])
+
+        request = self._make_zone_request('fake_avail_zone', is_admin=True)
+        self.assertEqual(set([host1]),
+                         filt_cls.filter_index(host_index, request))
+        request = self._make_zone_request('nova', is_admin=True)
+        self.assertEqual(set([host2]),
+                         filt_cls.filter_index(host_index, request))
+        request = self._make_zone_request(None)
+        self.assertEqual(None, filt_cls.filter_index(host_index, request))
+
     def test_retry_filter_disabled(self):
         # Test case where retry/re-scheduling is disabled.
         filt_cls = self.class_map['RetryFilter']()
@@ -15,6 +15,10 @@
 """
 Tests For HostManager
 """
+import datetime
+
+import mox
+
 from nova.compute import task_states
 from nova.compute import vm_states
 from nova import db
@@ -37,6 +41,26 @@ class FakeFilterClass2(filters.BaseHostFilter):
         pass
 
 
+class FakeIndexFilterClass(filters.BaseHostFilter):
+    use_host_index = True
+
+    def filter_index(self, host_index, filter_properties):
+        return set(host for host in host_index.host_states
+                   if host.free_ram_mb >= filter_properties['ram'])
+
+    def host_passes(self, host_state, filter_properties):
+        return host_state.free_ram_mb >= filter_properties['ram']
+
+
+class FakeIndexOnlyFilterClass(filters.BaseHostFilter):
+    use_host_index = True
+    filter_index_only = True
+
+    def filter_index(self, host_index, filter_properties):
+        return set(host for host in host_index.host_states
+                   if host.host != filter_properties['skip'])
+
+
 class HostManagerTestCase(test.TestCase):
     """Test case for HostManager class."""
 
@@ -172,6 +196,72 @@ class HostManagerTestCase(test.TestCase):
                 fake_properties)
         self._verify_result(info, result, False)
 
+    def test_get_filtered_hosts_with_host_index(self):
+        self.flags(scheduler_use_host_index=True)
+        for i, host in enumerate(self.fake_hosts):
+            host.free_ram_mb = 512 * i
+        fake_properties = {'ram': 512, 'skip': 'fake_host3'}
+
+        info = {'expected_objs': [self.fake_hosts[1], self.fake_hosts[3]],
+                'expected_fprops': fake_properties}
+        self.mox.StubOutWithMock(self.host_manager, '_choose_host_filters')
+        self.host_manager._choose_host_filters(None).AndReturn(
+                [FakeIndexFilterClass, FakeIndexOnlyFilterClass,
+                 FakeFilterClass1])
+        info['got_objs'] = []
+        info['got_fprops'] = []
+
+        def fake_filter_one(_self, obj, filter_props):
+            info['got_objs'].append(obj)
+            info['got_fprops'].append(filter_props)
+            return True
+
+        self.stubs.Set(FakeFilterClass1, '_filter_one', fake_filter_one)
+        self.mox.ReplayAll()
+
+        result = self.host_manager.get_filtered_hosts(self.fake_hosts,
+                fake_properties)
+        self._verify_result(info, result)
+        self.assertEqual([self.fake_hosts[1], self.fake_hosts[3]], result)
+
+    def test_claim_host(self):
+        host_state = self.fake_hosts[0]
+        host_state.compute_node_id = 1
+        host_state.generation = 3
+        instance = dict(memory_mb=512, root_gb=10, ephemeral_gb=5, vcpus=2)
+
+        self.mox.StubOutWithMock(db, 'compute_node_claim')
+        db.compute_node_claim(mox.IgnoreArg(), 1, 3, 512, 15, 2).AndReturn(4)
+        self.mox.ReplayAll()
+
+        self.host_manager.claim_host('fake_context', host_state, instance)
+        self.assertEqual(4, host_state.generation)
+
+    def test_claim_host_conflict_reloads_host_state(self):
+        host_state = self.fake_hosts[0]
+        host_state.compute_node_id = 1
+        host_state.generation = 3
+        # Consumed more recently than the compute node was updated.
+        host_state.updated = timeutils.utcnow()
+        instance = dict(memory_mb=512, root_gb=10, ephemeral_gb=5, vcpus=2)
+        compute = dict(fakes.COMPUTE_NODES[0], id=1, generation=5,
+                       updated_at=timeutils.utcnow() -
+                               datetime.timedelta(seconds=10))
+
+        self.mox.StubOutWithMock(db, 'compute_node_claim')
+        self.mox.StubOutWithMock(db, 'compute_node_get')
+        db.compute_node_claim(mox.IgnoreArg(), 1, 3, 512, 15, 2).AndRaise(
+                exception.ComputeNodeGenerationConflict(compute_id=1,
+                                                        generation=3))
+        db.compute_node_get(mox.IgnoreArg(), 1).AndReturn(compute)
+        self.mox.ReplayAll()
+
+        self.assertRaises(exception.ComputeNodeGenerationConflict,
+                          self.host_manager.claim_host, 'fake_context',
+                          host_state, instance)
+        self.assertEqual(5, host_state.generation)
+        self.assertEqual(compute['free_ram_mb'], host_state.free_ram_mb)
+
     def test_update_service_capabilities(self):
         service_states = self.host_manager.service_states
         self.assertEqual(len(service_states.keys()), 0)
@@ -322,6 +412,154 @@ class HostManagerChangedNodesTestCase(test.TestCase):
         host_states_map = self.host_manager.host_state_map
         self.assertEqual(len(host_states_map), 0)
 
+    def test_get_all_host_states_cached_only_loads_changes(self):
+        self.flags(scheduler_full_refresh_interval=300)
+        context = 'fake_context'
+        changed_node = dict(fakes.COMPUTE_NODES[0], free_ram_mb=256,
+                            deleted=0)
+
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'compute_node_get_all_changed_since')
+        self.mox.StubOutWithMock(db, 'service_get_all')
+        db.compute_node_get_all(context).AndReturn(fakes.COMPUTE_NODES)
+        db.compute_node_get_all_changed_since(context,
+                timeutils.parse_isotime('2013-04-01T11:59:55Z')).AndReturn(
+                [changed_node])
+        db.service_get_all(context).AndReturn([])
+        self.mox.ReplayAll()
+
+        timeutils.set_time_override(
+                timeutils.parse_isotime('2013-04-01T12:00:00Z'))
+        self.host_manager.get_all_host_states(context)
+        timeutils.advance_time_seconds(10)
+        self.host_manager.get_all_host_states(context)
+
+        host_states_map = self.host_manager.host_state_map
+        self.assertEqual(len(host_states_map), 4)
+        self.assertEqual(host_states_map[('host1', 'node1')].free_ram_mb,
+                         256)
+        self.assertEqual(host_states_map[('host3', 'node3')].free_ram_mb,
+                         3072)
+
+    def test_get_all_host_states_cached_removes_deleted(self):
+        self.flags(scheduler_full_refresh_interval=300)
+        context = 'fake_context'
+        deleted_node = dict(fakes.COMPUTE_NODES[3], service=None, deleted=4)
+
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'compute_node_get_all_changed_since')
+        self.mox.StubOutWithMock(db, 'service_get_all')
+        db.compute_node_get_all(context).AndReturn(fakes.COMPUTE_NODES)
+        db.compute_node_get_all_changed_since(context,
+                mox.IgnoreArg()).AndReturn([deleted_node])
+        db.service_get_all(context).AndReturn([])
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(context)
+        self.host_manager.get_all_host_states(context)
+
+        host_states_map = self.host_manager.host_state_map
+        self.assertEqual(len(host_states_map), 3)
+        self.assertFalse(('host4', 'node4') in host_states_map)
+
+    def test_get_all_host_states_cached_within_max_staleness(self):
+        self.flags(scheduler_full_refresh_interval=300,
+                   scheduler_host_state_max_staleness=30)
+        context = 'fake_context'
+
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'compute_node_get_all_changed_since')
+        db.compute_node_get_all(context).AndReturn(fakes.COMPUTE_NODES)
+        self.mox.ReplayAll()
+
+        timeutils.set_time_override()
+        self.host_manager.get_all_host_states(context)
+        timeutils.advance_time_seconds(10)
+        host_states = list(self.host_manager.get_all_host_states(context))
+        self.assertEqual(len(host_states), 4)
+
+    def test_get_all_host_states_cached_full_refresh(self):
+        self.flags(scheduler_full_refresh_interval=300)
+        context = 'fake_context'
+
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'compute_node_get_all_changed_since')
+        db.compute_node_get_all(context).AndReturn(fakes.COMPUTE_NODES)
+        running_nodes = [n for n in fakes.COMPUTE_NODES
+                         if n.get('hypervisor_hostname') != 'node4']
+        db.compute_node_get_all(context).AndReturn(running_nodes)
+        self.mox.ReplayAll()
+
+        timeutils.set_time_override()
+        self.host_manager.get_all_host_states(context)
+        timeutils.advance_time_seconds(301)
+        self.host_manager.get_all_host_states(context)
+
+        host_states_map = self.host_manager.host_state_map
+        self.assertEqual(len(host_states_map), 3)
+
+    def test_get_all_host_states_cached_refreshes_services(self):
+        self.flags(scheduler_full_refresh_interval=300)
+        context = 'fake_context'
+        service = dict(fakes.COMPUTE_NODES[0]['service'], topic='compute',
+                       disabled=True)
+
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'compute_node_get_all_changed_since')
+        self.mox.StubOutWithMock(db, 'service_get_all')
+        db.compute_node_get_all(context).AndReturn(fakes.COMPUTE_NODES)
+        db.compute_node_get_all_changed_since(context,
+                mox.IgnoreArg()).AndReturn([])
+        db.service_get_all(context).AndReturn([service])
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(context)
+        self.host_manager.get_all_host_states(context)
+
+        host_states_map = self.host_manager.host_state_map
+        self.assertTrue(
+                host_states_map[('host1', 'node1')].service['disabled'])
+        self.assertFalse(
+                host_states_map[('host3', 'node3')].service['disabled'])
+
+    def test_get_all_host_states_cached_full_refresh_drops_usage(self):
+        self.flags(scheduler_full_refresh_interval=300)
+        context = 'fake_context'
+
+        timeutils.set_time_override()
+        compute_nodes = [dict(node, updated_at=timeutils.utcnow())
+                         for node in fakes.COMPUTE_NODES]
+
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        db.compute_node_get_all(context).AndReturn(compute_nodes)
+        db.compute_node_get_all(context).AndReturn(compute_nodes)
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(context)
+        host_state = self.host_manager.host_state_map[('host1', 'node1')]
+        free_ram_mb = host_state.free_ram_mb
+        host_state.consume_from_instance({'memory_mb': 512, 'root_gb': 0,
+                                          'ephemeral_gb': 0, 'vcpus': 1})
+        timeutils.advance_time_seconds(301)
+        self.host_manager.get_all_host_states(context)
+
+        self.assertEqual(free_ram_mb, host_state.free_ram_mb)
+
+    def test_update_service_capabilities_updates_cached_host_state(self):
+        context = 'fake_context'
+
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        db.compute_node_get_all(context).AndReturn(fakes.COMPUTE_NODES)
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(context)
+        self.host_manager.update_service_capabilities('compute', 'host1',
+                dict(hypervisor_hostname='node1', free_memory=1234))
+
+        host_state = self.host_manager.host_state_map[('host1', 'node1')]
+        self.assertEqual(host_state.capabilities['free_memory'], 1234)
+        self.assertEqual(host_state.service['host'], 'host1')
+
 
 class HostStateTestCase(test.TestCase):
     """Test case for HostState class."""
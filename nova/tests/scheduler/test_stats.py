@@ -0,0 +1,129 @@
+# Copyright 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the scheduler filter and weigher statistics.
+"""
+
+import mox
+
+from nova import context
+from nova.openstack.common.notifier import api as notifier_api
+from nova.openstack.common.notifier import test_notifier
+from nova.scheduler import filters
+from nova.scheduler import stats
+from nova.scheduler import weights
+from nova.scheduler.weights import ram
+from nova import test
+from nova.tests.scheduler import fakes
+
+
+class EvenRamFilter(filters.BaseHostFilter):
+    def host_passes(self, host_state, filter_properties):
+        return host_state.free_ram_mb % 1024 == 0
+
+
+class NoHostFilter(filters.BaseHostFilter):
+    def host_passes(self, host_state, filter_properties):
+        return False
+
+
+class SchedulerStatsTestCase(test.TestCase):
+    def setUp(self):
+        super(SchedulerStatsTestCase, self).setUp()
+        notifier_api._reset_drivers()
+        self.addCleanup(notifier_api._reset_drivers)
+        self.flags(scheduler_instrumentation=True,
+                   notification_driver=[test_notifier.__name__])
+        test_notifier.NOTIFICATIONS = []
+        self.context = context.get_admin_context()
+        self.hosts = [fakes.FakeHostState('host%d' % i, 'node',
+                                          {'free_ram_mb': 512 * i})
+                      for i in xrange(1, 5)]
+        self.aggregated = stats.get_aggregated_stats()
+        self.aggregated.reset()
+
+    def test_disabled(self):
+        self.flags(scheduler_instrumentation=False)
+        self.assertEqual(None, stats.start_request())
+        self.assertEqual(None, stats.current_request())
+        result = filters.HostFilterHandler().get_filtered_objects(
+                [EvenRamFilter], iter(self.hosts), {})
+        self.assertEqual([self.hosts[1], self.hosts[3]], result)
+        stats.end_request(self.context, None, {})
+        self.assertEqual(0, self.aggregated.requests)
+        self.assertEqual([], test_notifier.NOTIFICATIONS)
+
+    def test_filters_and_weighers(self):
+        request_stats = stats.start_request()
+        self.assertEqual(request_stats, stats.current_request())
+
+        hosts = filters.HostFilterHandler().get_filtered_objects(
+                [EvenRamFilter, NoHostFilter], iter(self.hosts), {})
+        self.assertEqual([], hosts)
+        weighed_hosts = weights.HostWeightHandler().get_weighed_objects(
+                [ram.RAMWeigher], self.hosts, {})
+        self.assertEqual(4, len(weighed_hosts))
+
+        self.assertEqual(['EvenRamFilter', 'NoHostFilter'],
+                         [f['name'] for f in request_stats.filters])
+        self.assertEqual([4, 2], [f['hosts_in']
+                                  for f in request_stats.filters])
+        self.assertEqual([2, 0], [f['hosts_out']
+                                  for f in request_stats.filters])
+        self.assertEqual(['RAMWeigher'],
+                         [w['name'] for w in request_stats.weighers])
+        self.assertEqual(4, request_stats.weighers[0]['hosts'])
+
+        stats.end_request(self.context, request_stats,
+                          {'instance_uuids': ['fake-uuid']})
+        self.assertEqual(None, stats.current_request())
+
+        self.assertEqual(1, len(test_notifier.NOTIFICATIONS))
+        notification = test_notifier.NOTIFICATIONS[0]
+        self.assertEqual('scheduler.instrumentation',
+                         notification['event_type'])
+        self.assertEqual(['fake-uuid'],
+                         notification['payload']['instance_uuids'])
+        self.assertEqual(request_stats.filters,
+                         notification['payload']['filters'])
+
+        self.assertEqual(1, self.aggregated.requests)
+        totals = self.aggregated.filters['NoHostFilter']
+        self.assertEqual(1, totals['calls'])
+        self.assertEqual(2, totals['hosts_in'])
+        self.assertEqual(1, totals['removed_all'])
+        self.assertEqual(0, self.aggregated.filters['EvenRamFilter']
+                         ['removed_all'])
+        self.assertEqual(4, self.aggregated.weighers['RAMWeigher']['hosts'])
+
+    def test_log_aggregated_stats(self):
+        request_stats = stats.RequestStats()
+        request_stats.add_filter('EvenRamFilter', 0.5, 4, 2)
+        request_stats.add_weigher('RAMWeigher', 0.25, 2)
+        self.aggregated.add_request(request_stats)
+        self.aggregated.add_request(request_stats)
+        self.assertEqual(1.0, self.aggregated.filters['EvenRamFilter']
+                         ['seconds'])
+
+        self.mox.StubOutWithMock(stats.LOG, 'info')
+        for i in xrange(3):
+            stats.LOG.info(*[mox.IgnoreArg()] * 2)
+        self.mox.ReplayAll()
+
+        stats.log_aggregated_stats()
+        self.assertEqual(0, self.aggregated.requests)
+        self.assertEqual({}, self.aggregated.filters)
+        # Nothing is logged without new requests.
+        stats.log_aggregated_stats()
@@ -18,9 +18,11 @@ Tests For Scheduler weights.
 
 from nova import context
 from nova.scheduler import weights
+from nova.scheduler.weights import ram
 from nova import test
 from nova.tests import matchers
 from nova.tests.scheduler import fakes
+from nova import weights as nova_weights
 
 
 class TestWeighedHost(test.TestCase):
@@ -115,3 +117,92 @@ class RamWeigherTestCase(test.TestCase):
         weighed_host = self._get_weighed_host(hostinfo_list)
         self.assertEqual(weighed_host.weight, 8192 * 2)
         self.assertEqual(weighed_host.obj.host, 'host4')
+
+
+class FakeWeigher(weights.BaseHostWeigher):
+    def _weigh_object(self, host_state, weight_properties):
+        return host_state.num_io_ops
+
+
+class FakeColumnWeigher(FakeWeigher):
+    def _weight_multiplier(self):
+        return -2.0
+
+    def _weigh_column(self, host_states, weight_properties):
+        return [host_state.num_io_ops for host_state in host_states]
+
+
+class HalfRAMWeigher(ram.RAMWeigher):
+    def _weigh_object(self, host_state, weight_properties):
+        return host_state.free_ram_mb / 2
+
+
+class HostWeightHandlerTestCase(test.TestCase):
+    def setUp(self):
+        super(HostWeightHandlerTestCase, self).setUp()
+        self.weight_handler = weights.HostWeightHandler()
+        self.hosts = [fakes.FakeHostState('host%s' % i, 'node%s' % i,
+                                          {'free_ram_mb': ram,
+                                           'num_io_ops': io_ops})
+                      for i, (ram, io_ops) in enumerate([(512, 1),
+                                                         (1024, 200),
+                                                         (1024, 3),
+                                                         (8, 0),
+                                                         (1024, 3)])]
+
+    def _get_weighed_hosts(self, weigher_classes, limit=None):
+        weighed_hosts = self.weight_handler.get_weighed_objects(
+                weigher_classes, self.hosts, {}, limit=limit)
+        return [(w.obj.host, w.weight) for w in weighed_hosts]
+
+    def test_column_weighing_matches_object_weighing(self):
+        expected = self._get_weighed_hosts([FakeWeigher])
+        self.assertEqual(expected[0], ('host1', 200))
+
+        class FakeColumnOnlyWeigher(FakeWeigher):
+            _weigh_column = FakeColumnWeigher._weigh_column.im_func
+
+        self.assertEqual(expected,
+                         self._get_weighed_hosts([FakeColumnOnlyWeigher]))
+
+    def test_object_weighing_with_other_weighers(self):
+        # The columns are not weighed when a weigher can't weigh them.
+        def fake_weigh_column(*args):
+            self.fail('_weigh_column() called')
+
+        self.stubs.Set(FakeColumnWeigher, '_weigh_column', fake_weigh_column)
+        weighed_hosts = self._get_weighed_hosts([FakeColumnWeigher,
+                                                 FakeWeigher])
+        self.assertEqual(('host3', 0), weighed_hosts[0])
+        self.assertEqual(('host1', -200), weighed_hosts[-1])
+
+    def test_object_weighing_overridden_in_subclass(self):
+        weighed_hosts = self._get_weighed_hosts([HalfRAMWeigher])
+        self.assertEqual([512, 512, 512, 256, 4],
+                         [weight for host, weight in weighed_hosts])
+
+    def test_column_weighing_multiple_weighers(self):
+        classes = self.weight_handler.get_matching_classes(
+                ['nova.scheduler.weights.ram.RAMWeigher'])
+        classes.append(FakeColumnWeigher)
+        # Equal weights keep their original order.
+        expected = [('host2', 1018.0), ('host4', 1018.0), ('host1', 624.0),
+                    ('host0', 510.0), ('host3', 8.0)]
+        self.assertEqual(expected, self._get_weighed_hosts(classes))
+        self.assertEqual(expected[:2],
+                         self._get_weighed_hosts(classes, limit=2))
+
+    def test_column_weighing_without_numpy(self):
+        classes = self.weight_handler.get_matching_classes(
+                ['nova.scheduler.weights.ram.RAMWeigher'])
+        classes.append(FakeColumnWeigher)
+        expected = self._get_weighed_hosts(classes)
+        self.stubs.Set(nova_weights, 'numpy', None)
+        self.assertEqual(expected, self._get_weighed_hosts(classes))
+        self.assertEqual(expected[:3],
+                         self._get_weighed_hosts(classes, limit=3))
+
+    def test_object_weighing_with_limit(self):
+        weighed_hosts = self._get_weighed_hosts([FakeWeigher], limit=3)
+        self.assertEqual([('host1', 200), ('host2', 3), ('host4', 3)],
+                         weighed_hosts)
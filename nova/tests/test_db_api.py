@@ -30,6 +30,8 @@ from sqlalchemy.sql.expression import select
 
 from nova import context
 from nova import db
+from nova.db.sqlalchemy import api as sqlalchemy_api
+from nova.db.sqlalchemy import models
 from nova import exception
 from nova.openstack.common.db.sqlalchemy import session as db_session
 from nova.openstack.common import timeutils
@@ -138,6 +140,34 @@ class DbApiTestCase(DbTestCase):
                                                 {'display_name': u'test'})
         self.assertEqual(1, len(result))
 
+    def test_instance_get_all_by_filters_columns(self):
+        inst = self.create_instances_with_args(display_name='test1',
+                                               metadata={'foo': 'bar'})
+        self.create_instances_with_args(display_name='diff')
+        result = db.instance_get_all_by_filters(self.context,
+                {'display_name': 'test', 'metadata': {'foo': 'bar'},
+                 'deleted': False, 'project_id': inst['project_id']},
+                columns=['uuid', 'display_name'])
+        self.assertEqual([{'uuid': inst['uuid'], 'display_name': 'test1'}],
+                         result)
+
+    def test_instance_get_all_by_filters_unknown_column(self):
+        self.assertRaises(exception.InvalidInput,
+                          db.instance_get_all_by_filters, self.context, {},
+                          columns=['uuid', 'foo'])
+
+    def test_instance_get_all_by_filters_expected_attrs(self):
+        self.create_instances_with_args(metadata={'foo': 'bar'})
+        result = db.instance_get_all_by_filters(self.context, {},
+                                                expected_attrs=['metadata'])
+        self.assertEqual(1, len(result))
+        self.assertIn('metadata', result[0].__dict__)
+        self.assertNotIn('system_metadata', result[0].__dict__)
+        self.assertNotIn('info_cache', result[0].__dict__)
+        self.assertRaises(exception.InvalidInput,
+                          db.instance_get_all_by_filters, self.context, {},
+                          expected_attrs=['foo'])
+
     def test_instance_get_all_by_filters_deleted(self):
         inst1 = self.create_instances_with_args()
         inst2 = self.create_instances_with_args(reservation_id='b')
@@ -1066,6 +1096,30 @@ class DbApiTestCase(DbTestCase):
         _compare(bw_usages[2], expected_bw_usages[2])
         timeutils.clear_time_override()
 
+    def test_bw_usage_update_bulk(self):
+        ctxt = context.get_admin_context()
+        now = timeutils.utcnow()
+        start_period = now - datetime.timedelta(seconds=10)
+        db.bw_usage_update(ctxt, 'fake_uuid1', 'fake_mac1', start_period,
+                           100, 200, 12345, 67890)
+
+        usages = [{'uuid': 'fake_uuid1', 'mac': 'fake_mac1',
+                   'bw_in': 150, 'bw_out': 250,
+                   'last_ctr_in': 12395, 'last_ctr_out': 67940},
+                  {'uuid': 'fake_uuid2', 'mac': 'fake_mac2',
+                   'bw_in': 0, 'bw_out': 0,
+                   'last_ctr_in': 42, 'last_ctr_out': 43}]
+        db.bw_usage_update_bulk(ctxt, start_period, usages,
+                                last_refreshed=now)
+
+        bw_usages = db.bw_usage_get_by_uuids(ctxt,
+                ['fake_uuid1', 'fake_uuid2'], start_period)
+        self.assertEqual(2, len(bw_usages))
+        for bw_usage, expected in zip(bw_usages, usages):
+            for key, value in expected.items():
+                self.assertEqual(value, bw_usage[key])
+            self.assertEqual(now, bw_usage['last_refreshed'])
+
 
 def _get_fake_aggr_values():
     return {'name': 'fake_aggregate'}
@@ -1269,6 +1323,21 @@ class AggregateDBApiTestCase(test.TestCase):
                                                key='good')
         self.assertFalse('good' in r2)
 
+    def test_aggregate_metadata_get_all_by_host(self):
+        ctxt = context.get_admin_context()
+        values = {'name': 'fake_aggregate2'}
+        values2 = {'name': 'fake_aggregate3'}
+        a1 = _create_aggregate_with_hosts(context=ctxt)
+        a2 = _create_aggregate_with_hosts(context=ctxt, values=values,
+                metadata={'fake_key1': 'other_value'})
+        a3 = _create_aggregate_with_hosts(context=ctxt, values=values2,
+                hosts=['bar.openstack.org'], metadata={'badkey': 'bad'})
+        r1 = db.aggregate_metadata_get_all_by_host(ctxt)
+        self.assertEqual(r1['foo.openstack.org']['fake_key1'],
+                         set(['fake_value1', 'other_value']))
+        self.assertFalse('badkey' in r1['foo.openstack.org'])
+        self.assertEqual(r1['bar.openstack.org'], {'badkey': set(['bad'])})
+
     def test_aggregate_host_get_by_metadata_key(self):
         ctxt = context.get_admin_context()
         values = {'name': 'fake_aggregate2'}
@@ -1537,6 +1606,36 @@ class CapacityTestCase(test.TestCase):
         self.assertEqual(2, int(stats['num_proj_12345']))
         self.assertEqual(3, int(stats['num_vm_building']))
 
+    def test_compute_node_get_all_changed_since(self):
+        item = self._create_helper('host1')
+        later = timeutils.utcnow() + datetime.timedelta(minutes=1)
+        nodes = db.compute_node_get_all_changed_since(self.ctxt, later)
+        self.assertEqual(0, len(nodes))
+
+        db.compute_node_update(self.ctxt, item['id'], {'vcpus': 4,
+                                                       'updated_at': later})
+        nodes = db.compute_node_get_all_changed_since(self.ctxt, later)
+        self.assertEqual(1, len(nodes))
+        self.assertEqual(4, nodes[0]['vcpus'])
+        self.assertEqual('host1', nodes[0]['service']['host'])
+
+    def test_compute_node_get_all_changed_since_ignores_services(self):
+        item = self._create_helper('host1')
+        later = timeutils.utcnow() + datetime.timedelta(minutes=1)
+        db.service_update(self.ctxt, item['service_id'],
+                          {'updated_at': later})
+        nodes = db.compute_node_get_all_changed_since(self.ctxt, later)
+        self.assertEqual(0, len(nodes))
+
+    def test_compute_node_get_all_changed_since_deleted(self):
+        item = self._create_helper('host1')
+        earlier = timeutils.utcnow() - datetime.timedelta(minutes=1)
+        db.compute_node_delete(self.ctxt, item['id'])
+        nodes = db.compute_node_get_all_changed_since(self.ctxt, earlier)
+        self.assertEqual(1, len(nodes))
+        self.assertTrue(nodes[0]['deleted'])
+        self.assertEqual(None, nodes[0]['service'])
+
     def test_compute_node_update(self):
         item = self._create_helper('host1')
 
@@ -1564,6 +1663,61 @@ class CapacityTestCase(test.TestCase):
                 item['id'], {})
         self.assertNotEqual(item['updated_at'], item_updated['updated_at'])
 
+    def test_compute_node_update_increments_generation(self):
+        item = self._create_helper('host1')
+        self.assertEqual(0, item['generation'])
+        item = db.compute_node_update(self.ctxt, item['id'], {})
+        self.assertEqual(1, item['generation'])
+
+    def test_compute_node_update_after_concurrent_claim(self):
+        item = self._create_helper('host1')
+        orig_compute_node_get = sqlalchemy_api._compute_node_get
+
+        def compute_node_get_then_claim(context, compute_id, session=None):
+            compute_ref = orig_compute_node_get(context, compute_id,
+                                                session=session)
+            # A claim committed after the row was read
+            session.query(models.ComputeNode).filter_by(id=compute_id).\
+                    update({'generation': 5}, synchronize_session=False)
+            return compute_ref
+
+        self.stubs.Set(sqlalchemy_api, '_compute_node_get',
+                       compute_node_get_then_claim)
+        item = db.compute_node_update(self.ctxt, item['id'], {})
+        self.assertEqual(6, item['generation'])
+
+    def test_compute_node_claim(self):
+        item = self._create_helper('host1')
+        generation = db.compute_node_claim(self.ctxt, item['id'], 0,
+                                           512, 10, 1)
+        self.assertEqual(1, generation)
+        item = db.compute_node_get(self.ctxt, item['id'])
+        self.assertEqual(1, item['generation'])
+        self.assertEqual(512, item['free_ram_mb'])
+        self.assertEqual(512, item['memory_mb_used'])
+        self.assertEqual(2038, item['free_disk_gb'])
+        self.assertEqual(10, item['local_gb_used'])
+        self.assertEqual(1, item['vcpus_used'])
+
+    def test_compute_node_claim_conflict(self):
+        item = self._create_helper('host1')
+        db.compute_node_update(self.ctxt, item['id'], {'vcpus_used': 1})
+        self.assertRaises(exception.ComputeNodeGenerationConflict,
+                          db.compute_node_claim, self.ctxt, item['id'], 0,
+                          512, 10, 1)
+        item = db.compute_node_get(self.ctxt, item['id'])
+        self.assertEqual(1024, item['free_ram_mb'])
+        self.assertEqual(1, item['vcpus_used'])
+
+    def test_compute_node_update_removes_none_stats(self):
+        item = self._create_helper('host1')
+        values = {'stats': dict(num_instances=3, num_proj_12345=None)}
+        db.compute_node_update(self.ctxt, item['id'], values)
+        item = db.compute_node_get_all(self.ctxt)[0]
+        stats = self._stats_as_dict(item['stats'])
+        self.assertEqual(dict(num_instances='3', num_proj_23456='2',
+                              num_vm_building='3'), stats)
+
     def test_compute_node_stat_prune(self):
         item = self._create_helper('host1')
         for stat in item['stats']:
@@ -2028,6 +2182,39 @@ class VolumeUsageDBApiTestCase(test.TestCase):
             self.assertEqual(vol_usages[0][key], value)
         timeutils.clear_time_override()
 
+    def test_vol_usage_update_bulk(self):
+        ctxt = context.get_admin_context()
+        now = timeutils.utcnow()
+        start_time = now - datetime.timedelta(seconds=10)
+        db.vol_usage_update(ctxt, 1, rd_req=100, rd_bytes=200,
+                            wr_req=300, wr_bytes=400,
+                            instance_id='fake-uuid1', update_totals=True)
+
+        usages = [{'volume_id': '1', 'instance_uuid': 'fake-uuid1',
+                   'rd_req': 10, 'rd_bytes': 20,
+                   'wr_req': 30, 'wr_bytes': 40},
+                  {'volume_id': '2', 'instance_uuid': 'fake-uuid2',
+                   'rd_req': 50, 'rd_bytes': 60,
+                   'wr_req': 70, 'wr_bytes': 80}]
+        db.vol_usage_update_bulk(ctxt, usages, last_refreshed=now)
+
+        vol_usages = db.vol_get_usage_by_time(ctxt, start_time)
+        vol_usages = dict((vol_usage['volume_id'], vol_usage)
+                          for vol_usage in vol_usages)
+        self.assertEqual(2, len(vol_usages))
+        for usage in usages:
+            vol_usage = vol_usages[usage['volume_id']]
+            self.assertEqual(usage['instance_uuid'], vol_usage['instance_id'])
+            self.assertEqual(usage['rd_req'], vol_usage['curr_reads'])
+            self.assertEqual(usage['rd_bytes'], vol_usage['curr_read_bytes'])
+            self.assertEqual(usage['wr_req'], vol_usage['curr_writes'])
+            self.assertEqual(usage['wr_bytes'],
+                             vol_usage['curr_write_bytes'])
+            self.assertEqual(now, vol_usage['curr_last_refreshed'])
+        # The totals are left alone.
+        self.assertEqual(100, vol_usages['1']['tot_reads'])
+        self.assertEqual(0, vol_usages['2']['tot_reads'])
+
 
 class TaskLogTestCase(test.TestCase):
 
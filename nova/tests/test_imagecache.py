@@ -32,6 +32,7 @@ from nova.openstack.common import importutils
 from nova.openstack.common import log as logging
 from nova import test
 from nova import utils
+from nova.virt import image_peers
 from nova.virt.libvirt import imagecache
 from nova.virt.libvirt import utils as virtutils
 
@@ -510,6 +511,67 @@ class ImageCacheManagerTestCase(test.TestCase):
             # side effect of creating the checksum
             self.assertTrue(os.path.exists(info_fname))
 
+    def test_verify_checksum_unchanged_file_not_read(self):
+        self.flags(checksum_base_images=True)
+
+        with utils.tempdir() as tmpdir:
+            self.flags(instances_path=tmpdir)
+            self.flags(image_info_filename_pattern=('$instances_path/'
+                                                    '%(image)s.info'))
+            fname, info_fname, testdata = self._make_checksum(tmpdir)
+            imagecache.write_stored_checksum(fname)
+
+            image_cache_manager = imagecache.ImageCacheManager()
+            self.stubs.Set(image_cache_manager, '_hash_base_file', None)
+            self.assertTrue(image_cache_manager._verify_checksum('aaa', fname))
+
+    def test_verify_checksum_changed_file(self):
+        self.flags(checksum_base_images=True)
+
+        with utils.tempdir() as tmpdir:
+            self.flags(instances_path=tmpdir)
+            self.flags(image_info_filename_pattern=('$instances_path/'
+                                                    '%(image)s.info'))
+            fname, info_fname, testdata = self._make_checksum(tmpdir)
+            imagecache.write_stored_checksum(fname)
+            with open(fname, 'a') as f:
+                f.write('banana')
+
+            image_cache_manager = imagecache.ImageCacheManager()
+            self.assertFalse(image_cache_manager._verify_checksum('aaa',
+                                                                  fname))
+
+    def test_verify_checksum_resumed(self):
+        self.flags(checksum_base_images=True, checksum_max_mb_per_pass=1,
+                   checksum_max_read_rate=4)
+        sleeps = []
+        self.stubs.Set(time, 'sleep', sleeps.append)
+
+        with utils.tempdir() as tmpdir:
+            self.flags(instances_path=tmpdir)
+            self.flags(image_info_filename_pattern=('$instances_path/'
+                                                    '%(image)s.info'))
+            fname = os.path.join(tmpdir, 'aaa')
+            testdata = 'a' * (2 * 1024 * 1024 + 1)
+            with open(fname, 'w') as f:
+                f.write(testdata)
+            with open(imagecache.get_info_filename(fname), 'w') as f:
+                f.write('{"sha1": "%s", "sha1-timestamp": 1}' %
+                        hashlib.sha1(testdata).hexdigest())
+
+            image_cache_manager = imagecache.ImageCacheManager()
+            self.assertEqual(None,
+                             image_cache_manager._verify_checksum('a', fname))
+            self.assertEqual(None,
+                             image_cache_manager._verify_checksum('a', fname))
+            self.assertTrue(image_cache_manager._verify_checksum('a', fname))
+            self.assertEqual({}, image_cache_manager._checksum_progress)
+            # Reading 1MB at 4MB/s sleeps on each of the first two passes.
+            self.assertTrue(len(sleeps) >= 2)
+            self.assertEqual(imagecache._stat_key(fname),
+                             imagecache.read_stored_info(fname,
+                                                         field='sha1-stat'))
+
     @contextlib.contextmanager
     def _make_base_file(self, checksum=True):
         """Make a base file for testing."""
@@ -573,6 +635,19 @@ class ImageCacheManagerTestCase(test.TestCase):
             self.assertFalse(os.path.exists(fname))
             self.assertFalse(os.path.exists(info_fname))
 
+    def test_remove_base_file_downloaded_original(self):
+        with self._make_base_file() as fname:
+            original = image_peers.original_path(fname)
+            with open(original, 'w') as f:
+                f.write('qcow2 data')
+
+            os.utime(fname, (-1, time.time() - 3601))
+            image_cache_manager = imagecache.ImageCacheManager()
+            image_cache_manager._remove_base_file(fname)
+
+            self.assertFalse(os.path.exists(fname))
+            self.assertFalse(os.path.exists(original))
+
     def test_remove_base_file_dne(self):
         # This test is solely to execute the "does not exist" code path. We
         # don't expect the method being tested to do anything in this case.
@@ -636,6 +711,37 @@ class ImageCacheManagerTestCase(test.TestCase):
             self.assertEquals(image_cache_manager.removable_base_files, [])
             self.assertEquals(image_cache_manager.corrupt_base_files, [])
 
+    def test_handle_base_image_used_checksum_resumed(self):
+        self.flags(checksum_base_images=True, checksum_max_mb_per_pass=1,
+                   checksum_max_read_rate=0)
+        self.stubs.Set(virtutils, 'chown', lambda x, y: None)
+
+        with utils.tempdir() as tmpdir:
+            self.flags(instances_path=tmpdir)
+            self.flags(image_info_filename_pattern=('$instances_path/'
+                                                    '%(image)s.info'))
+            fname = os.path.join(tmpdir, 'aaa')
+            testdata = 'a' * (2 * 1024 * 1024 + 1)
+            with open(fname, 'w') as f:
+                f.write(testdata)
+            os.utime(fname, (-1, time.time() - 3601))
+            with open(imagecache.get_info_filename(fname), 'w') as f:
+                f.write('{"sha1": "%s", "sha1-timestamp": 1}' %
+                        hashlib.sha1(testdata).hexdigest())
+
+            # The file is touched on each pass because it is in use, the
+            # hashing still resumes where the previous pass stopped.
+            image_cache_manager = imagecache.ImageCacheManager()
+            image_cache_manager.used_images = {'123': (1, 0, ['banana-42'])}
+            for i in xrange(3):
+                image_cache_manager._handle_base_image('123', fname)
+
+            self.assertEqual({}, image_cache_manager._checksum_progress)
+            self.assertEqual([], image_cache_manager.corrupt_base_files)
+            self.assertEqual(imagecache._stat_key(fname),
+                             imagecache.read_stored_info(fname,
+                                                         field='sha1-stat'))
+
     def test_handle_base_image_used_remotely(self):
         self.stubs.Set(virtutils, 'chown', lambda x, y: None)
         img = '123'
@@ -755,6 +861,8 @@ class ImageCacheManagerTestCase(test.TestCase):
                     return True
                 if path == fq_path(p) + '.info':
                     return False
+                if path == fq_path(p) + '.orig':
+                    return False
 
             if path in ['/instance_path/_base/%s_sm' % i for i in [hashed_1,
                                                                    hashed_21,
@@ -1079,6 +1079,80 @@ class LibvirtConnTestCase(test.TestCase):
         # None should be listed, since we fake deleted the last one
         self.assertEquals(len(instances), 0)
 
+    def _fake_power_state_domains(self):
+        class FakeDomain(object):
+            def __init__(self, id, uuid, state):
+                self._id = id
+                self._uuid = uuid
+                self._state = state
+
+            def ID(self):
+                return self._id
+
+            def UUIDString(self):
+                return self._uuid
+
+            def name(self):
+                return 'instance-%s' % self._uuid
+
+            def info(self):
+                return [self._state, 2048, 2048, 2, 0]
+
+        running = libvirt_driver.VIR_DOMAIN_RUNNING
+        return {0: FakeDomain(0, 'host-uuid', running),
+                1: FakeDomain(1, 'uuid1', running),
+                'defined': FakeDomain(-1, 'uuid2',
+                                      libvirt_driver.VIR_DOMAIN_SHUTOFF)}
+
+    def test_list_instance_power_states(self):
+        domains = self._fake_power_state_domains()
+
+        class FakeConn(object):
+            def numOfDomains(self):
+                return 2
+
+            def listDomainsID(self):
+                return [0, 1]
+
+            def lookupByID(self, id):
+                return domains[id]
+
+            def listDefinedDomains(self):
+                return ['defined']
+
+            def lookupByName(self, name):
+                return domains[name]
+
+        self.stubs.Set(libvirt_driver.LibvirtDriver, '_conn', FakeConn())
+        conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        self.assertEqual({'uuid1': power_state.RUNNING,
+                          'uuid2': power_state.SHUTDOWN},
+                         conn.list_instance_power_states())
+        self.assertEqual({'name': 'instance-uuid1',
+                          'id': 1,
+                          'state': power_state.RUNNING,
+                          'max_mem': 2048,
+                          'mem': 2048,
+                          'num_cpu': 2,
+                          'cpu_time': 0},
+                         conn.list_instance_info()['uuid1'])
+        self.assertEqual(2, conn.get_vcpu_used())
+
+    def test_list_instance_power_states_all_domains(self):
+        domains = self._fake_power_state_domains()
+
+        class FakeConn(object):
+            def listAllDomains(self, flags):
+                return domains.values()
+
+        libvirt.VIR_CONNECT_LIST_DOMAINS_ACTIVE = 1
+        self.addCleanup(delattr, libvirt, 'VIR_CONNECT_LIST_DOMAINS_ACTIVE')
+        self.stubs.Set(libvirt_driver.LibvirtDriver, '_conn', FakeConn())
+        conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        self.assertEqual({'uuid1': power_state.RUNNING,
+                          'uuid2': power_state.SHUTDOWN},
+                         conn.list_instance_power_states())
+
     def test_get_all_block_devices(self):
         xml = [
             # NOTE(vish): id 0 is skipped
@@ -3569,30 +3643,17 @@ class LibvirtConnTestCase(test.TestCase):
                   }
         self.assertEqual(actual, expect)
 
-    def test_failing_vcpu_count(self):
-        """Domain can fail to return the vcpu description in case it's
-        just starting up or shutting down. Make sure None is handled
-        gracefully.
-        """
-
-        class DiagFakeDomain(object):
-            def __init__(self, vcpus):
-                self._vcpus = vcpus
-
-            def vcpus(self):
-                if self._vcpus is None:
-                    return None
-                else:
-                    return ([1] * self._vcpus, [True] * self._vcpus)
-
+    def test_vcpu_used(self):
+        # Only the vcpus of the active domains are used.
         driver = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
-        conn = driver._conn
-        self.mox.StubOutWithMock(driver, 'list_instance_ids')
-        conn.lookupByID = self.mox.CreateMockAnything()
-
-        driver.list_instance_ids().AndReturn([1, 2])
-        conn.lookupByID(1).AndReturn(DiagFakeDomain(None))
-        conn.lookupByID(2).AndReturn(DiagFakeDomain(5))
+        self.mox.StubOutWithMock(driver, 'list_instance_info')
+        driver.list_instance_info().AndReturn({
+                'uuid1': {'id': 1, 'state': power_state.RUNNING,
+                          'num_cpu': 2},
+                'uuid2': {'id': 2, 'state': power_state.CRASHED,
+                          'num_cpu': 3},
+                'uuid3': {'id': -1, 'state': power_state.SHUTDOWN,
+                          'num_cpu': 4}})
 
         self.mox.ReplayAll()
 
@@ -1106,6 +1106,33 @@ class TestNovaMigrations(BaseMigrationTestCase, CommonTestsMixIn):
                 self.assertEqual(result['value'], original['value'])
                 self.assertEqual(result['created_at'], None)
 
+    def _pre_upgrade_172(self, engine):
+        compute_nodes = get_table(engine, 'compute_nodes')
+        data = [{'vcpus': 1, 'memory_mb': 512, 'local_gb': 10,
+                 'vcpus_used': 0, 'memory_mb_used': 0, 'local_gb_used': 0,
+                 'hypervisor_type': 'fake', 'hypervisor_version': 1,
+                 'hypervisor_hostname': 'm172-node', 'cpu_info': '',
+                 'service_id': 0, 'deleted': 0}]
+        engine.execute(compute_nodes.insert(), data)
+        return data
+
+    def _check_172(self, engine, data):
+        for table_name in ('compute_nodes', 'shadow_compute_nodes'):
+            table = get_table(engine, table_name)
+            self.assertIn('generation', table.c)
+        compute_nodes = get_table(engine, 'compute_nodes')
+        nodes = compute_nodes.select(
+                compute_nodes.c.hypervisor_hostname == 'm172-node').\
+                execute().fetchall()
+        self.assertTrue(nodes)
+        for node in nodes:
+            self.assertEqual(0, node['generation'])
+
+    def _post_downgrade_172(self, engine):
+        for table_name in ('compute_nodes', 'shadow_compute_nodes'):
+            table = get_table(engine, table_name)
+            self.assertNotIn('generation', table.c)
+
 
 class TestBaremetalMigrations(BaseMigrationTestCase, CommonTestsMixIn):
     """Test sqlalchemy-migrate migrations."""
@@ -17,6 +17,8 @@
 
 import time
 
+import eventlet
+import mox
 from testtools import matchers
 
 from nova import manager
@@ -122,3 +124,136 @@ class Manager(test.TestCase):
 
         m = Manager()
         self.assertEqual([], m._periodic_tasks)
+
+    def test_periodic_tasks_jitter(self):
+        self.flags(periodic_task_jitter=0.5)
+        self.stubs.Set(manager.random, 'uniform', lambda a, b: b)
+
+        class Manager(manager.Manager):
+            @manager.periodic_task(spacing=10)
+            def bar(self):
+                return 'bar'
+
+        m = Manager()
+        idle = m.periodic_tasks(None)
+        self.assertThat(idle, matchers.GreaterThan(14.7))
+        self.assertThat(idle, matchers.LessThan(15.1))
+
+    def test_periodic_tasks_stats(self):
+        class Manager(manager.Manager):
+            @manager.periodic_task
+            def bar(self, context):
+                return 'bar'
+
+            @manager.periodic_task
+            def foo(self, context):
+                raise test.TestingException()
+
+        m = Manager()
+        m.periodic_tasks(None)
+        m.periodic_tasks(None)
+        stats = m.get_periodic_task_stats()
+        self.assertEqual(2, stats['bar']['runs'])
+        self.assertEqual(0, stats['bar']['failures'])
+        self.assertEqual(2, stats['foo']['runs'])
+        self.assertEqual(2, stats['foo']['failures'])
+
+    def test_periodic_tasks_overrun(self):
+        self.flags(periodic_task_deadline=1)
+        now = [100.0]
+        self.stubs.Set(manager.time, 'time', lambda: now[0])
+
+        class Manager(manager.Manager):
+            @manager.periodic_task
+            def bar(self, context):
+                now[0] += 2.5
+
+        m = Manager()
+        self.mox.StubOutWithMock(manager.LOG, 'warn')
+        manager.LOG.warn(mox.IgnoreArg(), mox.IgnoreArg())
+        self.mox.ReplayAll()
+
+        m.periodic_tasks(None)
+        stats = m.get_periodic_task_stats()['bar']
+        self.assertEqual(1, stats['overruns'])
+        self.assertEqual(2.5, stats['last_duration'])
+
+    def test_periodic_tasks_overrun_while_running(self):
+        self.flags(periodic_task_workers=2, periodic_task_deadline=1)
+        now = [100.0]
+        self.stubs.Set(manager.time, 'time', lambda: now[0])
+        finish = eventlet.event.Event()
+
+        class Manager(manager.Manager):
+            @manager.periodic_task
+            def hung(self, context):
+                finish.wait()
+
+        m = Manager()
+        m.periodic_tasks(None)
+        eventlet.sleep(0)
+        now[0] += 2.5
+
+        # The task is reported before it returns, and only once.
+        m.periodic_tasks(None)
+        self.assertEqual(1, m.get_periodic_task_stats()['hung']['overruns'])
+        m.periodic_tasks(None)
+        finish.send()
+        eventlet.sleep(0)
+        stats = m.get_periodic_task_stats()['hung']
+        self.assertEqual(1, stats['overruns'])
+        self.assertEqual(1, stats['runs'])
+
+    def test_periodic_tasks_stats_logged(self):
+        self.flags(periodic_task_stats_interval=10)
+        now = [100.0]
+        self.stubs.Set(manager.time, 'time', lambda: now[0])
+        logged = []
+
+        class Manager(manager.Manager):
+            @manager.periodic_task
+            def bar(self, context):
+                pass
+
+        m = Manager()
+        self.stubs.Set(manager.LOG, 'info',
+                       lambda msg, values: logged.append(values))
+        m.periodic_tasks(None)
+        self.assertEqual([], logged)
+        now[0] += 10
+        m.periodic_tasks(None)
+        self.assertEqual(1, len(logged))
+        self.assertEqual('Manager.bar', logged[0]['task'])
+        self.assertEqual(1, logged[0]['runs'])
+
+    def test_periodic_tasks_parallel(self):
+        self.flags(periodic_task_workers=2)
+        started = []
+        finish = eventlet.event.Event()
+
+        class Manager(manager.Manager):
+            @manager.periodic_task
+            def slow(self, context):
+                started.append('slow')
+                finish.wait()
+
+            @manager.periodic_task
+            def fast(self, context):
+                started.append('fast')
+
+        m = Manager()
+        m.periodic_tasks(None)
+        eventlet.sleep(0)
+        self.assertEqual(['slow', 'fast'], started)
+        self.assertEqual(['slow'], m._periodic_running.keys())
+
+        # The slow task is still running, it is skipped this time.
+        m.periodic_tasks(None)
+        eventlet.sleep(0)
+        self.assertEqual(['slow', 'fast', 'fast'], started)
+        self.assertEqual(1, m.get_periodic_task_stats()['slow']['skipped'])
+
+        finish.send()
+        eventlet.sleep(0)
+        self.assertEqual({}, m._periodic_running)
+        self.assertEqual(1, m.get_periodic_task_stats()['slow']['runs'])
@@ -387,6 +387,16 @@ class XenAPIVMTestCase(stubs.XenAPITestBase):
         self.assertEqual(len(uuids), len(instance_uuids))
         self.assertEqual(set(uuids), set(instance_uuids))
 
+    def test_list_instance_info(self):
+        instance = self._create_instance()
+        instances = self.conn.list_instance_info()
+        self.assertEqual([instance['uuid']], instances.keys())
+        info = instances[instance['uuid']]
+        self.assertEqual(power_state.RUNNING, info['state'])
+        self.assertEqual(instance['name'], info['name'])
+        self.assertEqual({instance['uuid']: power_state.RUNNING},
+                         self.conn.list_instance_power_states())
+
     def test_get_rrd_server(self):
         self.flags(xenapi_connection_url='myscheme://myaddress/')
         server_info = vm_utils._get_rrd_server()
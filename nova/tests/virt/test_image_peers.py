@@ -0,0 +1,165 @@
+#    Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+import os
+
+import fixtures
+
+from nova import context
+from nova.image import glance
+from nova import test
+from nova.virt import image_peers
+from nova.virt import images
+
+
+class FakeImageService(object):
+    def __init__(self, data):
+        self.data = data
+        self.downloads = 0
+
+    def show(self, context, image_id):
+        return {'id': image_id, 'size': len(self.data),
+                'checksum': hashlib.md5(self.data).hexdigest()}
+
+    def download(self, context, image_id, data):
+        self.downloads += 1
+        data.write(self.data)
+
+
+class ImagePeersTestCase(test.TestCase):
+    """Several fake compute hosts sharing a temporary directory."""
+
+    def setUp(self):
+        super(ImagePeersTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.tmpdir = self.useFixture(fixtures.TempDir()).path
+        self.flags(image_peers_registry_path=os.path.join(self.tmpdir,
+                                                          'registry'),
+                   image_peers_url_pattern='file://%(path)s')
+        self.data = 'image data' * 1024
+        self.checksum = hashlib.md5(self.data).hexdigest()
+        self.image_service = FakeImageService(self.data)
+        self.stubs.Set(glance, 'get_remote_image_service',
+                       lambda context, href: (self.image_service, href))
+
+    def _host_path(self, host, filename='image'):
+        base_dir = os.path.join(self.tmpdir, host)
+        if not os.path.exists(base_dir):
+            os.mkdir(base_dir)
+        return os.path.join(base_dir, filename)
+
+    def _serve(self, host, data=None):
+        self.flags(host=host)
+        path = self._host_path(host)
+        with open(path, 'w') as f:
+            f.write(data or self.data)
+        image_peers.advertise('fake-image', path, self.checksum)
+        return path
+
+    def _fetch(self, host):
+        self.flags(host=host)
+        path = self._host_path(host)
+        images.fetch(self.context, 'fake-image', path, None, None)
+        with open(path) as f:
+            return f.read()
+
+    def test_fetch_from_peer(self):
+        self._serve('host1')
+        self.assertEqual(self.data, self._fetch('host2'))
+        self.assertEqual(0, self.image_service.downloads)
+
+    def test_fetch_corrupt_peer_falls_back(self):
+        self._serve('host1', data='corrupt')
+        self.assertEqual(self.data, self._fetch('host2'))
+        self.assertEqual(1, self.image_service.downloads)
+
+    def test_fetch_unreachable_peer_falls_back(self):
+        os.unlink(self._serve('host1'))
+        self.assertEqual(self.data, self._fetch('host2'))
+        self.assertEqual(1, self.image_service.downloads)
+
+    def test_fetch_disabled(self):
+        self._serve('host1')
+        self.flags(image_peers_registry_path=None)
+        self.assertEqual(self.data, self._fetch('host2'))
+        self.assertEqual(1, self.image_service.downloads)
+
+    def test_disabled_without_url_pattern(self):
+        self.flags(image_peers_url_pattern=None)
+        self._serve('host1')
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir,
+                                                    'registry')))
+        self.assertEqual(self.data, self._fetch('host2'))
+        self.assertEqual(1, self.image_service.downloads)
+
+    def test_own_images_ignored(self):
+        self._serve('host1')
+        self.assertEqual([], image_peers.find_peers('fake-image',
+                                                    self.checksum))
+        self.flags(host='host2')
+        self.assertEqual(1, len(image_peers.find_peers('fake-image',
+                                                       self.checksum)))
+        self.assertEqual([], image_peers.find_peers('fake-image', 'other'))
+
+    def test_withdraw(self):
+        path = self._serve('host1')
+        image_peers.advertise('other-image', self._host_path('host1', 'x'),
+                              self.checksum)
+        image_peers.withdraw([path])
+        self.assertEqual({}, image_peers._read_registry('host1'))
+
+    def test_fetch_to_raw_advertises(self):
+        self.stubs.Set(images, 'qemu_img_info',
+                       lambda path: images.QemuImgInfo('file format: raw'))
+        self.flags(host='host1')
+        path = self._host_path('host1')
+        images.fetch_to_raw(self.context, 'fake-image', path, None, None)
+        self.assertEqual({'fake-image': {'path': path,
+                                         'url': 'file://%s' % path,
+                                         'checksum': self.checksum}},
+                         image_peers._read_registry('host1'))
+
+        self.assertEqual(self.data, self._fetch('host2'))
+        self.assertEqual(1, self.image_service.downloads)
+
+    def test_fetch_to_raw_converted_advertises_original(self):
+        def fake_qemu_img_info(path):
+            if path.endswith('.part'):
+                return images.QemuImgInfo('file format: qcow2')
+            return images.QemuImgInfo('file format: raw')
+
+        def fake_convert_image(source, dest, out_format):
+            with open(dest, 'w') as f:
+                f.write('converted')
+
+        self.stubs.Set(images, 'qemu_img_info', fake_qemu_img_info)
+        self.stubs.Set(images, 'convert_image', fake_convert_image)
+        self.flags(host='host1')
+        path = self._host_path('host1')
+        original = image_peers.original_path(path)
+        images.fetch_to_raw(self.context, 'fake-image', path, None, None)
+        with open(path) as f:
+            self.assertEqual('converted', f.read())
+        self.assertEqual({'fake-image': {'path': original,
+                                         'url': 'file://%s' % original,
+                                         'checksum': self.checksum}},
+                         image_peers._read_registry('host1'))
+
+        self.assertEqual(self.data, self._fetch('host2'))
+        self.assertEqual(1, self.image_service.downloads)
+
+        self.flags(host='host1')
+        image_peers.withdraw([path])
+        self.assertEqual({}, image_peers._read_registry('host1'))
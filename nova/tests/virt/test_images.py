@@ -12,8 +12,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
+import os
 
+from nova import context
+from nova import exception
+from nova.image import glance
 from nova import test
+from nova import utils
 from nova.virt import images
 
 
@@ -22,3 +28,99 @@ class QemuTestCase(test.TestCase):
         image_info = images.qemu_img_info("/path/that/does/not/exist")
         self.assertTrue(image_info)
         self.assertTrue(str(image_info))
+
+
+class QemuImgInfoCacheTestCase(test.TestCase):
+    OUTPUT = ("image: disk\n"
+              "file format: qcow2\n"
+              "virtual size: 20G (21474836480 bytes)\n"
+              "disk size: 3.1G\n")
+
+    def setUp(self):
+        super(QemuImgInfoCacheTestCase, self).setUp()
+        images.clear_qemu_img_info_cache()
+        self.addCleanup(images.clear_qemu_img_info_cache)
+        self.stat_keys = {'/disk1': (1, 100.0, 1024),
+                          '/disk2': (2, 100.0, 1024)}
+        self.stubs.Set(os.path, 'exists', lambda path: True)
+        self.stubs.Set(images, '_stat_key', self.stat_keys.get)
+        self.executed = []
+
+        def fake_execute(*cmd, **kwargs):
+            self.executed.append(cmd[-1])
+            return self.OUTPUT, ''
+
+        self.stubs.Set(utils, 'execute', fake_execute)
+
+    def test_unchanged_image_is_cached(self):
+        info = images.qemu_img_info('/disk1')
+        self.assertEqual(21474836480, info.virtual_size)
+        self.assertEqual(info, images.qemu_img_info('/disk1'))
+        self.assertEqual(['/disk1'], self.executed)
+
+    def test_changed_image_is_refreshed(self):
+        images.qemu_img_info('/disk1')
+        self.stat_keys['/disk1'] = (1, 101.0, 2048)
+        images.qemu_img_info('/disk1')
+        self.stat_keys['/disk1'] = (3, 101.0, 2048)
+        images.qemu_img_info('/disk1')
+        self.assertEqual(['/disk1'] * 3, self.executed)
+
+    def test_not_cached_without_stat(self):
+        images.qemu_img_info('/disk3')
+        images.qemu_img_info('/disk3')
+        self.assertEqual(['/disk3'] * 2, self.executed)
+
+    def test_cache_disabled(self):
+        self.flags(qemu_img_info_cache_size=0)
+        images.qemu_img_info('/disk1')
+        images.qemu_img_info('/disk1')
+        self.assertEqual(['/disk1'] * 2, self.executed)
+
+    def test_least_recently_used_is_evicted(self):
+        self.flags(qemu_img_info_cache_size=1)
+        images.qemu_img_info('/disk1')
+        images.qemu_img_info('/disk2')
+        images.qemu_img_info('/disk2')
+        images.qemu_img_info('/disk1')
+        self.assertEqual(['/disk1', '/disk2', '/disk1'], self.executed)
+
+
+class FakeImageService(object):
+    def __init__(self, data, checksum=None):
+        self.data = data
+        self.checksum = checksum or hashlib.md5(data).hexdigest()
+
+    def show(self, context, image_id):
+        return {'id': image_id, 'size': len(self.data),
+                'checksum': self.checksum}
+
+    def download(self, context, image_id, data):
+        data.write(self.data)
+
+
+class FetchTestCase(test.TestCase):
+    def setUp(self):
+        super(FetchTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.image_service = FakeImageService('x' * 1024)
+        self.stubs.Set(glance, 'get_remote_image_service',
+                       lambda context, href: (self.image_service, href))
+
+    def _fetch(self):
+        with utils.tempdir() as tmpdir:
+            path = os.path.join(tmpdir, 'image')
+            try:
+                images.fetch(self.context, 'fake-image', path, None, None)
+            finally:
+                self.path_exists = os.path.exists(path)
+            with open(path) as image_file:
+                return image_file.read()
+
+    def test_fetch(self):
+        self.assertEqual('x' * 1024, self._fetch())
+
+    def test_fetch_checksum_mismatch(self):
+        self.image_service.checksum = 'bad'
+        self.assertRaises(exception.ImageUnacceptable, self._fetch)
+        self.assertFalse(self.path_exists)
@@ -201,6 +201,30 @@ class ComputeDriver(object):
         """
         raise NotImplementedError()
 
+    def list_instance_info(self):
+        """
+        Return data about all the instances known to the virtualization
+        layer, as a dict keyed by the instance UUIDs.
+
+        This enumerates the instances once instead of a get_info() call
+        per instance.  Each value is a dict of the get_info() keys plus:
+
+        :name:            the name of the instance on the hypervisor
+        """
+        raise NotImplementedError()
+
+    def list_instance_power_states(self):
+        """
+        Return the power states of all the instances known to the
+        virtualization layer, as a dict of power_state codes keyed by the
+        instance UUIDs.
+
+        This lets the compute manager sync the power states with one call
+        instead of a get_info() call per instance.
+        """
+        return dict((uuid, info['state'])
+                    for uuid, info in self.list_instance_info().iteritems())
+
     def spawn(self, context, instance, image_meta, injected_files,
               admin_password, network_info=None, block_device_info=None):
         """
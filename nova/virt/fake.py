@@ -69,9 +69,10 @@ def restore_nodes():
 
 class FakeInstance(object):
 
-    def __init__(self, name, state):
+    def __init__(self, name, state, uuid=None):
         self.name = name
         self.state = state
+        self.uuid = uuid
 
     def __getitem__(self, key):
         return getattr(self, key)
@@ -126,7 +127,7 @@ class FakeDriver(driver.ComputeDriver):
               admin_password, network_info=None, block_device_info=None):
         name = instance['name']
         state = power_state.RUNNING
-        fake_instance = FakeInstance(name, state)
+        fake_instance = FakeInstance(name, state, instance['uuid'])
         self.instances[name] = fake_instance
 
     def snapshot(self, context, instance, name, update_task_state):
@@ -433,6 +434,15 @@ class FakeDriver(driver.ComputeDriver):
     def list_instance_uuids(self):
         return []
 
+    def list_instance_info(self):
+        return dict((i.uuid, {'name': i.name,
+                              'state': i.state,
+                              'max_mem': 0,
+                              'mem': 0,
+                              'num_cpu': 2,
+                              'cpu_time': 0})
+                    for i in self.instances.itervalues())
+
     def legacy_nwinfo(self):
         return True
 
@@ -0,0 +1,211 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Distribution of cached images between compute hosts.
+
+A host which fetched an image from the image service advertises it in a
+registry directory shared by the compute hosts, with one JSON file per host.
+Its peers then copy the image from the advertised URL instead of downloading
+it from the image service again, and check it against the checksum reported
+by the image service.  Nova does not serve the images itself, the URLs must
+be served by e.g. a web server exporting the image cache of each host.
+
+An image converted after its download is served from the file as downloaded,
+which is kept next to the converted one while the registry is enabled.
+"""
+
+import hashlib
+import os
+import random
+import urllib2
+
+from oslo.config import cfg
+
+from nova.openstack.common import fileutils
+from nova.openstack.common import jsonutils
+from nova.openstack.common import lockutils
+from nova.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+image_peers_opts = [
+    cfg.StrOpt('image_peers_registry_path',
+               default=None,
+               help='Directory shared by the compute hosts, where they '
+                    'advertise the images they can serve to each other. '
+                    'Images converted to raw then also keep their '
+                    'downloaded file to serve it. Images are only fetched '
+                    'from the image service unless both this and '
+                    'image_peers_url_pattern are set'),
+    cfg.StrOpt('image_peers_url_pattern',
+               default=None,
+               help='URL from which the peers of this host download its '
+                    'images, e.g. http://%(host)s/_base/%(filename)s. '
+                    '%(host)s, %(path)s and %(filename)s are replaced by '
+                    'the host name, and the path and name of the image '
+                    'file. Nova does not serve the images itself, they '
+                    'must be served at these URLs by another service'),
+    cfg.IntOpt('image_peers_max_attempts',
+               default=3,
+               help='Number of peers an image is downloaded from before '
+                    'falling back to the image service'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(image_peers_opts)
+CONF.import_opt('host', 'nova.netconf')
+
+CHUNK_SIZE = 64 * 1024
+
+
+def enabled():
+    return bool(CONF.image_peers_registry_path and
+                CONF.image_peers_url_pattern)
+
+
+def original_path(path):
+    """Return where the image converted to path is kept as downloaded."""
+    return '%s.orig' % path
+
+
+def _registry_file(host):
+    return os.path.join(CONF.image_peers_registry_path, '%s.json' % host)
+
+
+def _read_registry(host):
+    try:
+        with open(_registry_file(host)) as f:
+            return jsonutils.loads(f.read())
+    except (IOError, ValueError):
+        return {}
+
+
+@lockutils.synchronized('image-peers', 'nova-')
+def _update_registry(update):
+    """Apply update to the registry of this host and write it atomically,
+    so peers never read a partial file.
+    """
+    registry = _read_registry(CONF.host)
+    update(registry)
+
+    fileutils.ensure_tree(CONF.image_peers_registry_path)
+    registry_file = _registry_file(CONF.host)
+    with open('%s.tmp' % registry_file, 'w') as f:
+        f.write(jsonutils.dumps(registry))
+    os.rename('%s.tmp' % registry_file, registry_file)
+
+
+def advertise(image_id, path, checksum):
+    """Serve the image stored at path to the peers of this host.
+
+    The content of the file must be the image as stored by the image
+    service, and checksum its MD5 as reported by the image service.
+    """
+    if not enabled() or not checksum:
+        return
+
+    url = CONF.image_peers_url_pattern % {'host': CONF.host,
+                                          'path': path,
+                                          'filename': os.path.basename(path)}
+
+    def update(registry):
+        registry[image_id] = {'path': path, 'url': url, 'checksum': checksum}
+
+    _update_registry(update)
+
+
+def withdraw(paths=None):
+    """Stop serving the images stored at paths, or kept as downloaded for
+    them, and the images whose file no longer exists.
+    """
+    if not enabled():
+        return
+    paths = paths or []
+    paths = paths + [original_path(path) for path in paths]
+
+    def update(registry):
+        for image_id, entry in registry.items():
+            if entry['path'] in paths or not os.path.exists(entry['path']):
+                LOG.debug(_('No longer serving image %(image_id)s from '
+                            '%(path)s'),
+                          {'image_id': image_id, 'path': entry['path']})
+                del registry[image_id]
+
+    _update_registry(update)
+
+
+def find_peers(image_id, checksum):
+    """Return the URLs from which peers serve image_id, in random order to
+    spread the load over them.
+    """
+    urls = []
+    for filename in os.listdir(CONF.image_peers_registry_path):
+        host, ext = os.path.splitext(filename)
+        if ext != '.json' or host == CONF.host:
+            continue
+        entry = _read_registry(host).get(image_id)
+        if entry and entry.get('checksum') == checksum:
+            urls.append(entry['url'])
+    random.shuffle(urls)
+    return urls
+
+
+def _download(url, path):
+    """Download url to path and return the MD5 of the data."""
+    checksum = hashlib.md5()
+    source = urllib2.urlopen(url)
+    try:
+        with open(path, 'wb') as image_file:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), ''):
+                image_file.write(chunk)
+                checksum.update(chunk)
+    finally:
+        source.close()
+    return checksum.hexdigest()
+
+
+def fetch(image_id, path, checksum):
+    """Download an image from the peers of this host to path.
+
+    Returns True if a peer served an image matching checksum, False if the
+    image has to be fetched from the image service.
+    """
+    if not enabled() or not checksum:
+        return False
+    if not os.path.isdir(CONF.image_peers_registry_path):
+        return False
+
+    urls = find_peers(image_id, checksum)
+    for url in urls[:CONF.image_peers_max_attempts]:
+        try:
+            peer_checksum = _download(url, path)
+        except (IOError, OSError, urllib2.URLError), e:
+            LOG.warn(_('Failed to download image %(image_id)s from '
+                       '%(url)s: %(error)s'),
+                     {'image_id': image_id, 'url': url, 'error': e})
+            continue
+
+        if peer_checksum == checksum:
+            LOG.info(_('Downloaded image %(image_id)s from %(url)s'),
+                     {'image_id': image_id, 'url': url})
+            return True
+        LOG.warn(_('Image %(image_id)s downloaded from %(url)s has checksum '
+                   '%(peer_checksum)s instead of %(checksum)s'),
+                 {'image_id': image_id, 'url': url,
+                  'peer_checksum': peer_checksum, 'checksum': checksum})
+    return False
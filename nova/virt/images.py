@@ -21,8 +21,10 @@
 Handling of VM disk images.
 """
 
+import hashlib
 import os
 import re
+import time
 
 from oslo.config import cfg
 
@@ -30,6 +32,7 @@ from nova import exception
 from nova.image import glance
 from nova.openstack.common import log as logging
 from nova import utils
+from nova.virt import image_peers
 
 LOG = logging.getLogger(__name__)
 
@@ -37,6 +40,11 @@ image_opts = [
     cfg.BoolOpt('force_raw_images',
                 default=True,
                 help='Force backing images to raw format'),
+    cfg.IntOpt('qemu_img_info_cache_size',
+               default=1024,
+               help='Number of disk images whose qemu-img info output is '
+                    'kept in memory until the image file changes. 0 '
+                    'disables the cache'),
 ]
 
 CONF = cfg.CONF
@@ -174,14 +182,59 @@ class QemuImgInfo(object):
         return contents
 
 
+# { path : (stat key, QemuImgInfo, last used time) }
+_qemu_img_info_cache = {}
+
+
+def _stat_key(path):
+    """Return what identifies the current content of a file, or None if
+    it can't be stat'ed.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime, st.st_size)
+
+
+def _cache_qemu_img_info(path, key, info):
+    if (len(_qemu_img_info_cache) >= CONF.qemu_img_info_cache_size and
+            path not in _qemu_img_info_cache):
+        oldest = min(_qemu_img_info_cache,
+                     key=lambda p: _qemu_img_info_cache[p][2])
+        del _qemu_img_info_cache[oldest]
+    _qemu_img_info_cache[path] = (key, info, time.time())
+
+
+def clear_qemu_img_info_cache():
+    _qemu_img_info_cache.clear()
+
+
 def qemu_img_info(path):
-    """Return an object containing the parsed output from qemu-img info."""
+    """Return an object containing the parsed output from qemu-img info.
+
+    The output is cached until the inode, modification time or size of
+    the file changes, so the disk accounting of many instances doesn't run
+    qemu-img over and over on unchanged images.  The returned object is
+    shared and must not be modified.
+    """
     if not os.path.exists(path):
         return QemuImgInfo()
 
+    key = None
+    if CONF.qemu_img_info_cache_size > 0:
+        key = _stat_key(path)
+        cached = _qemu_img_info_cache.get(path)
+        if key is not None and cached and cached[0] == key:
+            _qemu_img_info_cache[path] = (key, cached[1], time.time())
+            return cached[1]
+
     out, err = utils.execute('env', 'LC_ALL=C', 'LANG=C',
                              'qemu-img', 'info', path)
-    return QemuImgInfo(out)
+    info = QemuImgInfo(out)
+    if key is not None:
+        _cache_qemu_img_info(path, key, info)
+    return info
 
 
 def convert_image(source, dest, out_format, run_as_root=False):
@@ -190,21 +243,54 @@ def convert_image(source, dest, out_format, run_as_root=False):
     utils.execute(*cmd, run_as_root=run_as_root)
 
 
+class _ChecksumFile(object):
+    """Write-only file wrapper computing the checksum of the data written
+    through it, so the image doesn't have to be read again to verify it.
+    """
+
+    def __init__(self, image_file):
+        self.image_file = image_file
+        self.checksum = hashlib.md5()
+
+    def write(self, data):
+        self.image_file.write(data)
+        self.checksum.update(data)
+
+
 def fetch(context, image_href, path, _user_id, _project_id):
+    """Download an image to path, verifying its checksum on the fly.
+
+    The image is copied from a peer host serving it if there is one.
+
+    Returns the metadata of the image.
+    """
     # TODO(vish): Improve context handling and add owner and auth data
     #             when it is added to glance.  Right now there is no
     #             auth checking in glance, so we assume that access was
     #             checked before we got here.
     (image_service, image_id) = glance.get_remote_image_service(context,
                                                                 image_href)
+    image_meta = image_service.show(context, image_id)
     with utils.remove_path_on_error(path):
+        if image_peers.fetch(image_id, path, image_meta.get('checksum')):
+            return image_meta
+
         with open(path, "wb") as image_file:
-            image_service.download(context, image_id, image_file)
+            checksum_file = _ChecksumFile(image_file)
+            image_service.download(context, image_id, checksum_file)
+        checksum = checksum_file.checksum.hexdigest()
+
+        expected = image_meta.get('checksum')
+        if expected and checksum != expected:
+            raise exception.ImageUnacceptable(image_id=image_href,
+                reason=_("checksum %(checksum)s doesn't match the expected "
+                         "%(expected)s") % locals())
+    return image_meta
 
 
 def fetch_to_raw(context, image_href, path, user_id, project_id):
     path_tmp = "%s.part" % path
-    fetch(context, image_href, path_tmp, user_id, project_id)
+    image_meta = fetch(context, image_href, path_tmp, user_id, project_id)
 
     with utils.remove_path_on_error(path_tmp):
         data = qemu_img_info(path_tmp)
@@ -222,10 +308,14 @@ def fetch_to_raw(context, image_href, path, user_id, project_id):
 
         if fmt != "raw" and CONF.force_raw_images:
             staged = "%s.converted" % path
+            # Peers can only check the image as downloaded against the
+            # checksum of the image service, keep it to serve it.
+            keep_original = image_peers.enabled() and image_meta
             LOG.debug("%s was %s, converting to raw" % (image_href, fmt))
             with utils.remove_path_on_error(staged):
                 convert_image(path_tmp, staged, 'raw')
-                os.unlink(path_tmp)
+                if not keep_original:
+                    os.unlink(path_tmp)
 
                 data = qemu_img_info(staged)
                 if data.file_format != "raw":
@@ -234,5 +324,16 @@ def fetch_to_raw(context, image_href, path, user_id, project_id):
                         data.file_format)
 
                 os.rename(staged, path)
+
+            if keep_original:
+                original = image_peers.original_path(path)
+                os.rename(path_tmp, original)
+                image_peers.advertise(image_meta['id'], original,
+                                      image_meta.get('checksum'))
         else:
             os.rename(path_tmp, path)
+            # The image was stored as is, peers can check it against the
+            # checksum of the image service.
+            if image_meta:
+                image_peers.advertise(image_meta['id'], path,
+                                      image_meta.get('checksum'))
@@ -677,8 +677,50 @@ class LibvirtDriver(driver.ComputeDriver):
         return names
 
     def list_instance_uuids(self):
-        return [self._conn.lookupByName(name).UUIDString()
-                for name in self.list_instances()]
+        return self.list_instance_info().keys()
+
+    def _list_domains(self):
+        """Return all the domains, running or not, but the hypervisor's."""
+        if hasattr(libvirt, 'VIR_CONNECT_LIST_DOMAINS_ACTIVE'):
+            # libvirt >= 0.9.13 lists them all in one call.
+            return [dom for dom in self._conn.listAllDomains(0)
+                    if dom.ID() != 0]
+
+        domains = []
+        for domain_id in self.list_instance_ids():
+            try:
+                # We skip domains with ID 0 (hypervisors).
+                if domain_id != 0:
+                    domains.append(self._conn.lookupByID(domain_id))
+            except libvirt.libvirtError:
+                # Instance was deleted while listing... ignore it
+                pass
+        for name in self._conn.listDefinedDomains():
+            try:
+                domains.append(self._conn.lookupByName(name))
+            except libvirt.libvirtError:
+                pass
+        return domains
+
+    def list_instance_info(self):
+        # Besides the common keys, 'id' is the libvirt domain ID, which is
+        # -1 for the domains that are defined but not active.
+        instances = {}
+        for dom in self._list_domains():
+            try:
+                (state, max_mem, mem, num_cpu, cpu_time) = dom.info()
+                instances[dom.UUIDString()] = {
+                        'name': dom.name(),
+                        'id': dom.ID(),
+                        'state': LIBVIRT_POWER_STATE[state],
+                        'max_mem': max_mem,
+                        'mem': mem,
+                        'num_cpu': num_cpu,
+                        'cpu_time': cpu_time}
+            except libvirt.libvirtError:
+                # Instance was deleted while listing... ignore it
+                pass
+        return instances
 
     def plug_vifs(self, instance, network_info):
         """Plug VIFs into networks."""
@@ -2561,26 +2603,11 @@ class LibvirtDriver(driver.ComputeDriver):
         if CONF.libvirt_type == 'lxc':
             return total + 1
 
-        dom_ids = self.list_instance_ids()
-        for dom_id in dom_ids:
-            try:
-                dom = self._conn.lookupByID(dom_id)
-                vcpus = dom.vcpus()
-                if vcpus is None:
-                    LOG.debug(_("couldn't obtain the vpu count from domain id:"
-                                " %s") % dom_id)
-                else:
-                    total += len(vcpus[1])
-            except libvirt.libvirtError as err:
-                if err.get_error_code() == libvirt.VIR_ERR_NO_DOMAIN:
-                    LOG.debug(_("List of domains returned by libVirt: %s")
-                              % dom_ids)
-                    LOG.warn(_("libVirt can't find a domain with id: %s")
-                             % dom_id)
-                    continue
-                raise
-            # NOTE(gtt116): give change to do other task.
-            greenthread.sleep(0)
+        # Every active domain counts, whatever its state, as the vcpus
+        # stay allocated until the domain is shut off.
+        for info in self.list_instance_info().itervalues():
+            if info['id'] != -1:
+                total += info['num_cpu']
         return total
 
     def get_memory_mb_used(self):
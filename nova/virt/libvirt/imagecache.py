@@ -37,6 +37,7 @@ from nova.openstack.common import jsonutils
 from nova.openstack.common import lockutils
 from nova.openstack.common import log as logging
 from nova import utils
+from nova.virt import image_peers
 from nova.virt.libvirt import utils as virtutils
 
 LOG = logging.getLogger(__name__)
@@ -74,6 +75,15 @@ imagecache_opts = [
     cfg.IntOpt('checksum_interval_seconds',
                default=3600,
                help='How frequently to checksum base images'),
+    cfg.IntOpt('checksum_max_read_rate',
+               default=0,
+               help='Maximum rate in MB/s at which base images are read to '
+                    'checksum them. 0 means unlimited'),
+    cfg.IntOpt('checksum_max_mb_per_pass',
+               default=0,
+               help='Maximum number of MB of a base image read to checksum '
+                    'it in a single image cache pass. Hashing resumes where '
+                    'it stopped on the next pass. 0 means unlimited'),
     ]
 
 CONF = cfg.CONF
@@ -81,6 +91,8 @@ CONF.register_opts(imagecache_opts)
 CONF.import_opt('host', 'nova.netconf')
 CONF.import_opt('instances_path', 'nova.compute.manager')
 
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+
 
 def get_cache_fname(images, key):
     """Return a filename based on the SHA1 hash of a given image ID.
@@ -231,17 +243,38 @@ def read_stored_checksum(target, timestamped=True):
     return read_stored_info(target, field='sha1', timestamped=timestamped)
 
 
-def write_stored_checksum(target):
-    """Write a checksum to disk for a file in _base."""
+def _stat_key(path):
+    """Return what identifies the current content of a file, or None if
+    it can't be stat'ed.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_ino, st.st_size, st.st_mtime]
+
+
+def write_stored_checksum(target, checksum=None, stat_key=None):
+    """Write a checksum to disk for a file in _base.
+
+    The inode, size and modification time of the file are stored with the
+    checksum, so unchanged files don't need to be hashed again to be
+    verified.
+    """
 
-    with open(target, 'r') as img_file:
-        checksum = utils.hash_file(img_file)
+    if checksum is None:
+        stat_key = _stat_key(target)
+        with open(target, 'r') as img_file:
+            checksum = utils.hash_file(img_file)
     write_stored_info(target, field='sha1', value=checksum)
+    write_stored_info(target, field='sha1-stat', value=stat_key)
 
 
 class ImageCacheManager(object):
     def __init__(self):
         self.lock_path = os.path.join(CONF.instances_path, 'locks')
+        # { base file : {'stat': stat key, 'checksum': sha1, 'offset': n} }
+        self._checksum_progress = {}
         self._reset_state()
 
     def _reset_state(self):
@@ -384,9 +417,58 @@ class ImageCacheManager(object):
             if m:
                 yield img, False, True
 
+    def _hash_base_file(self, base_file, stat_key):
+        """Compute the SHA1 of a base file, resuming the hashing started by
+        the previous passes if the file hasn't changed since.
+
+        Reads are limited to checksum_max_read_rate MB/s and to
+        checksum_max_mb_per_pass MB. Returns the checksum (as hex), or None
+        if the read budget of this pass ran out before the end of the file.
+        """
+        progress = self._checksum_progress.get(base_file)
+        if not progress or progress['stat'] != stat_key:
+            progress = {'stat': stat_key,
+                        'checksum': hashlib.sha1(),
+                        'offset': 0}
+            self._checksum_progress[base_file] = progress
+
+        budget = CONF.checksum_max_mb_per_pass * 1024 * 1024
+        rate = CONF.checksum_max_read_rate * 1024 * 1024
+        start = time.time()
+        read = 0
+        with open(base_file, 'r') as f:
+            f.seek(progress['offset'])
+            while True:
+                if budget and read >= budget:
+                    LOG.info(_('%(base_file)s: checksummed %(offset)d of '
+                               '%(size)d bytes, resuming on the next pass'),
+                             {'base_file': base_file,
+                              'offset': progress['offset'],
+                              'size': stat_key[1]})
+                    return None
+
+                chunk = f.read(CHECKSUM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                progress['checksum'].update(chunk)
+                progress['offset'] += len(chunk)
+                read += len(chunk)
+
+                if rate:
+                    delay = start + float(read) / rate - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+
+        del self._checksum_progress[base_file]
+        return progress['checksum'].hexdigest()
+
     def _verify_checksum(self, img_id, base_file, create_if_missing=True):
         """Compare the checksum stored on disk with the current file.
 
+        Files which haven't changed since their checksum was last computed
+        or verified are not read again. Large files may take several passes
+        to verify, in which case None is returned until the hashing is done.
+
         Note that if the checksum fails to verify this is logged, but no actual
         action occurs. This is something sysadmins should monitor for and
         handle manually when it occurs.
@@ -404,13 +486,23 @@ class ImageCacheManager(object):
         def inner_verify_checksum():
             (stored_checksum, stored_timestamp) = read_stored_checksum(
                 base_file, timestamped=True)
+            stat_key = _stat_key(base_file)
             if stored_checksum:
+                stored_stat_key = read_stored_info(base_file,
+                                                   field='sha1-stat')
+                if stored_stat_key:
+                    # The file hasn't changed since its checksum was last
+                    # verified, possibly on another compute node if we are
+                    # using shared storage.
+                    if stored_stat_key == stat_key:
+                        return True
+
                 # NOTE(mikal): Checksums are timestamped. If we have recently
                 # checksummed (possibly on another compute node if we are using
                 # shared storage), then we don't need to checksum again.
-                if (stored_timestamp and
-                    time.time() - stored_timestamp <
-                    CONF.checksum_interval_seconds):
+                elif (stored_timestamp and
+                      time.time() - stored_timestamp <
+                      CONF.checksum_interval_seconds):
                     return True
 
                 # NOTE(mikal): If there is no timestamp, then the checksum was
@@ -419,8 +511,9 @@ class ImageCacheManager(object):
                     write_stored_info(base_file, field='sha1',
                                       value=stored_checksum)
 
-                with open(base_file, 'r') as f:
-                    current_checksum = utils.hash_file(f)
+                current_checksum = self._hash_base_file(base_file, stat_key)
+                if current_checksum is None:
+                    return None
 
                 if current_checksum != stored_checksum:
                     LOG.error(_('image %(id)s at (%(base_file)s): image '
@@ -430,6 +523,8 @@ class ImageCacheManager(object):
                     return False
 
                 else:
+                    write_stored_info(base_file, field='sha1-stat',
+                                      value=stat_key)
                     return True
 
             else:
@@ -445,7 +540,10 @@ class ImageCacheManager(object):
                     LOG.info(_('%(id)s (%(base_file)s): generating checksum'),
                              {'id': img_id,
                               'base_file': base_file})
-                    write_stored_checksum(base_file)
+                    checksum = self._hash_base_file(base_file, stat_key)
+                    if checksum is not None:
+                        write_stored_checksum(base_file, checksum=checksum,
+                                              stat_key=stat_key)
 
                 return None
 
@@ -478,6 +576,9 @@ class ImageCacheManager(object):
                 signature = get_info_filename(base_file)
                 if os.path.exists(signature):
                     os.remove(signature)
+                original = image_peers.original_path(base_file)
+                if os.path.exists(original):
+                    os.remove(original)
             except OSError, e:
                 LOG.error(_('Failed to remove %(base_file)s, '
                             'error was %(error)s'),
@@ -489,6 +590,7 @@ class ImageCacheManager(object):
 
         image_bad = False
         image_in_use = False
+        checksum_result = None
 
         LOG.info(_('image %(id)s at (%(base_file)s): checking'),
                  {'id': img_id,
@@ -551,7 +653,18 @@ class ImageCacheManager(object):
                            'base_file': base_file})
                 if os.path.exists(base_file):
                     virtutils.chown(base_file, os.getuid())
+                    touched_stat_key = _stat_key(base_file)
                     os.utime(base_file, None)
+                    stat_key = _stat_key(base_file)
+
+                    # Touching the file doesn't change its content, keep the
+                    # verified checksum and the checksum in progress valid.
+                    if checksum_result:
+                        write_stored_info(base_file, field='sha1-stat',
+                                          value=stat_key)
+                    progress = self._checksum_progress.get(base_file)
+                    if progress and progress['stat'] == touched_stat_key:
+                        progress['stat'] = stat_key
 
     def verify_base_images(self, context, all_instances):
         """Verify that base images are in a reasonable state."""
@@ -617,5 +730,8 @@ class ImageCacheManager(object):
                 for base_file in self.removable_base_files:
                     self._remove_base_file(base_file)
 
+        # Stop serving corrupt and removed images to peers
+        image_peers.withdraw(self.corrupt_base_files)
+
         # That's it
         LOG.debug(_('Verification complete'))
@@ -170,6 +170,10 @@ class XenAPIDriver(driver.ComputeDriver):
         """
         return self._vmops.list_instance_uuids()
 
+    def list_instance_info(self):
+        """Return data about the nova VM instances, keyed by uuid."""
+        return self._vmops.list_instance_info()
+
     def spawn(self, context, instance, image_meta, injected_files,
               admin_password, network_info=None, block_device_info=None):
         """Create VM instance."""
@@ -203,6 +203,19 @@ class VMOps(object):
                 nova_uuids.append(nova_uuid)
         return nova_uuids
 
+    def list_instance_info(self):
+        """Return data about the VMs of nova instances found on the
+        hypervisor, keyed by nova instance uuid.
+        """
+        instances = {}
+        for vm_ref, vm_rec in vm_utils.list_vms(self._session):
+            nova_uuid = vm_rec['other_config'].get('nova_uuid')
+            if nova_uuid:
+                info = vm_utils.compile_info(vm_rec)
+                info['name'] = vm_rec['name_label']
+                instances[nova_uuid] = info
+        return instances
+
     def confirm_migration(self, migration, instance, network_info):
         name_label = self._get_orig_vm_name_label(instance)
         vm_ref = vm_utils.lookup(self._session, name_label)
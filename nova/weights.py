@@ -17,6 +17,13 @@
 Pluggable Weighing support
 """
 
+import heapq
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from nova import loadables
 
 
@@ -44,6 +51,15 @@ class BaseWeigher(object):
         """
         return 0.0
 
+    def _weigh_column(self, objs, weight_properties):
+        """Override in a subclass to weigh a list of objects at once.
+
+        Return the weights of all objects, in the same order, as a list
+        or array.  It is only used when it is overridden at least as deep
+        in the class hierarchy as _weigh_object() and weigh_objects().
+        """
+        raise NotImplementedError()
+
     def weigh_objects(self, weighed_obj_list, weight_properties):
         """Weigh multiple objects.  Override in a subclass if you need
         need access to all objects in order to manipulate weights.
@@ -56,16 +72,91 @@ class BaseWeigher(object):
 class BaseWeightHandler(loadables.BaseLoader):
     object_class = WeighedObject
 
-    def get_weighed_objects(self, weigher_classes, obj_list,
+    def _weigh_with(self, weigher, weigh_method, objs, weighing_properties):
+        """Call one of the weighing methods of a weigher.  Override in a
+        subclass to instrument the weighers.
+        """
+        return weigh_method(objs, weighing_properties)
+
+    def _can_weigh_columns(self, weigher_cls):
+        """Return whether a weigher class weighs all objects at once.
+
+        A subclass that only overrides _weigh_object() or weigh_objects()
+        of a column weigher weighs one object at a time.
+        """
+        mro = weigher_cls.__mro__
+
+        def defined_in(name):
+            return min(i for i, cls in enumerate(mro) if name in cls.__dict__)
+
+        column = defined_in('_weigh_column')
+        return (mro[column] is not BaseWeigher and
+                column <= defined_in('_weigh_object') and
+                column <= defined_in('weigh_objects'))
+
+    def _get_weight_columns(self, weigher_classes, obj_list,
             weighing_properties):
-        """Return a sorted (highest score first) list of WeighedObjects."""
+        """Return a list of (multiplier, weights) tuples, one per weigher."""
+        columns = []
+        for weigher_cls in weigher_classes:
+            weigher = weigher_cls()
+            column = self._weigh_with(weigher, weigher._weigh_column,
+                                      obj_list, weighing_properties)
+            columns.append((weigher._weight_multiplier(), column))
+        return columns
+
+    def _weigh_columns(self, columns, num_objs, limit):
+        """Sum the weight columns and return a list of (index, weight)
+        tuples for the best objects, highest weight first.
+        """
+        if numpy is not None:
+            weights = numpy.zeros(num_objs)
+            for multiplier, column in columns:
+                weights += multiplier * numpy.asarray(column, dtype=float)
+            # A stable sort keeps objects with equal weights in the same
+            # order as sorted() does.
+            order = numpy.argsort(-weights, kind='mergesort')[:limit]
+            return [(i, float(weights[i])) for i in order]
+
+        weights = [0.0] * num_objs
+        for multiplier, column in columns:
+            weights = [weight + multiplier * value
+                       for weight, value in zip(weights, column)]
+        if limit is None:
+            order = sorted(xrange(num_objs), key=weights.__getitem__,
+                           reverse=True)
+        else:
+            order = heapq.nlargest(limit, xrange(num_objs),
+                                   key=weights.__getitem__)
+        return [(i, weights[i]) for i in order]
 
+    def get_weighed_objects(self, weigher_classes, obj_list,
+            weighing_properties, limit=None):
+        """Return a sorted (highest score first) list of WeighedObjects.
+
+        If limit is given, only the limit highest scoring objects are
+        returned.  When every weigher can weigh all objects at once, only
+        those objects are wrapped in WeighedObjects.
+        """
+
+        obj_list = list(obj_list)
         if not obj_list:
             return []
 
+        if all(self._can_weigh_columns(weigher_cls)
+               for weigher_cls in weigher_classes):
+            columns = self._get_weight_columns(weigher_classes, obj_list,
+                                               weighing_properties)
+            return [self.object_class(obj_list[i], weight)
+                    for i, weight in self._weigh_columns(columns,
+                            len(obj_list), limit)]
+
         weighed_objs = [self.object_class(obj, 0.0) for obj in obj_list]
         for weigher_cls in weigher_classes:
             weigher = weigher_cls()
-            weigher.weigh_objects(weighed_objs, weighing_properties)
+            self._weigh_with(weigher, weigher.weigh_objects, weighed_objs,
+                             weighing_properties)
 
+        if limit is not None:
+            return heapq.nlargest(limit, weighed_objs, key=lambda x: x.weight)
         return sorted(weighed_objs, key=lambda x: x.weight, reverse=True)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark the evaluation of policy rules.
+
+The policy checks of GET /servers/detail requests with the common server
+extensions loaded are evaluated by nova.policy.enforce() against a policy
+file, with a new request context for every request.
+
+Reported are the enforce() calls per second, for a member and an admin
+context.
+
+Run like:
+
+    ./tools/policy_bench.py --policy-file etc/nova/policy.json --requests 5000
+"""
+
+import argparse
+import gettext
+import os
+import sys
+import time
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                   os.pardir, os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'nova', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+gettext.install('nova', unicode=1)
+
+from oslo.config import cfg
+
+from nova import context
+from nova import policy
+
+CONF = cfg.CONF
+
+ACTIONS = [
+    'compute:get_all',
+    'compute_extension:config_drive',
+    'compute_extension:disk_config',
+    'compute_extension:extended_availability_zone',
+    'compute_extension:extended_ips',
+    'compute_extension:extended_server_attributes',
+    'compute_extension:extended_status',
+    'compute_extension:hide_server_addresses',
+    'compute_extension:keypairs',
+    'compute_extension:security_groups',
+]
+
+
+def make_context(is_admin):
+    roles = ['member', 'admin'] if is_admin else ['member']
+    return context.RequestContext('fake', 'openstack', roles=roles)
+
+
+def check(ctxt, action, target):
+    return policy.enforce(ctxt, action, target, do_raise=False)
+
+
+def timed(is_admin, requests):
+    """Return the seconds per policy check."""
+    target = {'project_id': 'openstack', 'user_id': 'fake'}
+    contexts = [make_context(is_admin) for i in xrange(requests)]
+    start = time.time()
+    for ctxt in contexts:
+        for action in ACTIONS:
+            check(ctxt, action, target)
+    return (time.time() - start) / (requests * len(ACTIONS))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1],
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--policy-file',
+                        default=os.path.join(possible_topdir, 'etc', 'nova',
+                                             'policy.json'),
+                        help='policy file the checks are evaluated against')
+    parser.add_argument('--requests', type=int, default=5000,
+                        help='number of requests checked')
+    args = parser.parse_args()
+
+    CONF([], project='nova')
+    CONF.set_override('policy_file', os.path.abspath(args.policy_file))
+
+    for is_admin in (False, True):
+        policy.reset()
+        seconds = timed(is_admin, args.requests)
+        print "%s context: %.0f enforce() calls/s" % (
+            'admin' if is_admin else 'member', 1 / seconds)
+
+if __name__ == '__main__':
+    main()
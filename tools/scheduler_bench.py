@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark the scheduling decisions of the FilterScheduler.
+
+A synthetic cloud of compute nodes, spread over availability zones and
+aggregates with metadata, is served to the scheduler of
+nova.tests.scheduler.fakes in place of the database.  The hosts report
+capabilities matching the metadata of their aggregates.  A trace of boot
+requests is then replayed through the FilterScheduler's _schedule(), which
+filters, weighs and chooses hosts just like schedule_run_instance() does,
+without casting to the compute hosts.
+
+Reported are the requests per second, the latency percentiles and the time
+spent in each filter and weigher.
+
+Run like:
+
+    ./tools/scheduler_bench.py --hosts 100,1000,10000 --requests 200
+
+Any other argument, like --config-file, is passed on to nova's config so
+scheduler options (filters, weighers, bulk placement...) can be changed.
+The default filters are nova's, with the AggregateInstanceExtraSpecsFilter,
+CoreFilter and DiskFilter added.
+A trace can be saved with --save-trace and replayed with --trace; it is a
+JSON list of requests such as:
+
+    {"flavor": "m1.small", "num_instances": 1,
+     "availability_zone": "az1", "extra_specs": {"ssd": "true"}}
+"""
+
+import argparse
+import functools
+import gettext
+import json
+import os
+import random
+import sys
+import time
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                   os.pardir, os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'nova', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+gettext.install('nova', unicode=1)
+
+from oslo.config import cfg
+
+from nova import config
+from nova import context
+from nova import db
+from nova import exception
+from nova.openstack.common import timeutils
+from nova.tests.scheduler import fakes
+
+CONF = cfg.CONF
+CONF.import_opt('default_availability_zone', 'nova.availability_zones')
+CONF.import_opt('scheduler_default_filters', 'nova.scheduler.host_manager')
+
+BENCH_FILTERS = ['AggregateInstanceExtraSpecsFilter', 'CoreFilter',
+                 'DiskFilter']
+
+FLAVORS = {
+    'm1.tiny': dict(memory_mb=512, vcpus=1, root_gb=0, ephemeral_gb=0),
+    'm1.small': dict(memory_mb=2048, vcpus=1, root_gb=20, ephemeral_gb=0),
+    'm1.medium': dict(memory_mb=4096, vcpus=2, root_gb=40, ephemeral_gb=0),
+    'm1.large': dict(memory_mb=8192, vcpus=4, root_gb=80, ephemeral_gb=0),
+    'm1.xlarge': dict(memory_mb=16384, vcpus=8, root_gb=160,
+                      ephemeral_gb=0),
+}
+
+# Aggregate metadata keys and values the synthetic cloud is built with.
+AGGREGATE_METADATA = {
+    'ssd': ['true', 'false'],
+    'gpu': ['true'],
+    'network': ['10g', '1g'],
+}
+
+
+class SyntheticCloud(object):
+    """Compute nodes, availability zones and aggregates of a fake cloud."""
+
+    def __init__(self, num_hosts, num_zones, num_aggregates, seed):
+        rand = random.Random(seed)
+        now = timeutils.utcnow()
+        self.zones = ['az%d' % i for i in xrange(num_zones)]
+        self.compute_nodes = []
+        # { host : { key : set([value, ...]) } }
+        self.host_metadata = {}
+        # { host : { key : value } }
+        self.host_capabilities = {}
+
+        for i in xrange(num_hosts):
+            host = 'host%05d' % i
+            memory_mb = rand.choice([32768, 65536, 131072, 262144])
+            vcpus = rand.choice([8, 16, 24, 32, 48])
+            local_gb = rand.choice([500, 1000, 2000, 4000])
+            used = rand.random()
+            num_instances = int(used * vcpus)
+            stats = [dict(key='num_instances', value=str(num_instances)),
+                     dict(key='io_workload', value=str(rand.randint(0, 4))),
+                     dict(key='num_vm_active', value=str(num_instances))]
+            self.compute_nodes.append(dict(fakes.COMPUTE_NODES[0],
+                    id=i + 1,
+                    hypervisor_hostname=host,
+                    memory_mb=memory_mb,
+                    free_ram_mb=int(memory_mb * (1 - used)),
+                    vcpus=vcpus,
+                    vcpus_used=num_instances,
+                    local_gb=local_gb,
+                    local_gb_used=int(local_gb * used),
+                    free_disk_gb=int(local_gb * (1 - used)),
+                    disk_available_least=int(local_gb * (1 - used)),
+                    updated_at=now,
+                    deleted=0,
+                    stats=stats,
+                    service=dict(id=i + 1, host=host, topic='compute',
+                                 disabled=rand.random() < 0.01,
+                                 updated_at=now, created_at=now)))
+            self.host_metadata[host] = {
+                'availability_zone': set([rand.choice(self.zones)])}
+            self.host_capabilities[host] = dict(
+                    (key, rand.choice(values))
+                    for key, values in sorted(AGGREGATE_METADATA.items())
+                    if rand.random() < 0.5)
+
+        # Aggregates group hosts with the same capability, like they
+        # would group hosts with the same hardware.
+        for i in xrange(num_aggregates):
+            key = rand.choice(sorted(AGGREGATE_METADATA))
+            value = rand.choice(AGGREGATE_METADATA[key])
+            hosts = sorted(host for host, capabilities
+                           in self.host_capabilities.iteritems()
+                           if capabilities.get(key) == value)
+            size = min(len(hosts), max(1, num_hosts / num_aggregates))
+            for host in rand.sample(hosts, size):
+                self.host_metadata[host].setdefault(key, set()).add(value)
+
+    def aggregate_metadata_get_by_host(self, context, host, key=None):
+        metadata = self.host_metadata.get(host, {})
+        if key:
+            return dict((k, v) for k, v in metadata.iteritems() if k == key)
+        return dict(metadata)
+
+    def aggregate_metadata_get_all_by_host(self, context):
+        return dict((host, dict(metadata))
+                    for host, metadata in self.host_metadata.iteritems())
+
+    def compute_node_get_all(self, context):
+        return self.compute_nodes
+
+    def compute_node_get_all_changed_since(self, context, changes_since):
+        return []
+
+    def install(self, host_manager):
+        """Serve the cloud in place of the database, and report the
+        capabilities of the hosts to host_manager.
+        """
+        for name in ('aggregate_metadata_get_by_host',
+                     'aggregate_metadata_get_all_by_host',
+                     'compute_node_get_all',
+                     'compute_node_get_all_changed_since'):
+            setattr(db, name, getattr(self, name))
+        for host, capabilities in self.host_capabilities.iteritems():
+            host_manager.update_service_capabilities('compute', host,
+                    dict(capabilities, hypervisor_hostname=host))
+
+
+def generate_trace(num_requests, zones, seed):
+    """Return a list of boot requests."""
+    rand = random.Random(seed)
+    trace = []
+    for i in xrange(num_requests):
+        request = {'flavor': rand.choice(FLAVORS.keys()),
+                   'num_instances': rand.choice([1] * 8 + [5, 20])}
+        if rand.random() < 0.5:
+            request['availability_zone'] = rand.choice(zones)
+        if rand.random() < 0.3:
+            key = rand.choice(AGGREGATE_METADATA.keys())
+            request['extra_specs'] = {
+                    key: rand.choice(AGGREGATE_METADATA[key])}
+        trace.append(request)
+    return trace
+
+
+def build_request_spec(request):
+    instance_type = dict(FLAVORS[request['flavor']], name=request['flavor'],
+                         extra_specs=request.get('extra_specs', {}))
+    instance_properties = dict(FLAVORS[request['flavor']],
+            project_id='bench', os_type='linux',
+            availability_zone=request.get('availability_zone'))
+    return {'num_instances': request.get('num_instances', 1),
+            'instance_type': instance_type,
+            'instance_properties': instance_properties}
+
+
+class Timings(object):
+    """Accumulated time spent in each filter and weigher."""
+
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+
+    def add(self, name, seconds):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def instrument(self, cls, method_name):
+        orig = getattr(cls, method_name).im_func
+        name = '%s.%s' % (cls.__name__, method_name)
+        timings = self
+
+        @functools.wraps(orig)
+        def timed(self, *args, **kwargs):
+            start = time.time()
+            result = orig(self, *args, **kwargs)
+            if method_name == 'filter_all':
+                # Filters are chained generators, run this one now so
+                # its own time is measured.
+                result = list(result)
+            timings.add(name, time.time() - start)
+            return result
+
+        setattr(cls, method_name, timed)
+        return orig
+
+    def instrument_classes(self, filter_classes, weigher_classes):
+        """Time the filters and weighers, returning a list of the
+        originals to restore.
+        """
+        originals = []
+        for cls in filter_classes:
+            originals.append((cls, 'filter_all',
+                              self.instrument(cls, 'filter_all')))
+        for cls in weigher_classes:
+            for method_name in ('weigh_objects', '_weigh_column'):
+                originals.append((cls, method_name,
+                                  self.instrument(cls, method_name)))
+        return originals
+
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    index = int(round(percent / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def run(num_hosts, trace, args):
+    cloud = SyntheticCloud(num_hosts, args.zones, args.aggregates, args.seed)
+    CONF.set_override('default_availability_zone', cloud.zones[0])
+
+    sched = fakes.FakeFilterScheduler()
+    host_manager = sched.host_manager
+    cloud.install(host_manager)
+    filter_classes = host_manager._choose_host_filters(None)
+    timings = Timings()
+    originals = timings.instrument_classes(filter_classes,
+                                           host_manager.weight_classes)
+
+    ctxt = context.get_admin_context()
+    latencies = []
+    placed = 0
+    failed = 0
+    try:
+        start = time.time()
+        for request in trace:
+            request_spec = build_request_spec(request)
+            request_start = time.time()
+            try:
+                weighed_hosts = sched._schedule(ctxt, request_spec, {})
+            except exception.NoValidHost:
+                weighed_hosts = []
+            latencies.append(time.time() - request_start)
+            placed += len(weighed_hosts)
+            failed += request_spec['num_instances'] - len(weighed_hosts)
+        elapsed = time.time() - start
+    finally:
+        for cls, method_name, orig in originals:
+            setattr(cls, method_name, orig)
+
+    latencies.sort()
+    print "%d hosts, %d requests, %d instances placed, %d not placed" % (
+            num_hosts, len(trace), placed, failed)
+    print "  %.1f requests/sec" % (len(trace) / elapsed)
+    print "  latency ms: p50 %.2f  p90 %.2f  p99 %.2f  max %.2f" % tuple(
+            1000 * percentile(latencies, p) for p in (50, 90, 99, 100))
+    for name in sorted(timings.seconds, key=timings.seconds.get,
+                       reverse=True):
+        print "  %-50s %10.2f ms total %8.3f ms/call" % (name,
+                1000 * timings.seconds[name],
+                1000 * timings.seconds[name] / timings.calls[name])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1],
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hosts', default='100,1000,5000',
+                        help='comma separated sizes of the clouds to run on')
+    parser.add_argument('--requests', type=int, default=100,
+                        help='number of boot requests to generate')
+    parser.add_argument('--zones', type=int, default=3,
+                        help='number of availability zones')
+    parser.add_argument('--aggregates', type=int, default=10,
+                        help='number of aggregates with metadata')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the cloud and trace generators')
+    parser.add_argument('--trace', help='JSON file of requests to replay')
+    parser.add_argument('--save-trace',
+                        help='save the generated requests to a JSON file')
+    args, nova_args = parser.parse_known_args()
+    CONF.set_default('scheduler_default_filters',
+                     CONF.scheduler_default_filters + BENCH_FILTERS)
+    config.parse_args([sys.argv[0]] + nova_args)
+
+    zones = ['az%d' % i for i in xrange(args.zones)]
+    if args.trace:
+        with open(args.trace) as f:
+            trace = json.load(f)
+    else:
+        trace = generate_trace(args.requests, zones, args.seed)
+    if args.save_trace:
+        with open(args.save_trace, 'w') as f:
+            json.dump(trace, f, indent=1)
+
+    for num_hosts in [int(x) for x in args.hosts.split(',')]:
+        run(num_hosts, trace, args)
+
+
+if __name__ == '__main__':
+    main()
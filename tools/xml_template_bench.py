@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark the rendering of XML templates.
+
+Synthetic GET /servers/detail documents are serialized by the servers
+template with the slave templates of the common server extensions attached,
+once by walking the template tree like Template._serialize() does, and once
+by the render plan the template compiles to.  Each request copies the master
+template and attaches the slaves, like the API does.
+
+Reported are the milliseconds per document of both renderings and the
+speedup.  Both must produce the same XML.
+
+Run like:
+
+    ./tools/xml_template_bench.py --servers 1,100,1000 --repeat 20
+"""
+
+import argparse
+import gettext
+import os
+import random
+import sys
+import time
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                   os.pardir, os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'nova', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+gettext.install('nova', unicode=1)
+
+from lxml import etree
+
+from nova.api.openstack.compute.contrib import config_drive
+from nova.api.openstack.compute.contrib import disk_config
+from nova.api.openstack.compute.contrib import extended_availability_zone
+from nova.api.openstack.compute.contrib import extended_server_attributes
+from nova.api.openstack.compute.contrib import extended_status
+from nova.api.openstack.compute.contrib import keypairs
+from nova.api.openstack.compute.contrib import security_groups
+from nova.api.openstack.compute import servers
+
+SLAVE_TEMPLATES = [
+    config_drive.ServersConfigDriveTemplate,
+    disk_config.ServersDiskConfigTemplate,
+    extended_availability_zone.ExtendedAZsTemplate,
+    extended_server_attributes.ExtendedServerAttributesTemplate,
+    extended_status.ExtendedStatusesTemplate,
+    keypairs.ServersKeyNameTemplate,
+    security_groups.SecurityGroupServersTemplate,
+]
+
+
+def make_servers(num_servers, seed):
+    """Return a server detail document of num_servers servers."""
+    rand = random.Random(seed)
+    href = 'http://localhost:8774/openstack/servers/%s'
+    image_href = 'http://localhost:8774/openstack/images/%s'
+    flavor_href = 'http://localhost:8774/openstack/flavors/%s'
+    servers = []
+    for i in xrange(num_servers):
+        uuid = '%08x-0000-4000-8000-%012x' % (i, rand.getrandbits(48))
+        image_id = '%08x-1111-4000-8000-000000000000' % rand.randint(0, 9)
+        flavor_id = str(rand.randint(1, 5))
+        addresses = {}
+        for net in rand.sample(['private', 'public', 'storage'], 2):
+            addresses[net] = [
+                {'version': 4, 'addr': '10.%d.%d.%d' % (rand.randint(0, 255),
+                                                        i / 256, i % 256)},
+                {'version': 6, 'addr': 'fe80::%x' % i}]
+        servers.append({
+            'id': uuid,
+            'name': 'server-%d' % i,
+            'status': 'ACTIVE',
+            'progress': 100,
+            'tenant_id': 'openstack',
+            'user_id': 'fake',
+            'hostId': '%056x' % rand.getrandbits(224),
+            'created': '2013-04-01T12:00:00Z',
+            'updated': '2013-04-01T12:01:00Z',
+            'accessIPv4': '',
+            'accessIPv6': '',
+            'key_name': 'key-%d' % rand.randint(0, 3),
+            'config_drive': '',
+            'image': {'id': image_id,
+                      'links': [{'rel': 'bookmark',
+                                 'href': image_href % image_id}]},
+            'flavor': {'id': flavor_id,
+                       'links': [{'rel': 'bookmark',
+                                  'href': flavor_href % flavor_id}]},
+            'metadata': dict(('key%d' % j, 'value%d' % j)
+                             for j in xrange(rand.randint(0, 5))),
+            'addresses': addresses,
+            'links': [{'rel': 'self', 'href': href % uuid},
+                      {'rel': 'bookmark', 'href': href % uuid}],
+            'security_groups': [{'name': 'default'}],
+            'OS-DCF:diskConfig': 'AUTO',
+            'OS-EXT-AZ:availability_zone': 'az%d' % rand.randint(0, 2),
+            'OS-EXT-SRV-ATTR:instance_name': 'instance-%08x' % i,
+            'OS-EXT-SRV-ATTR:host': 'host%d' % rand.randint(0, 99),
+            'OS-EXT-SRV-ATTR:hypervisor_hostname': 'node%d' % i,
+            'OS-EXT-STS:task_state': None,
+            'OS-EXT-STS:vm_state': 'active',
+            'OS-EXT-STS:power_state': 1,
+        })
+    return {'servers': servers}
+
+
+def make_template():
+    """Return the template a GET /servers/detail request serializes with."""
+    template = servers.ServersTemplate()
+    template.attach(*[slave() for slave in SLAVE_TEMPLATES])
+    return template
+
+
+def render_interpreted(template, obj):
+    elem = template._serialize(None, obj, template._siblings(),
+                               template._nsmap())
+    return etree.tostring(elem, **template.serialize_options)
+
+
+def render_compiled(template, obj):
+    return template.serialize(obj)
+
+
+def timed(render, obj, repeat):
+    """Return the seconds per document and the last document rendered."""
+    start = time.time()
+    for i in xrange(repeat):
+        result = render(make_template(), obj)
+    return (time.time() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1],
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--servers', default='1,10,100,1000',
+                        help='comma separated numbers of servers to render')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='number of times each document is rendered')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the document generator')
+    args = parser.parse_args()
+
+    start = time.time()
+    make_template().compile()
+    print "compiled the template in %.2f ms" % (1000 * (time.time() - start))
+
+    for num_servers in [int(x) for x in args.servers.split(',')]:
+        obj = make_servers(num_servers, args.seed)
+        interpreted, expected = timed(render_interpreted, obj, args.repeat)
+        compiled, result = timed(render_compiled, obj, args.repeat)
+        if result != expected:
+            sys.exit("compiled rendering of %d servers differs" %
+                     num_servers)
+
+        print "%d servers, %d bytes" % (num_servers, len(result))
+        print "  interpreted %10.3f ms" % (1000 * interpreted)
+        print "  compiled    %10.3f ms  (%.2fx)" % (1000 * compiled,
+                                                    interpreted / compiled)
+
+
+if __name__ == '__main__':
+    main()